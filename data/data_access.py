@@ -1,6 +1,14 @@
 from flask import Flask, jsonify, request
 from faker import Faker
+import numpy as np
+import os
 import random
+import sys
+
+# Share the inventory index types with the tool server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from modules.inventory_index import SortedIndex, InvertedIndex, intersect_rows
+from modules.inventory_snapshot import write_snapshot
 
 app = Flask(__name__)
 fake = Faker()
@@ -155,6 +163,75 @@ rental_income_data = {
     } for project in projects_data for property_type in project['property_types']
 }
 
+class ProjectIndex:
+    """
+    Indexes over projects_data: a sorted price index over every property type
+    (mapped back to its project) and inverted indexes on project location and
+    purpose, so a query only touches the matching rows.
+    """
+    def __init__(self, projects):
+        self.projects = projects
+        self.property_project = np.array(
+            [project_row for project_row, project in enumerate(projects) for _ in project['property_types']],
+            dtype=np.intp
+        )
+        self.price = SortedIndex([pt['price'] for project in projects for pt in project['property_types']])
+        self.location = InvertedIndex([project['location'] for project in projects])
+        self.purpose = InvertedIndex([project['purpose'] for project in projects])
+
+    def projects_with_price(self, low=None, high=None):
+        return np.unique(self.property_project[self.price.range(low, high)])
+
+    def query(self, location=None, min_price=None, max_price=None, purpose=None):
+        row_sets = []
+        if location is not None:
+            row_sets.append(self.location.rows(location))
+        if purpose is not None:
+            row_sets.append(self.purpose.rows(purpose))
+        # A project matches a price bound if any of its property types does
+        if min_price is not None:
+            row_sets.append(self.projects_with_price(low=min_price))
+        if max_price is not None:
+            row_sets.append(self.projects_with_price(high=max_price))
+        if not row_sets:
+            return list(self.projects)
+        return [self.projects[row] for row in intersect_rows(*row_sets)]
+
+project_index = ProjectIndex(projects_data)
+
+
+def inventory_rows():
+    """One flat row per property type in the projects_data shape the tool server filters."""
+    rows = []
+    for project in projects_data:
+        project_fields = {key: value for key, value in project.items() if key not in ('property_types', 'image_url')}
+        for property_type in project['property_types']:
+            price_info = price_list_data[property_type['propertyID']][0]
+            payment_plan = price_info['payment_plan']
+            fees = payment_plan['additional_fees']
+            rows.append({
+                **project_fields,
+                **property_type,
+                'interior_sqmeter': price_info['interior_sqmeter'],
+                'balcony_terrace_sqmeter': price_info['balcony_terrace_sqmeter'],
+                'rooftop_sqmeter': price_info['rooftop_sqmeter'],
+                'total_living_space_sqmeter': price_info['total_living_space_sqmeter'],
+                'installment_payment_plan': payment_plan['installment_payment_plan'],
+                'VAT': fees['VAT'],
+                'stamp_duty': fees['stamp_duty'],
+                'title_deed_transfer': fees['title_deed_transfer'],
+                'lawyer_fees': fees['lawyer_fees'],
+                'ImageURL': project['image_url'],
+                'VideoURL': None,
+            })
+    return rows
+
+
+# Publish the inventory as a memory-mappable snapshot for tool servers started
+# with the same INVENTORY_SNAPSHOT path
+if os.getenv("INVENTORY_SNAPSHOT"):
+    write_snapshot(inventory_rows(), os.getenv("INVENTORY_SNAPSHOT"))
+
 # Endpoint to get available projects
 @app.route('/projects/available_projects', methods=['GET'])
 def get_available_projects():
@@ -164,13 +241,7 @@ def get_available_projects():
     purpose = request.args.get('purpose')
     
     # Filter projects based on query parameters
-    filtered_projects = [
-        project for project in projects_data
-        if (location is None or project['location'] == location) and
-           (min_price is None or any(pt['price'] >= min_price for pt in project['property_types'])) and
-           (max_price is None or any(pt['price'] <= max_price for pt in project['property_types'])) and
-           (purpose is None or project['purpose'] == purpose)
-    ]
+    filtered_projects = project_index.query(location, min_price, max_price, purpose)
     
     return jsonify(filtered_projects)
 
@@ -186,5 +257,74 @@ def get_rental_income(propertyID):
     rental_income = rental_income_data.get(propertyID, {})
     return jsonify(rental_income)
 
+def requested_property_ids():
+    """Property IDs from a JSON body ("propertyIDs") or the query string (comma separated or repeated)."""
+    body = request.get_json(silent=True) or {}
+    property_ids = body.get('propertyIDs')
+    if property_ids is None:
+        property_ids = [pid for value in request.args.getlist('propertyIDs') for pid in value.split(',') if pid]
+    return list(dict.fromkeys(property_ids))
+
+def requested_fields():
+    body = request.get_json(silent=True) or {}
+    fields = body.get('fields')
+    if fields is None:
+        fields = [field for value in request.args.getlist('fields') for field in value.split(',') if field]
+    return fields
+
+def select_path(data, path):
+    """Pick a dotted path out of data, keeping the nesting. "*" matches every key at that level."""
+    if not path:
+        return data
+    if isinstance(data, list):
+        return [select_path(item, path) for item in data]
+    if not isinstance(data, dict):
+        return None
+    key, rest = path[0], path[1:]
+    if key == '*':
+        selected = {k: select_path(v, rest) for k, v in data.items() if isinstance(v, (dict, list)) or not rest}
+    elif key in data:
+        selected = {key: select_path(data[key], rest)}
+    else:
+        return {}
+    return {k: v for k, v in selected.items() if v not in (None, {})}
+
+def merge_selection(target, selection):
+    for key, value in selection.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_selection(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+def project_fields(data, fields):
+    """Reduce data (a record or a list of records) to the requested dotted field paths."""
+    if not fields:
+        return data
+    if isinstance(data, list):
+        return [project_fields(item, fields) for item in data]
+    projected = {}
+    for field in fields:
+        merge_selection(projected, select_path(data, field.split('.')))
+    return projected
+
+# Bulk endpoint to get the price lists of many properties in one response
+@app.route('/projects/available_projects/price_lists', methods=['GET', 'POST'])
+def get_price_lists():
+    fields = requested_fields()
+    return jsonify({
+        property_id: project_fields(price_list_data.get(property_id, []), fields)
+        for property_id in requested_property_ids()
+    })
+
+# Bulk endpoint to get the rental income of many properties in one response
+@app.route('/projects/available_projects/rental_incomes', methods=['GET', 'POST'])
+def get_rental_incomes():
+    fields = requested_fields()
+    return jsonify({
+        property_id: project_fields(rental_income_data.get(property_id, {}), fields)
+        for property_id in requested_property_ids()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
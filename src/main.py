@@ -1,8 +1,19 @@
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort
+import asyncio
+import functools
+import inspect
 import os
+import threading
 from dotenv import load_dotenv
 from flask_cors import CORS
-from tools import tools
+from werkzeug.exceptions import TooManyRequests
+from tools import registry
+from modules.result_cache import result_cache
+from modules.streaming import StreamingResult, stream_mode, stream_mimetype
+from modules.executor import call_with_executor, executor_for
+from modules.jobs import job_queue, JobQueueFull, wants_job, job_priority, job_result_response
+from modules.admission import admission, Overloaded
+from modules.metrics import using_tool, span, render_metrics, PROMETHEUS_MIMETYPE
 
 # Load environment variables
 load_dotenv()
@@ -10,25 +21,60 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# Coroutine tools are run on one long-lived event loop shared by all request threads,
+# so their async data-service clients keep their connection pools between calls.
+# For an asyncio-native server use main_async.py instead.
+# The loop is started on first use, once per process, so workers forked by serve.py
+# each get their own instead of inheriting a loop whose thread did not survive the fork.
+event_loop = None
+event_loop_pid = None
+event_loop_lock = threading.Lock()
+
+def get_event_loop():
+    global event_loop, event_loop_pid
+    with event_loop_lock:
+        if event_loop is None or event_loop_pid != os.getpid():
+            event_loop = asyncio.new_event_loop()
+            event_loop_pid = os.getpid()
+            threading.Thread(target=event_loop.run_forever, daemon=True).start()
+        return event_loop
+
+def call_tool(tool, props):
+    with span("tool"):
+        result = call_with_executor(executor_for(tool), registry.load(tool), **props)
+        if inspect.isawaitable(result):
+            result = asyncio.run_coroutine_threadsafe(result, get_event_loop()).result()
+        return result
+
+def admitted_call(tool, props, shed=True):
+    with admission.admit(tool, shed):
+        return call_tool(tool, props)
+
+def run_job(tool, props):
+    # Job threads do not share the request's context, so the job's spans are labelled here.
+    # A job that misses the cache is admitted when it starts; it has already been queued,
+    # so it waits for capacity instead of being shed
+    with using_tool(tool["name"]), span("job"):
+        return result_cache.get_or_run(tool["name"], props, lambda: admitted_call(tool, props, shed=False))
+
+def timed_tool_request(endpoint):
+    """Label the spans of a /run-cmnd-tool call with its tool and time the whole request."""
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        tool_name = (request.get_json(silent=True) or {}).get('toolName')
+        with using_tool(tool_name if tool_name in registry else "unknown"), span("request"):
+            return endpoint(*args, **kwargs)
+    return wrapper
+
 @app.route("/cmnd-tools", methods=['GET'])
 def cmnd_tools_endpoint():
-    tools_response = [
-        {
-            "name": tool["name"],
-            "description": tool["description"],
-            "jsonSchema": tool["parameters"],
-            "isDangerous": tool.get("isDangerous", False),
-            "functionType": tool["functionType"],
-            "isLongRunningTool": tool.get("isLongRunningTool", False),
-            "preCallPrompt": tool.get("preCallPrompt"),
-            "postCallPrompt": tool.get("postCallPrompt"),
-            "rerun": tool["rerun"],
-            "rerunWithDifferentParameters": tool["rerunWithDifferentParameters"],
-        } for tool in tools
-    ]
-    return jsonify({"tools": tools_response})
+    body, etag = registry.manifest_json()
+    if registry.not_modified(request.headers.get("If-None-Match")):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+    return Response(body, mimetype="application/json", headers={"ETag": f'"{etag}"'})
 
 @app.route("/run-cmnd-tool", methods=['POST'])
+@timed_tool_request
 def run_cmnd_tool_endpoint():
     data = request.json
     tool_name = data.get('toolName')
@@ -36,21 +82,117 @@ def run_cmnd_tool_endpoint():
     props = data.get('props', {})
     # print("props", props)
     #print(props)
-    tool = next((t for t in tools if t['name'] == tool_name), None)
+    tool = registry.get(tool_name)
     # print (tool["runCmd"])
     #print(props["budget_max"])
     # print(props["projects_data"])
     if not tool:
         abort(404, description="Tool not found")
     try:
+        priority = job_priority(data)
+    except ValueError as e:
+        abort(400, description=str(e))
+    mode = stream_mode(data, request.headers.get("Accept"))
+    stream_cmd = registry.load(tool, "streamCmd") if mode else None
+    try:
+        if stream_cmd is not None:
+            # Streamed results are written as they are produced and bypass the result cache.
+            # The call is admitted before the tool parses and filters the inventory
+            with admission.admit_stream(tool) as stream:
+                result = stream_cmd(**props)
+                if isinstance(result, StreamingResult):
+                    return Response(stream.wrap(result.iter_chunks(mode)), mimetype=stream_mimetype(mode))
+            return jsonify(result)
+        if wants_job(tool, data):
+            # Long-running tools are queued and polled through /jobs instead of holding the connection open
+            job = job_queue.submit(tool_name, lambda: run_job(tool, props), priority=priority)
+            return jsonify(job.status_dict()), 202
         # conversation_id = props.pop("conversationId", None)
         # chatbot_conversation_id = props.pop("chatbotConversationId", None)
         # print("here")
-        result = tool["runCmd"](**props)
+        # Identical calls are served from the result cache instead of being recomputed
+        # Only calls that miss the cache are admitted; see modules/admission.py
+        result = result_cache.get_or_run(tool_name, props, lambda: admitted_call(tool, props))
         # print("result", result)
-        return jsonify(result)
+        with span("serialize"):
+            return jsonify(result)
+    except Overloaded as e:
+        raise TooManyRequests(description=str(e), retry_after=e.retry_after)
+    except JobQueueFull as e:
+        abort(503, description=str(e))
     except Exception as e:
         abort(500, description=str(e))
 
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    return Response(render_metrics(), content_type=PROMETHEUS_MIMETYPE)
+
+@app.route("/jobs/<job_id>", methods=['GET'])
+def job_status_endpoint(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404, description="Job not found")
+    return jsonify(job.status_dict())
+
+@app.route("/jobs/<job_id>/result", methods=['GET'])
+def job_result_endpoint(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404, description="Job not found")
+    body, status = job_result_response(job)
+    return jsonify(body), status
+
+@app.route("/jobs/<job_id>", methods=['DELETE'])
+def cancel_job_endpoint(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        abort(404, description="Job not found")
+    return jsonify(job.status_dict())
+
+def get_inventory_registry():
+    # Imported on first use, so the inventory store (and NumPy) do not load at start-up
+    from modules.inventory_registry import inventory_registry
+    return inventory_registry
+
+@app.route("/inventories", methods=['POST'])
+def register_inventory_endpoint():
+    inventories = get_inventory_registry()
+    projects_data = (request.json or {}).get('projects_data')
+    if not isinstance(projects_data, str):
+        abort(400, description="projects_data is required")
+    try:
+        inventory_id, store = inventories.register(projects_data)
+    except Exception as e:
+        abort(400, description=str(e))
+    return jsonify(inventories.summary(inventory_id, store)), 201
+
+@app.route("/inventories/<inventory_id>", methods=['GET'])
+def get_inventory_endpoint(inventory_id):
+    inventories = get_inventory_registry()
+    store = inventories.find(inventory_id)
+    if store is None:
+        abort(404, description="Inventory not found")
+    return jsonify(inventories.summary(inventory_id, store))
+
+@app.route("/inventories/<inventory_id>", methods=['PATCH'])
+def patch_inventory_endpoint(inventory_id):
+    inventories = get_inventory_registry()
+    if inventories.find(inventory_id) is None:
+        abort(404, description="Inventory not found")
+    try:
+        new_inventory_id, store = inventories.patch(inventory_id, request.json or {})
+    except Exception as e:
+        abort(400, description=str(e))
+    return jsonify(inventories.summary(new_inventory_id, store, base_inventory_id=inventory_id))
+
+@app.route("/inventories/<inventory_id>", methods=['DELETE'])
+def delete_inventory_endpoint(inventory_id):
+    inventories = get_inventory_registry()
+    if not inventories.remove(inventory_id):
+        abort(404, description="Inventory not found")
+    return "", 204
+
 if __name__ == "__main__":
+    if os.getenv("TOOLS_IMPORT_REPORT"):
+        registry.print_import_report()
     app.run(host="0.0.0.0", port=8888, debug=True)
@@ -0,0 +1,179 @@
+import asyncio
+import functools
+import inspect
+import os
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from tools import registry
+from modules.result_cache import result_cache
+from modules.streaming import StreamingResult, stream_mode, stream_mimetype
+from modules.executor import call_with_executor, executor_for
+from modules.jobs import job_queue, JobQueueFull, wants_job, job_priority, job_result_response
+from modules.admission import admission, Overloaded
+from modules.metrics import using_tool, span, render_metrics, PROMETHEUS_MIMETYPE
+
+# Load environment variables
+load_dotenv()
+
+# asyncio-native server: coroutine tools are awaited on the server's event loop,
+# so one worker can keep many tool calls in flight while they wait on the data service.
+# Plain functions are run in the thread pool to keep the loop responsive.
+app = FastAPI()
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+@app.get("/cmnd-tools")
+async def cmnd_tools_endpoint(request: Request):
+    body, etag = registry.manifest_json()
+    if registry.not_modified(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers={"ETag": f'"{etag}"'})
+    return Response(body, media_type="application/json", headers={"ETag": f'"{etag}"'})
+
+def timed_tool_request(endpoint):
+    """Label the spans of a /run-cmnd-tool call with its tool and time the whole request."""
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request):
+        # The parsed body is cached on the request, so the endpoint does not decode it again
+        tool_name = (await request.json() or {}).get('toolName')
+        with using_tool(tool_name if tool_name in registry else "unknown"), span("request"):
+            return await endpoint(request)
+    return wrapper
+
+@app.post("/run-cmnd-tool")
+@timed_tool_request
+async def run_cmnd_tool_endpoint(request: Request):
+    data = await request.json()
+    tool_name = data.get('toolName')
+    print("tool_name", tool_name)
+    props = data.get('props', {})
+    tool = registry.get(tool_name)
+    if not tool:
+        raise HTTPException(status_code=404, detail="Tool not found")
+
+    async def run():
+        run_cmd = registry.load(tool)
+        executor = executor_for(tool)
+        with span("tool"):
+            if inspect.iscoroutinefunction(run_cmd):
+                return await call_with_executor(executor, run_cmd, **props)
+            return await run_in_threadpool(call_with_executor, executor, run_cmd, **props)
+
+    async def admitted_run(shed=True):
+        async with admission.aadmit(tool, shed):
+            return await run()
+
+    try:
+        priority = job_priority(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mode = stream_mode(data, request.headers.get("accept"))
+    stream_cmd = registry.load(tool, "streamCmd") if mode else None
+    try:
+        if stream_cmd is not None:
+            # Streamed results are written as they are produced and bypass the result cache.
+            # The call is admitted before the tool parses and filters the inventory
+            async with admission.aadmit_stream(tool) as stream:
+                result = await run_in_threadpool(stream_cmd, **props)
+                if isinstance(result, StreamingResult):
+                    return StreamingResponse(stream.wrap(result.iter_chunks(mode)), media_type=stream_mimetype(mode))
+            return result
+        if wants_job(tool, data):
+            # Long-running tools are queued and polled through /jobs instead of holding the connection open;
+            # the job's thread runs the call on this event loop and waits for it
+            loop = asyncio.get_running_loop()
+
+            def run_job():
+                # Job threads do not share the request's context, so the job's spans are labelled here.
+                # A job that misses the cache is admitted when it starts, waiting for capacity instead of being shed
+                with using_tool(tool_name), span("job"):
+                    run_admitted = lambda: admitted_run(shed=False)
+                    return asyncio.run_coroutine_threadsafe(result_cache.aget_or_run(tool_name, props, run_admitted), loop).result()
+
+            job = job_queue.submit(tool_name, run_job, priority=priority)
+            return JSONResponse(job.status_dict(), status_code=202)
+        # Only calls that miss the cache are admitted; see modules/admission.py
+        return await result_cache.aget_or_run(tool_name, props, admitted_run)
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(render_metrics(), headers={"Content-Type": PROMETHEUS_MIMETYPE})
+
+@app.get("/jobs/{job_id}")
+async def job_status_endpoint(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.status_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def job_result_endpoint(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    body, status = job_result_response(job)
+    return JSONResponse(body, status_code=status)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job_endpoint(job_id: str):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.status_dict()
+
+def get_inventory_registry():
+    # Imported on first use, so the inventory store (and NumPy) do not load at start-up
+    from modules.inventory_registry import inventory_registry
+    return inventory_registry
+
+@app.post("/inventories", status_code=201)
+async def register_inventory_endpoint(request: Request):
+    inventories = get_inventory_registry()
+    projects_data = (await request.json() or {}).get('projects_data')
+    if not isinstance(projects_data, str):
+        raise HTTPException(status_code=400, detail="projects_data is required")
+    try:
+        inventory_id, store = await run_in_threadpool(inventories.register, projects_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return inventories.summary(inventory_id, store)
+
+@app.get("/inventories/{inventory_id}")
+async def get_inventory_endpoint(inventory_id: str):
+    inventories = get_inventory_registry()
+    store = inventories.find(inventory_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="Inventory not found")
+    return inventories.summary(inventory_id, store)
+
+@app.patch("/inventories/{inventory_id}")
+async def patch_inventory_endpoint(inventory_id: str, request: Request):
+    inventories = get_inventory_registry()
+    if inventories.find(inventory_id) is None:
+        raise HTTPException(status_code=404, detail="Inventory not found")
+    patch = await request.json() or {}
+    try:
+        new_inventory_id, store = await run_in_threadpool(inventories.patch, inventory_id, patch)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return inventories.summary(new_inventory_id, store, base_inventory_id=inventory_id)
+
+@app.delete("/inventories/{inventory_id}", status_code=204)
+async def delete_inventory_endpoint(inventory_id: str):
+    inventories = get_inventory_registry()
+    if not inventories.remove(inventory_id):
+        raise HTTPException(status_code=404, detail="Inventory not found")
+    return Response(status_code=204)
+
+if __name__ == "__main__":
+    if os.getenv("TOOLS_IMPORT_REPORT"):
+        registry.print_import_report()
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8888)))
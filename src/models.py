@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Optional, Dict, Type
 from pydantic import BaseModel, Field
 from typing import get_args, get_origin
@@ -39,8 +40,13 @@ class InvestmentOptionsSchema(BaseModel):
     bathrooms_max: float = Field(None, title="Maximum Bathrooms", description="Maximum number of bathrooms")
     family_size: int = Field(None, title="Family Size", description="Number of family members")
     property_type: str = Field(None, title="Property Type", description="Type of property (e.g., house, apartment)")
-    sort_by: str = Field(None, title="Sort By", description="Sort the results by a specific field (e.g., price, size)")
-    projects_data: str = Field(..., title="Projects Data", description="List of projects data")
+    sort_by: str = Field(None, title="Sort By", description="Sort the results by a specific field (e.g., price, total_area_sqmeter, price_per_sqm)")
+    descending: bool = Field(False, title="Descending", description="Sort from highest to lowest instead of lowest to highest")
+    limit: int = Field(None, title="Limit", description="Maximum number of properties to return", ge=1)
+    offset: int = Field(0, title="Offset", description="Number of sorted properties to skip", ge=0)
+    cursor: str = Field(None, title="Cursor", description="next_cursor returned by a previous call, to continue from where it stopped")
+    projects_data: str = Field(None, title="Projects Data", description="List of projects data; defaults to the server's inventory snapshot")
+    inventory_id: str = Field(None, title="Inventory ID", description="ID of an inventory registered through /inventories, sent instead of projects_data")
 
 
 
@@ -94,6 +100,8 @@ def get_properties_formated(model, visited=None):
 #     else:
 #         return properties_formatted
 
+# Generated once per model; every tool sharing a model shares the same (read-only) schema dict
+@lru_cache(maxsize=None)
 def custom_json_schema(model):
     schema = model.schema()
     properties_formatted = {
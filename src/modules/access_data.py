@@ -1,32 +1,362 @@
+import asyncio
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
-def fetch_available_projects(location=None, min_price=None, max_price=None, purpose=None):
-    url = "http://127.0.0.1:5000/projects/available_projects"
-    params = {
-        "location": location,
-        "min_price": min_price,
-        "max_price": max_price,
-        "purpose": purpose
-    }
-    response = requests.get(url, params=params)
+from modules.cache import TTLCache, SharedTTLCache, DiskCache
+from modules.metrics import span, record_upstream, register_cache
+
+DATA_SERVICE_URL = os.getenv("DATA_SERVICE_URL", "http://127.0.0.1:5000")
+DATA_SERVICE_MAX_CONNECTIONS = int(os.getenv("DATA_SERVICE_MAX_CONNECTIONS", 20))
+DATA_SERVICE_TIMEOUT = float(os.getenv("DATA_SERVICE_TIMEOUT", 10))
+# Price lists and rental incomes change rarely, so lookups are cached in-process
+DATA_CACHE_TTL = float(os.getenv("DATA_CACHE_TTL", 300))
+DATA_CACHE_MAX_ENTRIES = int(os.getenv("DATA_CACHE_MAX_ENTRIES", 4096))
+DATA_CACHE_MAX_BYTES = int(os.getenv("DATA_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Set to a directory shared by the worker processes (serve.py does) so a lookup
+# fetched by one worker is served to the others from there, within these bounds
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR")
+DATA_CACHE_DIR_MAX_ENTRIES = int(os.getenv("DATA_CACHE_DIR_MAX_ENTRIES", 65536))
+DATA_CACHE_DIR_MAX_BYTES = int(os.getenv("DATA_CACHE_DIR_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def bulk_response(path, response, raise_errors=True):
+    if response.status_code in (404, 405):
+        return None
     if response.status_code == 200:
         return response.json()
-    else:
-        raise Exception(f"Failed to fetch projects data: {response.status_code} - {response.text}")
-    
+    if raise_errors:
+        raise Exception(f"Failed to fetch {path}: {response.status_code} - {response.text}")
+    print(f"Error fetching {path}: {response.status_code} - {response.text}")
+    return {}
+
+
+def cache_keys(kind, property_ids):
+    return [(kind, property_id) for property_id in property_ids]
+
+
+def keyed_by_property(kind, results):
+    return {(kind, property_id): value for property_id, value in results.items()}
+
+
+def unkeyed(kind, property_ids, results):
+    return {property_id: results[(kind, property_id)] for property_id in property_ids if (kind, property_id) in results}
+
+
+class DataServiceClient:
+    """
+    Pooled HTTP client for the projects data service.
+
+    Connections are kept alive in a requests.Session, every call has a
+    timeout, and the bulk helpers fan out over a bounded thread pool. With a
+    cache, price lists and rental incomes are served from it and concurrent
+    misses for the same property share one upstream request.
+    """
+
+    def __init__(self, base_url=DATA_SERVICE_URL, max_connections=20, timeout=(3.05, 10), max_workers=None, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.timeout = timeout
+        self.max_workers = max_workers or max_connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            record_upstream(path, status, time.perf_counter() - start)
+
+    def get(self, path, params=None):
+        return self.request("GET", path, params=params)
+
+    def fetch_available_projects(self, location=None, min_price=None, max_price=None, purpose=None):
+        params = {
+            "location": location,
+            "min_price": min_price,
+            "max_price": max_price,
+            "purpose": purpose
+        }
+        response = self.get("/projects/available_projects", params=params)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Failed to fetch projects data: {response.status_code} - {response.text}")
+
+    def _fetch_rental_income(self, property_id):
+        response = self.get(f"/projects/available_projects/{property_id}/rental_income")
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Failed to fetch rental income data: {response.status_code} - {response.text}")
+
+    def _fetch_price_list(self, property_id):
+        response = self.get(f"/projects/available_projects/{property_id}/price_list")
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Failed to fetch price list data: {response.status_code} - {response.text}")
+
+    def fetch_rental_income(self, property_id):
+        if self.cache is None:
+            return self._fetch_rental_income(property_id)
+        return self.cache.get_or_load(("rental_income", property_id), lambda: self._fetch_rental_income(property_id))
+
+    def fetch_price_list(self, property_id):
+        if self.cache is None:
+            return self._fetch_price_list(property_id)
+        return self.cache.get_or_load(("price_list", property_id), lambda: self._fetch_price_list(property_id))
+
+    def fetch_many(self, fetch, property_ids, raise_errors=True):
+        """
+        Run fetch(property_id) concurrently for every distinct id and return a
+        dict keyed by propertyID. With raise_errors=False failed ids are
+        logged and left out of the result instead of aborting the batch.
+        """
+        property_ids = list(dict.fromkeys(property_ids))
+        if not property_ids:
+            return {}
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(property_ids))) as pool:
+            # Each fetch runs in a copy of the caller's context, so its requests are counted against the calling tool
+            futures = {property_id: pool.submit(copy_context().run, fetch, property_id) for property_id in property_ids}
+            for property_id, future in futures.items():
+                try:
+                    results[property_id] = future.result()
+                except Exception as e:
+                    if raise_errors:
+                        raise
+                    print(f"Error fetching data for property ID {property_id}: {e}")
+        return results
+
+    def fetch_bulk(self, path, property_ids, fields=None, raise_errors=True):
+        """
+        One round-trip to a bulk endpoint. Returns None when the data service
+        does not offer it, so callers can fall back to per-property requests.
+        """
+        payload = {"propertyIDs": property_ids}
+        if fields:
+            payload["fields"] = fields
+        try:
+            response = self.request("POST", path, json=payload)
+        except requests.RequestException as e:
+            if raise_errors:
+                raise
+            print(f"Error fetching {path}: {e}")
+            return {}
+        return bulk_response(path, response, raise_errors)
+
+    def _fetch_price_lists(self, property_ids, raise_errors=True, fields=None):
+        price_lists = self.fetch_bulk("/projects/available_projects/price_lists", property_ids, fields, raise_errors)
+        if price_lists is None:
+            price_lists = self.fetch_many(self._fetch_price_list, property_ids, raise_errors)
+        return price_lists
+
+    def _fetch_rental_incomes(self, property_ids, raise_errors=True, fields=None):
+        rental_incomes = self.fetch_bulk("/projects/available_projects/rental_incomes", property_ids, fields, raise_errors)
+        if rental_incomes is None:
+            rental_incomes = self.fetch_many(self._fetch_rental_income, property_ids, raise_errors)
+        return rental_incomes
+
+    def fetch_cached(self, kind, fetch, property_ids, raise_errors=True, fields=None):
+        """
+        Serve property_ids from the cache and fetch(missing_ids) the rest in one
+        batch. Field projections are not cached, only whole documents.
+        """
+        property_ids = list(dict.fromkeys(property_ids))
+        if not property_ids:
+            return {}
+        if self.cache is None or fields:
+            return fetch(property_ids, raise_errors, fields)
+        results = self.cache.get_many_or_load(
+            cache_keys(kind, property_ids),
+            lambda keys: keyed_by_property(kind, fetch([property_id for _, property_id in keys], raise_errors))
+        )
+        return unkeyed(kind, property_ids, results)
+
+    def fetch_price_lists(self, property_ids, raise_errors=True, fields=None):
+        return self.fetch_cached("price_list", self._fetch_price_lists, property_ids, raise_errors, fields)
+
+    def fetch_rental_incomes(self, property_ids, raise_errors=True, fields=None):
+        return self.fetch_cached("rental_income", self._fetch_rental_incomes, property_ids, raise_errors, fields)
+
+
+class AsyncDataServiceClient:
+    """
+    asyncio counterpart of DataServiceClient built on httpx.AsyncClient.
+
+    At most max_concurrency requests are in flight at once, so a single
+    event loop can serve many tool calls without flooding the data service.
+    """
+
+    def __init__(self, base_url=DATA_SERVICE_URL, max_connections=20, timeout=10, max_concurrency=None, cache=None):
+        self.cache = cache
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency or max_connections)
+
+    async def request(self, method, path, **kwargs):
+        async with self.semaphore:
+            start = time.perf_counter()
+            status = "error"
+            try:
+                response = await self.client.request(method, path, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                record_upstream(path, status, time.perf_counter() - start)
+
+    async def _fetch_rental_income(self, property_id):
+        response = await self.request("GET", f"/projects/available_projects/{property_id}/rental_income")
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Failed to fetch rental income data: {response.status_code} - {response.text}")
+
+    async def _fetch_price_list(self, property_id):
+        response = await self.request("GET", f"/projects/available_projects/{property_id}/price_list")
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception(f"Failed to fetch price list data: {response.status_code} - {response.text}")
+
+    async def fetch_rental_income(self, property_id):
+        if self.cache is None:
+            return await self._fetch_rental_income(property_id)
+        return await self.cache.aget_or_load(("rental_income", property_id), lambda: self._fetch_rental_income(property_id))
+
+    async def fetch_price_list(self, property_id):
+        if self.cache is None:
+            return await self._fetch_price_list(property_id)
+        return await self.cache.aget_or_load(("price_list", property_id), lambda: self._fetch_price_list(property_id))
+
+    async def fetch_many(self, fetch, property_ids, raise_errors=True):
+        property_ids = list(dict.fromkeys(property_ids))
+        responses = await asyncio.gather(*(fetch(property_id) for property_id in property_ids), return_exceptions=True)
+        results = {}
+        for property_id, result in zip(property_ids, responses):
+            if isinstance(result, Exception):
+                if raise_errors:
+                    raise result
+                print(f"Error fetching data for property ID {property_id}: {result}")
+            else:
+                results[property_id] = result
+        return results
+
+    async def fetch_bulk(self, path, property_ids, fields=None, raise_errors=True):
+        payload = {"propertyIDs": property_ids}
+        if fields:
+            payload["fields"] = fields
+        try:
+            response = await self.request("POST", path, json=payload)
+        except httpx.HTTPError as e:
+            if raise_errors:
+                raise
+            print(f"Error fetching {path}: {e}")
+            return {}
+        return bulk_response(path, response, raise_errors)
+
+    async def _fetch_price_lists(self, property_ids, raise_errors=True, fields=None):
+        price_lists = await self.fetch_bulk("/projects/available_projects/price_lists", property_ids, fields, raise_errors)
+        if price_lists is None:
+            price_lists = await self.fetch_many(self._fetch_price_list, property_ids, raise_errors)
+        return price_lists
+
+    async def _fetch_rental_incomes(self, property_ids, raise_errors=True, fields=None):
+        rental_incomes = await self.fetch_bulk("/projects/available_projects/rental_incomes", property_ids, fields, raise_errors)
+        if rental_incomes is None:
+            rental_incomes = await self.fetch_many(self._fetch_rental_income, property_ids, raise_errors)
+        return rental_incomes
+
+    async def fetch_cached(self, kind, fetch, property_ids, raise_errors=True, fields=None):
+        property_ids = list(dict.fromkeys(property_ids))
+        if not property_ids:
+            return {}
+        if self.cache is None or fields:
+            return await fetch(property_ids, raise_errors, fields)
+
+        async def load(keys):
+            return keyed_by_property(kind, await fetch([property_id for _, property_id in keys], raise_errors))
+
+        results = await self.cache.aget_many_or_load(cache_keys(kind, property_ids), load)
+        return unkeyed(kind, property_ids, results)
+
+    async def fetch_price_lists(self, property_ids, raise_errors=True, fields=None):
+        return await self.fetch_cached("price_list", self._fetch_price_lists, property_ids, raise_errors, fields)
+
+    async def fetch_rental_incomes(self, property_ids, raise_errors=True, fields=None):
+        return await self.fetch_cached("rental_income", self._fetch_rental_incomes, property_ids, raise_errors, fields)
+
+
+# Shared by the sync client and every per-loop async client, and with DATA_CACHE_DIR by every process
+data_cache_options = dict(ttl=DATA_CACHE_TTL, max_entries=DATA_CACHE_MAX_ENTRIES, max_bytes=DATA_CACHE_MAX_BYTES)
+if DATA_CACHE_DIR:
+    data_cache = SharedTTLCache(
+        DiskCache(DATA_CACHE_DIR, ttl=DATA_CACHE_TTL, max_entries=DATA_CACHE_DIR_MAX_ENTRIES, max_bytes=DATA_CACHE_DIR_MAX_BYTES),
+        **data_cache_options,
+    )
+else:
+    data_cache = TTLCache(**data_cache_options)
+
+register_cache("data", data_cache.stats)
+
+client = DataServiceClient(max_connections=DATA_SERVICE_MAX_CONNECTIONS, timeout=DATA_SERVICE_TIMEOUT, cache=data_cache)
+
+# httpx.AsyncClient is tied to the event loop it was first used on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        async_client = AsyncDataServiceClient(max_connections=DATA_SERVICE_MAX_CONNECTIONS, timeout=DATA_SERVICE_TIMEOUT, cache=data_cache)
+        _async_clients[loop] = async_client
+    return async_client
+
+
+def fetch_available_projects(location=None, min_price=None, max_price=None, purpose=None):
+    return client.fetch_available_projects(location, min_price, max_price, purpose)
+
 
 def fetch_rental_income(property_id):
-    url = f"http://127.0.0.1:5000/projects/available_projects/{property_id}/rental_income"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Failed to fetch rental income data: {response.status_code} - {response.text}")
+    return client.fetch_rental_income(property_id)
+
 
 def fetch_price_list(property_id):
-    url = f"http://127.0.0.1:5000/projects/available_projects/{property_id}/price_list"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"Failed to fetch price list data: {response.status_code} - {response.text}")
\ No newline at end of file
+    return client.fetch_price_list(property_id)
+
+
+def fetch_rental_incomes(property_ids, raise_errors=True, fields=None):
+    with span("fetch_rental_incomes"):
+        return client.fetch_rental_incomes(property_ids, raise_errors, fields)
+
+
+def fetch_price_lists(property_ids, raise_errors=True, fields=None):
+    with span("fetch_price_lists"):
+        return client.fetch_price_lists(property_ids, raise_errors, fields)
+
+
+async def afetch_rental_incomes(property_ids, raise_errors=True, fields=None):
+    with span("fetch_rental_incomes"):
+        return await get_async_client().fetch_rental_incomes(property_ids, raise_errors, fields)
+
+
+async def afetch_price_lists(property_ids, raise_errors=True, fields=None):
+    with span("fetch_price_lists"):
+        return await get_async_client().fetch_price_lists(property_ids, raise_errors, fields)
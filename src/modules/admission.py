@@ -0,0 +1,254 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+from modules.metrics import register_collector
+
+# Total weight of the tool calls allowed to run at once per server process
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", 16))
+# Part of the capacity only light tools (weight 1) may use, so they stay
+# responsive while heavier tools queue
+ADMISSION_RESERVED = int(os.getenv("ADMISSION_RESERVED", 4))
+# Calls allowed to wait for a slot, per tool; further calls are shed at once
+ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", 32))
+# Seconds a call waits for a slot before it is shed
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+# Server processes sharing the limits above (serve.py sets it to its WORKERS). The
+# capacity, the reserve, the wait queues and each tool's maxConcurrency are divided
+# between them, rounding up, so the processes together stay close to the totals
+ADMISSION_PROCESSES = int(os.getenv("ADMISSION_PROCESSES", 1))
+
+
+class Overloaded(Exception):
+    """A tool call was shed; retry_after is a suggested wait in whole seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admits tool calls by weight. Each tool has a "weight" (its expected cost
+    in capacity units, 1 by default) and an optional "maxConcurrency" in
+    tools.py. A call runs once its tool is under its own cap and its weight
+    fits in the free capacity; heavier tools cannot use the reserved part.
+    Otherwise it waits, in a bounded per-tool queue, for up to queue_timeout
+    seconds, and is then shed with an Overloaded error.
+
+    With processes > 1 the limits are totals for that many server processes,
+    each holding its share.
+    """
+
+    def __init__(self, capacity=ADMISSION_CAPACITY, reserved=ADMISSION_RESERVED,
+                 max_waiting=ADMISSION_MAX_WAITING, queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+                 processes=ADMISSION_PROCESSES):
+        self.processes = max(1, processes)
+        self.capacity = self.share(capacity)
+        self.reserved = min(math.ceil(reserved / self.processes), self.capacity - 1)
+        self.max_waiting = self.share(max_waiting)
+        self.queue_timeout = queue_timeout
+        self.in_use = 0
+        self.running = {}
+        self.waiting = {}
+        self.admitted = {}
+        self.shed = {}
+        # Moving average of each tool's run time, for Retry-After
+        self.durations = {}
+        self._condition = threading.Condition()
+
+    def share(self, total):
+        """This process's share of a limit configured as a total, at least 1."""
+        return max(1, math.ceil(total / self.processes))
+
+    def weight(self, tool):
+        # Capped at what a heavy tool may use, so every tool can be admitted once the others finish
+        return max(1, min(int(tool.get("weight", 1)), self.capacity - self.reserved))
+
+    def max_concurrency(self, tool):
+        max_concurrency = tool.get("maxConcurrency")
+        return None if max_concurrency is None else self.share(max_concurrency)
+
+    def _fits(self, tool, weight):
+        name = tool["name"]
+        max_concurrency = self.max_concurrency(tool)
+        if max_concurrency is not None and self.running.get(name, 0) >= max_concurrency:
+            return False
+        limit = self.capacity if weight == 1 else self.capacity - self.reserved
+        return self.in_use + weight <= limit
+
+    def retry_after(self, tool):
+        name = tool["name"]
+        average = self.durations.get(name, 1.0)
+        slots = self.max_concurrency(tool) or max(1, self.capacity // self.weight(tool))
+        return max(1, math.ceil(average * (self.waiting.get(name, 0) + 1) / slots))
+
+    def _shed(self, tool, reason):
+        name = tool["name"]
+        self.shed[name] = self.shed.get(name, 0) + 1
+        raise Overloaded(f"Tool {name} is overloaded ({reason}), retry later", self.retry_after(tool))
+
+    def _take(self, tool, weight):
+        name = tool["name"]
+        self.in_use += weight
+        self.running[name] = self.running.get(name, 0) + 1
+        self.admitted[name] = self.admitted.get(name, 0) + 1
+        return time.monotonic()
+
+    def try_acquire(self, tool):
+        """Admit the call if it fits right now. Returns the start time to pass to release(), or None."""
+        weight = self.weight(tool)
+        with self._condition:
+            if self._fits(tool, weight):
+                return self._take(tool, weight)
+        return None
+
+    def acquire(self, tool, shed=True):
+        """
+        Block until the call is admitted; raises Overloaded when it is shed.
+        With shed=False (for calls already queued elsewhere, like jobs) it
+        waits for as long as it takes instead. Returns the start time.
+        """
+        name = tool["name"]
+        weight = self.weight(tool)
+        with self._condition:
+            if not self._fits(tool, weight):
+                if shed and self.waiting.get(name, 0) >= self.max_waiting:
+                    self._shed(tool, "queue full")
+                self.waiting[name] = self.waiting.get(name, 0) + 1
+                try:
+                    if not self._condition.wait_for(lambda: self._fits(tool, weight), self.queue_timeout if shed else None):
+                        self._shed(tool, f"no capacity within {self.queue_timeout:g}s")
+                finally:
+                    self.waiting[name] -= 1
+            return self._take(tool, weight)
+
+    def release(self, tool, started_at):
+        name = tool["name"]
+        elapsed = time.monotonic() - started_at
+        with self._condition:
+            self.in_use -= self.weight(tool)
+            self.running[name] -= 1
+            previous = self.durations.get(name)
+            self.durations[name] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, tool, shed=True):
+        started_at = self.acquire(tool, shed)
+        try:
+            yield
+        finally:
+            self.release(tool, started_at)
+
+    async def aacquire(self, tool, shed=True):
+        """acquire() for coroutines: waiting for a slot happens off the event loop."""
+        started_at = self.try_acquire(tool)
+        if started_at is None:
+            waiter = asyncio.ensure_future(asyncio.to_thread(self.acquire, tool, shed))
+            try:
+                started_at = await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # The request went away while waiting; give back the slot if the thread still gets one
+                waiter.add_done_callback(
+                    lambda done: done.cancelled() or done.exception() is not None or self.release(tool, done.result())
+                )
+                raise
+        return started_at
+
+    @asynccontextmanager
+    async def aadmit(self, tool, shed=True):
+        started_at = await self.aacquire(tool, shed)
+        try:
+            yield
+        finally:
+            self.release(tool, started_at)
+
+    @contextmanager
+    def admit_stream(self, tool):
+        """
+        Admit a streamed response before it is built. Yields an AdmittedStream;
+        pass the response's chunks to its wrap() to hold the slot until they are
+        written or the response is closed. Otherwise the slot is given back when
+        the block exits.
+        """
+        stream = AdmittedStream(self, tool, self.acquire(tool))
+        try:
+            yield stream
+        finally:
+            if stream.chunks is None:
+                stream.close()
+
+    @asynccontextmanager
+    async def aadmit_stream(self, tool):
+        """admit_stream() for coroutines."""
+        stream = AdmittedStream(self, tool, await self.aacquire(tool))
+        try:
+            yield stream
+        finally:
+            if stream.chunks is None:
+                stream.close()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "capacity": self.capacity,
+                "in_use": self.in_use,
+                "running": dict(self.running),
+                "waiting": dict(self.waiting),
+                "admitted": dict(self.admitted),
+                "shed": dict(self.shed),
+            }
+
+
+class AdmittedStream:
+    def __init__(self, controller, tool, started_at):
+        self.controller = controller
+        self.tool = tool
+        self.chunks = None
+        self.started_at = started_at
+        self._released = False
+        self._lock = threading.Lock()
+
+    def wrap(self, chunks):
+        self.chunks = chunks
+        return self
+
+    def __iter__(self):
+        try:
+            yield from self.chunks
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.controller.release(self.tool, self.started_at)
+
+    def __del__(self):
+        # A response dropped before it was iterated still gives its slot back
+        self.close()
+
+
+admission = AdmissionController()
+
+
+def admission_metric_families():
+    stats = admission.stats()
+    per_tool = lambda key: [({"tool": tool}, value) for tool, value in sorted(stats[key].items())]
+    return [
+        ("cmnd_admission_capacity", "Weight units tool calls may use at once", "gauge", [({}, stats["capacity"])]),
+        ("cmnd_admission_in_use", "Weight units in use by running tool calls", "gauge", [({}, stats["in_use"])]),
+        ("cmnd_admission_running", "Admitted tool calls running", "gauge", per_tool("running")),
+        ("cmnd_admission_waiting", "Tool calls waiting for capacity", "gauge", per_tool("waiting")),
+        ("cmnd_admission_admitted_total", "Tool calls admitted", "counter", per_tool("admitted")),
+        ("cmnd_admission_shed_total", "Tool calls rejected with 429", "counter", per_tool("shed")),
+    ]
+
+
+register_collector("admission", admission_metric_families)
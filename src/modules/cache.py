@@ -0,0 +1,397 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+
+MISSING = object()
+
+
+def estimate_size(value):
+    """Approximate in-memory cost of a JSON-like value, in bytes of its JSON encoding."""
+    return len(json.dumps(value, default=str))
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with a per-entry TTL, LRU eviction and limits on
+    both entry count and total size in bytes.
+
+    Loads are coalesced: while one caller is loading a key, other callers
+    asking for it wait for that result instead of loading it again.
+    """
+
+    def __init__(self, ttl=300, max_entries=4096, max_bytes=64 * 1024 * 1024, sizeof=estimate_size):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._inflight = {}            # key -> Future of the load in progress
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        value, expires_at, size = entry
+        if expires_at <= now:
+            self._remove(key)
+            self.expirations += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _store(self, key, value, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def claim(self, keys):
+        """
+        Split keys into cached values, loads already in flight (key -> Future)
+        and keys this caller now owns and must load and then pass to fulfil().
+        """
+        cached, waiting, owned = {}, {}, {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key, now)
+                if value is not MISSING:
+                    self.hits += 1
+                    cached[key] = value
+                elif key in self._inflight:
+                    self.coalesced += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    owned[key] = self._inflight[key] = Future()
+        return cached, waiting, owned
+
+    def fulfil(self, owned, loaded=None, error=None, ttl=None):
+        """
+        Store what an owner loaded and wake the callers waiting on those keys.
+        Keys already fulfilled (by an owner that gave up on them) are left as they were.
+        """
+        loaded = loaded or {}
+        with self._lock:
+            for key in owned:
+                if key in loaded:
+                    self._store(key, loaded[key], ttl)
+                if self._inflight.get(key) is owned[key]:
+                    del self._inflight[key]
+        for key, future in owned.items():
+            try:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(loaded.get(key, MISSING))
+            except InvalidStateError:
+                pass
+
+    def get_many_or_load(self, keys, loader, ttl=None):
+        """
+        Return {key: value} for keys, calling loader(missing_keys) -> dict only
+        for keys that are neither cached nor being loaded by someone else.
+        Keys the loader leaves out are left out of the result.
+        """
+        results, waiting, owned = self.claim(keys)
+        if owned:
+            try:
+                loaded = loader(list(owned))
+            except BaseException as e:
+                self.fulfil(owned, error=e)
+                raise
+            self.fulfil(owned, loaded, ttl=ttl)
+            results.update((key, loaded[key]) for key in owned if key in loaded)
+        for key, future in waiting.items():
+            value = future.result()
+            if value is not MISSING:
+                results[key] = value
+        return results
+
+    async def aget_many_or_load(self, keys, loader, ttl=None):
+        """get_many_or_load for a coroutine loader; waiting on other callers does not block the event loop."""
+        results, waiting, owned = self.claim(keys)
+        if owned:
+            try:
+                loaded = await loader(list(owned))
+            except BaseException as e:
+                self.fulfil(owned, error=e)
+                raise
+            self.fulfil(owned, loaded, ttl=ttl)
+            results.update((key, loaded[key]) for key in owned if key in loaded)
+        for key, future in waiting.items():
+            value = await asyncio.wrap_future(future)
+            if value is not MISSING:
+                results[key] = value
+        return results
+
+    def get_or_load(self, key, loader, ttl=None):
+        results = self.get_many_or_load([key], lambda keys: {key: loader()}, ttl)
+        if key not in results:
+            # The caller we waited on gave up on this key without raising
+            return loader()
+        return results[key]
+
+    async def aget_or_load(self, key, loader, ttl=None):
+        async def load(keys):
+            return {key: await loader()}
+        results = await self.aget_many_or_load([key], load, ttl)
+        if key not in results:
+            return await loader()
+        return results[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def disk_key(key):
+    """Filename-safe DiskCache key for any JSON-encodable key."""
+    return hashlib.sha256(json.dumps(key, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class SharedTTLCache(TTLCache):
+    """
+    TTLCache in front of a DiskCache that several processes share. Keys
+    missing from memory are looked up on disk before they are loaded, and
+    loaded values are written to both, so a value loaded by one process is
+    served to the others without loading it again. Values must be JSON.
+    """
+
+    def __init__(self, disk, **options):
+        super().__init__(**options)
+        self.disk = disk
+
+    def _from_disk(self, keys):
+        found = {}
+        for key in keys:
+            value = self.disk.get(disk_key(key), MISSING)
+            if value is not MISSING:
+                found[key] = value
+        return found
+
+    def _to_disk(self, loaded, ttl):
+        for key, value in loaded.items():
+            try:
+                self.disk.set(disk_key(key), value, ttl)
+            except Exception as e:
+                print(f"Error writing cache entry {key}: {e}")
+
+    def get_many_or_load(self, keys, loader, ttl=None):
+        def load(missing):
+            found = self._from_disk(missing)
+            rest = [key for key in missing if key not in found]
+            if rest:
+                loaded = loader(rest)
+                self._to_disk(loaded, ttl)
+                found.update(loaded)
+            return found
+        return super().get_many_or_load(keys, load, ttl)
+
+    async def aget_many_or_load(self, keys, loader, ttl=None):
+        async def load(missing):
+            found = await asyncio.to_thread(self._from_disk, missing)
+            rest = [key for key in missing if key not in found]
+            if rest:
+                loaded = await loader(rest)
+                await asyncio.to_thread(self._to_disk, loaded, ttl)
+                found.update(loaded)
+            return found
+        return await super().aget_many_or_load(keys, load, ttl)
+
+    def clear(self):
+        super().clear()
+        self.disk.clear()
+
+
+class DiskCache:
+    """
+    JSON values stored one file per key under a directory, with a TTL. Keys
+    must be filename-safe strings (e.g. hex digests). Writes are atomic, so
+    several server processes can share the directory.
+
+    Each file's modification time is set to its expiry, so a sweep can find
+    expired entries from the directory listing alone. At most every
+    sweep_interval seconds (sooner after many writes) a process sweeps the
+    directory: expired files are deleted, then the entries closest to expiry
+    until at most max_entries files and max_bytes bytes remain.
+    """
+
+    def __init__(self, directory, ttl=300, max_entries=4096, max_bytes=256 * 1024 * 1024, sweep_interval=30):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.evictions = 0
+        self.expirations = 0
+        self._swept_at = time.monotonic()
+        self._written_entries = 0
+        self._written_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, default=None):
+        self.maybe_sweep()
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return default
+        if entry["expires_at"] <= time.time():
+            self.delete(key)
+            return default
+        return entry["value"]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+                size = f.tell()
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._written_entries += 1
+            self._written_bytes += size
+        self.maybe_sweep()
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self.delete(name[:-len(".json")])
+
+    def maybe_sweep(self):
+        """Sweep when sweep_interval has passed, or when this process has written an eighth of a bound since the last sweep."""
+        with self._lock:
+            due = (
+                time.monotonic() - self._swept_at >= self.sweep_interval
+                or self._written_entries * 8 >= self.max_entries
+                or self._written_bytes * 8 >= self.max_bytes
+            )
+            if not due:
+                return
+            self._swept_at = time.monotonic()
+            self._written_entries = self._written_bytes = 0
+        try:
+            self.sweep()
+        except Exception as e:
+            print(f"Error sweeping cache directory {self.directory}: {e}")
+
+    def sweep(self):
+        """Delete expired entries, then evict the entries closest to expiry down to the bounds."""
+        # One process sweeps at a time; the others skip this round
+        with open(os.path.join(self.directory, ".sweep.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.directory):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(".tmp"):
+                    # Left behind by a writer that died mid-write
+                    if stat.st_ctime < now - 60:
+                        self._unlink(entry.path)
+                elif entry.name.endswith(".json"):
+                    if stat.st_mtime <= now:
+                        self._unlink(entry.path)
+                        self.expirations += 1
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            evict = 0
+            while evict < len(entries) and (len(entries) - evict > self.max_entries or total_bytes > self.max_bytes):
+                total_bytes -= entries[evict][1]
+                self._unlink(entries[evict][2])
+                self.evictions += 1
+                evict += 1
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,144 @@
+import ast
+import json
+import re
+import threading
+import time
+
+from modules.metrics import span, register_collector
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib parser
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads_json(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class ParseStats:
+    """Running totals of projects_data parses, per format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, fmt, size, seconds):
+        with self._lock:
+            self.counts[fmt] = self.counts.get(fmt, 0) + 1
+            self.bytes += size
+            self.seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {"counts": dict(self.counts), "bytes": self.bytes, "seconds": self.seconds}
+
+
+parse_stats = ParseStats()
+
+
+def parse_metric_families():
+    stats = parse_stats.snapshot()
+    return [
+        ("cmnd_projects_data_parses_total", "projects_data payloads parsed, by format", "counter",
+         [({"format": fmt}, count) for fmt, count in sorted(stats["counts"].items())]),
+        ("cmnd_projects_data_parsed_bytes_total", "Characters of projects_data parsed", "counter", [({}, stats["bytes"])]),
+        ("cmnd_projects_data_parse_seconds_total", "Seconds spent parsing projects_data", "counter", [({}, stats["seconds"])]),
+    ]
+
+
+register_collector("parse", parse_metric_families)
+
+
+# Tokens of a Python literal: runs of text that only need their quotes swapped to be
+# JSON (punctuation, numbers and strings without quotes or escapes inside), other
+# strings, and the constants
+PYTHON_TOKEN = re.compile(
+    r"""(?P<run>(?:[^'"\\TFN]+|'[^'"\\\n]*')+)|'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|\b(?:True|False|None)\b"""
+)
+PYTHON_ESCAPE = re.compile(r"""\\(x[0-9a-fA-F]{2}|.)|(")""")
+PYTHON_CONSTANTS = {"True": "true", "False": "false", "None": "null"}
+# Escapes that mean the same in a Python string and a JSON string
+JSON_ESCAPES = frozenset('nrtbf"\\/u')
+
+
+def json_escape(match):
+    escape, quote = match.groups()
+    if quote:
+        return '\\"'
+    if escape == "'":
+        return "'"
+    if escape in JSON_ESCAPES:
+        return match.group()
+    if escape[0] == "x" and len(escape) == 3:
+        return "\\u00" + escape[1:]
+    raise ValueError(f"no JSON escape for \\{escape}")
+
+
+def json_token(match):
+    token = match.group()
+    if match.lastgroup == "run":
+        return token.replace("'", '"')
+    if token in PYTHON_CONSTANTS:
+        return PYTHON_CONSTANTS[token]
+    body = token[1:-1]
+    if "\\" not in body:
+        return token if token[0] == '"' else '"' + body.replace('"', '\\"') + '"'
+    try:
+        return '"' + PYTHON_ESCAPE.sub(json_escape, body) + '"'
+    except ValueError:
+        # Rare escapes (octal, \N{...}, ...) are decoded by Python itself
+        return json.dumps(ast.literal_eval(token))
+
+
+def python_literal_to_json(text):
+    """
+    JSON text for a Python literal such as the repr of a list of dicts, or
+    JSON written with single quotes, without building an AST. Whole runs of
+    plain strings are converted per match, so only strings with quotes or
+    escapes inside and the constants cost a call each.
+    """
+    return PYTHON_TOKEN.sub(json_token, text)
+
+
+def decode_projects_data(projects_data):
+    """
+    Rows of a projects_data payload and the format it was in.
+
+    Real JSON is parsed in one pass by the fastest available backend. A
+    Python literal (the repr of a list of dicts) is converted to JSON token
+    by token, keeping quotes inside values intact, and parsed the same way.
+    ast.literal_eval is only the last resort, for literals the conversion
+    cannot handle, as it takes many times the time and memory.
+    """
+    try:
+        return loads_json(projects_data), JSON_BACKEND
+    except ValueError as json_error:
+        error = json_error
+    try:
+        return loads_json(python_literal_to_json(projects_data)), "python"
+    except (ValueError, SyntaxError):
+        pass
+    try:
+        return ast.literal_eval(projects_data), "python literal"
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise Exception(f"Failed to parse projects data: {error}")
+
+
+def parse_projects_data(projects_data):
+    """decode_projects_data() that records the payload size and parse time in parse_stats."""
+    start = time.perf_counter()
+    with span("parse"):
+        rows, fmt = decode_projects_data(projects_data)
+    seconds = time.perf_counter() - start
+    size = len(projects_data)
+    if not isinstance(rows, list):
+        raise Exception(f"Failed to parse projects data: expected a list of properties, got {type(rows).__name__}")
+    parse_stats.record(fmt, size, seconds)
+    return rows
@@ -1,6 +1,5 @@
 from typing import List, Dict
-from models import InvestmentOptionsSchema
-from modules.filter_investment_options import filter_investment_options
+from modules.request_context import AnalysisContext
 # from modules.access_data import fetch_price_list, fetch_rental_income, fetch_available_projects
 
 def format_property_data(property, rental_income=None, price_list=None):
@@ -41,28 +40,15 @@ def format_property_data(property, rental_income=None, price_list=None):
     
     return formatted_data
 
-def run_cost_comparison_module(**props):
-    try:
-        parameters = InvestmentOptionsSchema(**props)
-    except Exception as e:
-        return {"error": str(e)}
+def run_cost_comparison_module(context: AnalysisContext = None, **props):
+    if context is None:
+        try:
+            context = AnalysisContext.from_props(**props)
+        except Exception as e:
+            return {"error": str(e)}
 
-    properties = filter_investment_options(parameters)
-    if not properties:
-        return {"message": "No properties found matching the criteria."}
-    comparison_data = []
-    for property in properties:
-        property_id = property['propertyID']
-        
-    #    try:
-    #         price_list = fetch_price_list(property_id)[0]
-    #         rental_income = fetch_rental_income(property_id)
-    #     except Exception as e:
-    #         print(f"error: Failed to fetch data for property ID {property_id}: {str(e)}")
-    #         continue
+    comparison_data = [format_property_data(property) for property in context.iter_filtered_projects()]
 
-    #     if price_list and rental_income:
-        formatted_data = format_property_data(property)
-        comparison_data.append(formatted_data)
-        
-    return {"properties": comparison_data}
\ No newline at end of file
+    if not comparison_data:
+        return {"message": "No properties found matching the criteria."}
+    return context.paginate({"properties": comparison_data})
\ No newline at end of file
@@ -0,0 +1,143 @@
+import asyncio
+import inspect
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Processes in the pool used by tools flagged "isCpuHeavy" (per server process;
+# serve.py divides the CPUs between its workers unless this is set)
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", os.cpu_count() or 1))
+# Items sent to a pool process at a time
+CPU_POOL_CHUNK_SIZE = int(os.getenv("CPU_POOL_CHUNK_SIZE", 256))
+# Smaller batches cost less to run in the calling thread than to send to the pool
+CPU_POOL_MIN_ITEMS = int(os.getenv("CPU_POOL_MIN_ITEMS", 512))
+# "spawn" by default: forking a multi-threaded server process is not safe
+CPU_POOL_START_METHOD = os.getenv("CPU_POOL_START_METHOD", "spawn")
+
+
+def chunked(items, chunk_size):
+    return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+
+class InlineExecutor:
+    """Runs batches in the calling thread. Used by tools that are not CPU-heavy."""
+
+    def map_chunks(self, fn, items):
+        return fn(list(items))
+
+    async def amap_chunks(self, fn, items):
+        # In a worker thread, so the batch does not hold up the event loop
+        return await asyncio.to_thread(self.map_chunks, fn, items)
+
+
+class ProcessExecutor:
+    """
+    Runs batches in a process pool, so CPU-bound work does not hold the GIL
+    of the process serving requests.
+
+    map_chunks(fn, items) splits items into chunks of chunk_size, runs
+    fn(chunk) -> list for each in the pool and concatenates the results in
+    the order of the items. fn, the items and the results must be picklable,
+    and fn a module-level function (or a partial of one). Batches under
+    min_items run inline. The pool is started on first use, once per process.
+    """
+
+    def __init__(self, workers=CPU_POOL_WORKERS, chunk_size=CPU_POOL_CHUNK_SIZE,
+                 min_items=CPU_POOL_MIN_ITEMS, start_method=CPU_POOL_START_METHOD):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.min_items = min_items
+        self.start_method = start_method
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method)
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _submit(self, fn, items):
+        """Futures of the chunks of items, or None when the batch should run inline."""
+        if self.workers < 1 or len(items) < max(self.min_items, 1):
+            return None
+        return [self.pool.submit(fn, chunk) for chunk in chunked(items, self.chunk_size)]
+
+    def map_chunks(self, fn, items):
+        items = list(items)
+        futures = self._submit(fn, items)
+        if futures is None:
+            return fn(items)
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    async def amap_chunks(self, fn, items):
+        items = list(items)
+        futures = self._submit(fn, items)
+        if futures is None:
+            return await asyncio.to_thread(fn, items)
+        results = []
+        for chunk_results in await asyncio.gather(*(asyncio.wrap_future(future) for future in futures)):
+            results.extend(chunk_results)
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+inline_executor = InlineExecutor()
+process_executor = ProcessExecutor()
+
+current_executor = ContextVar("current_executor", default=inline_executor)
+
+
+def executor_for(tool):
+    return process_executor if tool.get("isCpuHeavy") else inline_executor
+
+
+@contextmanager
+def use_executor(executor):
+    token = current_executor.set(executor)
+    try:
+        yield executor
+    finally:
+        current_executor.reset(token)
+
+
+async def _await_with(executor, awaitable):
+    with use_executor(executor):
+        return await awaitable
+
+
+def call_with_executor(executor, fn, /, **kwargs):
+    """
+    fn(**kwargs) with executor as the current executor. A coroutine result is
+    wrapped so the executor also applies while it runs, on whichever loop that is.
+    """
+    with use_executor(executor):
+        result = fn(**kwargs)
+    if inspect.isawaitable(result):
+        return _await_with(executor, result)
+    return result
+
+
+def map_chunks(fn, items):
+    """fn over items in chunks, on the current tool's executor. Results come back in order."""
+    return current_executor.get().map_chunks(fn, items)
+
+
+async def amap_chunks(fn, items):
+    return await current_executor.get().amap_chunks(fn, items)
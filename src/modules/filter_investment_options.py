@@ -1,67 +1,136 @@
+import base64
+import heapq
 import json
+
+import numpy as np
+
 from models import InvestmentOptionsSchema
+from modules.inventory_store import get_inventory_store, FIELD_POSITIONS
+from modules.metrics import span
 
-def filter_investment_options(parameters: InvestmentOptionsSchema):
-    print("here")
-    # Convert the projects_data string to a list of dictionaries
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
     try:
-        projects_data = json.loads(parameters.projects_data.replace("'", '"'))
-        # print(f"projects_data: {projects_data}")
-    except json.JSONDecodeError as e:
-        raise Exception(f"Failed to parse projects data: {e}")
-    
-    filtered_projects = []
-
-    for property in projects_data:
-            # print(property)
-            if (property['price'] >= parameters.budget_min and
-                property['price'] <= parameters.budget_max and
-                (property['total_area_sqmeter'] >= parameters.size_min if parameters.size_min else True) and
-                (property['total_area_sqmeter'] <= parameters.size_max if parameters.size_max else True) and
-                (property['no_of_rooms'] >= parameters.bedrooms_min if parameters.bedrooms_min else True) and
-                (property['no_of_rooms'] <= parameters.bedrooms_max if parameters.bedrooms_max else True) and
-                (property['no_of_bathrooms'] >= parameters.bathrooms_min if parameters.bathrooms_min else True) and
-                (property['no_of_bathrooms'] <= parameters.bathrooms_max if parameters.bathrooms_max else True) and
-                ((property['type']).lower() == parameters.property_type.lower() if parameters.property_type else True)):
-                try:
-                    filtered_projects.append({
-                        'projectID': property['projectID'],
-                        'projectName': property['projectName'],
-                        'propertyDeveloper': property['propertyDeveloper'],
-                        'location': property['location'],
-                        'description': property['description'],
-                        'purpose': property['purpose'],
-                        'start_date': property['start_date'],
-                        'completion_date': property['completion_date'],
-                        'facilities': property['facilities'],
-                        'no_of_installments': property['no_of_installments'],
-                        'no_of_properties': property['no_of_properties'],
-                        'percentage_sold': property['percentage_sold'],
-                        'propertyID': property['propertyID'],
-                        'no_of_rooms': property['no_of_rooms'],
-                        'total_area_sqmeter': property['total_area_sqmeter'],
-                        'no_of_bathrooms': property['no_of_bathrooms'],
-                        'price': property['price'],
-                        'interior_sqmeter': property['interior_sqmeter'],
-                        'balcony_terrace_sqmeter': property['balcony_terrace_sqmeter'],
-                        'rooftop_sqmeter': property['rooftop_sqmeter'],
-                        'total_living_space_sqmeter': property['total_living_space_sqmeter'],
-                        'installment_payment_plan': property['installment_payment_plan'],
-                        'VAT': property['VAT'],
-                        'stamp_duty': property['stamp_duty'],
-                        'title_deed_transfer': property['title_deed_transfer'],
-                        'lawyer_fees': property['lawyer_fees'],
-                        'price': property['price'],
-                        'ImageURL OR VideoURL': property['ImageURL'] or property['VideoURL'],
-                        # 'ImageURL': property['image_url'][0] if property['image_url'] else None
-                    })
-                except Exception as e:
-                     print("Error filtering properties: ", e)
-
-    if not filtered_projects:
-        return []
-
-    if parameters.sort_by and parameters.sort_by in filtered_projects[0]:
-        filtered_projects = sorted(filtered_projects, key=lambda x: x[parameters.sort_by])
-
-    return filtered_projects
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception as e:
+        raise Exception(f"Invalid cursor: {e}")
+    if not isinstance(state, dict) or not isinstance(state.get('index'), int):
+        raise Exception("Invalid cursor: not a cursor returned by this tool")
+    return state
+
+
+def smallest_k(keys, k):
+    """Positions of the k smallest keys in stable sorted order, using a partial sort instead of a full one."""
+    if k is None or k >= len(keys):
+        return np.argsort(keys, kind='stable')
+    kth = np.partition(keys, k - 1)[k - 1]
+    below = np.flatnonzero(keys < kth)
+    ties = np.flatnonzero(keys == kth)[:k - len(below)]
+    candidates = np.sort(np.concatenate([below, ties]))
+    return candidates[np.argsort(keys[candidates], kind='stable')]
+
+
+def after_cursor(value, index, last_value, last_index, descending):
+    """True if (value, index) comes after the cursor position in the page order."""
+    if value == last_value:
+        return index > last_index
+    return value < last_value if descending else value > last_value
+
+
+def select_investment_page(parameters: InvestmentOptionsSchema):
+    """
+    Filter, order and page the inventory.
+
+    Returns (store, rows, next_cursor) where rows are the store positions of
+    the page in order. Ties keep inventory order, so pages are stable;
+    next_cursor is None unless a limit is set and more properties follow.
+    """
+    # The payload is parsed into a columnar store once per distinct projects_data
+    with span("inventory"):
+        store = get_inventory_store(parameters.projects_data, parameters.inventory_id)
+    with span("filter"):
+        return select_page(store, parameters)
+
+
+def select_page(store, parameters: InvestmentOptionsSchema):
+    """select_investment_page() over an inventory store that is already loaded."""
+    indices = store.filter(parameters)
+    if not len(indices):
+        return store, [], None
+
+    sort_by = parameters.sort_by
+    column = store.sort_column(sort_by) if sort_by else None
+    if column is None and sort_by not in FIELD_POSITIONS:
+        sort_by = None
+    descending = bool(parameters.descending) and sort_by is not None
+
+    if parameters.cursor:
+        state = decode_cursor(parameters.cursor)
+        if state.get('inventory') != store.digest or state.get('sort_by') != sort_by or state.get('descending') != descending:
+            raise Exception("Cursor does not belong to this inventory and sort order")
+        last_value, last_index = state.get('value'), state['index']
+    else:
+        last_value = last_index = None
+
+    end = parameters.offset + parameters.limit if parameters.limit else None
+
+    if column is not None:
+        values = column[indices]
+        if last_index is not None:
+            if descending:
+                keep = (values < last_value) | ((values == last_value) & (indices > last_index))
+            else:
+                keep = (values > last_value) | ((values == last_value) & (indices > last_index))
+            indices, values = indices[keep], values[keep]
+        order = smallest_k(-values if descending else values, end)
+        page = indices[order[parameters.offset:end]]
+        value_of = lambda i: float(column[i])
+    elif sort_by:
+        value_of = lambda i: store.field(i, sort_by)
+        candidates = [i for i in indices.tolist()
+                      if last_index is None or after_cursor(value_of(i), i, last_value, last_index, descending)]
+        indices = candidates
+        if end is not None:
+            select = heapq.nlargest if descending else heapq.nsmallest
+            ordered = select(end, candidates, key=value_of)
+        else:
+            ordered = sorted(candidates, key=value_of, reverse=descending)
+        page = ordered[parameters.offset:end]
+    else:
+        if last_index is not None:
+            indices = indices[indices > last_index]
+        page = indices[parameters.offset:end]
+        value_of = lambda i: None
+
+    next_cursor = None
+    if end is not None and len(indices) > end and len(page):
+        last = int(page[-1])
+        next_cursor = encode_cursor({
+            'inventory': store.digest,
+            'sort_by': sort_by,
+            'descending': descending,
+            'value': value_of(last),
+            'index': last,
+        })
+
+    return store, page, next_cursor
+
+
+def filter_investment_page(parameters: InvestmentOptionsSchema):
+    """(properties, next_cursor) for one page of the inventory."""
+    store, page, next_cursor = select_investment_page(parameters)
+    return [dict(store.view(i)) for i in page], next_cursor
+
+
+def iter_investment_options(parameters: InvestmentOptionsSchema):
+    """Lazily yield read-only RowViews of the page's properties, without copying them."""
+    store, page, _ = select_investment_page(parameters)
+    return store.iter_views(page)
+
+
+def filter_investment_options(parameters: InvestmentOptionsSchema):
+    return filter_investment_page(parameters)[0]
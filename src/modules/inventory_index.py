@@ -0,0 +1,91 @@
+import numpy as np
+
+# Only depends on NumPy, so the data service can share these index types.
+
+EMPTY_ROWS = np.zeros(0, dtype=np.intp)
+
+
+class SortedIndex:
+    """
+    Row positions ordered by a numeric column. Range lookups are a binary
+    search (np.searchsorted, i.e. bisect) on the sorted values, so a query only
+    touches the rows inside the range.
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.order = np.argsort(values, kind='stable')
+        self.sorted_values = values[self.order]
+
+    @classmethod
+    def from_sorted(cls, order, sorted_values):
+        """Index over a precomputed ordering, e.g. arrays memory-mapped from a snapshot."""
+        index = cls.__new__(cls)
+        index.order = order
+        index.sorted_values = sorted_values
+        return index
+
+    def __len__(self):
+        return len(self.order)
+
+    def range(self, low=None, high=None):
+        """Row positions with low <= value <= high (either bound optional), in value order."""
+        start = 0 if low is None else np.searchsorted(self.sorted_values, low, side='left')
+        stop = len(self) if high is None else np.searchsorted(self.sorted_values, high, side='right')
+        if stop <= start:
+            return EMPTY_ROWS
+        return self.order[start:stop]
+
+
+class InvertedIndex:
+    """
+    Integer codes and posting lists for a categorical column: each distinct
+    value maps to the sorted row positions holding it.
+    """
+
+    def __init__(self, values, normalize=None):
+        self.normalize = normalize
+        self.vocabulary = {}
+        self.codes = np.array(
+            [self.vocabulary.setdefault(self.key(value), len(self.vocabulary)) for value in values],
+            dtype=np.int32
+        )
+        self.order = np.argsort(self.codes, kind='stable')
+        self.bounds = np.searchsorted(self.codes[self.order], np.arange(len(self.vocabulary) + 1))
+        self.postings = [self.order[self.bounds[code]:self.bounds[code + 1]] for code in range(len(self.vocabulary))]
+
+    @classmethod
+    def from_codes(cls, keys, codes, order, bounds, normalize=None):
+        """
+        Index over precomputed codes and postings (codes sorted by order,
+        code c's rows at order[bounds[c]:bounds[c + 1]]), e.g. from a snapshot.
+        """
+        index = cls.__new__(cls)
+        index.normalize = normalize
+        index.vocabulary = {key: code for code, key in enumerate(keys)}
+        index.codes = codes
+        index.order = order
+        index.bounds = bounds
+        index.postings = [order[bounds[code]:bounds[code + 1]] for code in range(len(keys))]
+        return index
+
+    def key(self, value):
+        return self.normalize(value) if self.normalize else value
+
+    def code(self, value):
+        return self.vocabulary.get(self.key(value))
+
+    def rows(self, value):
+        code = self.code(value)
+        return EMPTY_ROWS if code is None else self.postings[code]
+
+
+def intersect_rows(*row_sets):
+    """Sorted row positions present in every row set."""
+    row_sets = sorted(row_sets, key=len)
+    rows = np.sort(row_sets[0])
+    for other in row_sets[1:]:
+        if not len(rows):
+            break
+        rows = rows[np.isin(rows, other, assume_unique=True)]
+    return rows
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+from threading import Lock
+
+from modules.codec import parse_projects_data
+from modules.inventory_store import InventoryStore, FIELD_POSITIONS, STORED_FIELDS, compact_record, inventory_digest
+
+# Registered inventories (and patched versions) kept in memory per process
+MAX_REGISTERED_INVENTORIES = int(os.getenv("MAX_REGISTERED_INVENTORIES", 64))
+# Set to a directory to also keep registered inventories there as snapshots, so
+# every worker process can open an inventory registered with any of them
+INVENTORY_REGISTRY_DIR = os.getenv("INVENTORY_REGISTRY_DIR")
+
+
+def raw_row(record):
+    """The projects_data row a compact record was built from, as far as compact_record reads it."""
+    row = dict(zip(STORED_FIELDS, record))
+    del row['ImageURL OR VideoURL']
+    return row
+
+
+def patch_digest(base_id, patch):
+    payload = json.dumps([base_id, patch], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def checked_record(row, shared, entry):
+    """compact_record() for a row sent in a patch, raising with the patch entry named when the row is invalid."""
+    try:
+        record = compact_record(row, shared)
+    except KeyError as e:
+        raise Exception(f"{entry} is missing the field {e}")
+    except Exception as e:
+        raise Exception(f"{entry} is invalid: {e}")
+    for field in ('price', 'total_area_sqmeter', 'no_of_rooms', 'no_of_bathrooms'):
+        value = record[FIELD_POSITIONS[field]]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise Exception(f"{entry} has a non-numeric {field}: {value!r}")
+    return record
+
+
+def apply_patch(store, patch, digest):
+    """
+    New InventoryStore with a patch applied to store, reusing the records of
+    unchanged rows. The patch holds:
+      added:   rows in the projects_data shape, appended in order; a
+               propertyID already in the inventory is rejected
+      removed: propertyIDs to drop
+      changed: field updates, each with a propertyID (that property) or a
+               projectID (every property of that project)
+    An invalid row and a removed or changed ID that is not in the inventory
+    are rejected, naming the entry, rather than skipped.
+    """
+    property_id_position = FIELD_POSITIONS['propertyID']
+    project_id_position = FIELD_POSITIONS['projectID']
+    base_records = [store.records[row] for row in range(len(store))]
+    base_records = [record for record in base_records if record is not None]
+    property_ids = {record[property_id_position] for record in base_records}
+    project_ids = {record[project_id_position] for record in base_records}
+
+    removed = set(patch.get('removed') or [])
+    for property_id in patch.get('removed') or []:
+        if property_id not in property_ids:
+            raise Exception(f"Removed property {property_id} is not in the inventory")
+    property_changes, project_changes = {}, {}
+    for index, change in enumerate(patch.get('changed') or []):
+        fields = {key: value for key, value in change.items() if key not in ('propertyID', 'projectID')}
+        if 'propertyID' in change:
+            if change['propertyID'] not in property_ids:
+                raise Exception(f"Changed property {change['propertyID']} is not in the inventory")
+            property_changes.setdefault(change['propertyID'], {}).update(fields)
+        elif 'projectID' in change:
+            if change['projectID'] not in project_ids:
+                raise Exception(f"Changed project {change['projectID']} is not in the inventory")
+            project_changes.setdefault(change['projectID'], {}).update(fields)
+        else:
+            raise Exception(f"Changed entry {index} needs a propertyID or a projectID")
+
+    records = []
+    shared = {}
+    for record in base_records:
+        property_id = record[property_id_position]
+        if property_id in removed:
+            continue
+        changes = {
+            **project_changes.get(record[project_id_position], {}),
+            **property_changes.get(property_id, {}),
+        }
+        if changes:
+            record = checked_record({**raw_row(record), **changes}, shared, f"Changed property {property_id}")
+        records.append(record)
+
+    property_ids = {record[property_id_position] for record in records}
+    for index, row in enumerate(patch.get('added') or []):
+        if not isinstance(row, dict):
+            raise Exception(f"Added row {index} is not an object")
+        record = checked_record(row, shared, f"Added row {index} ({row.get('propertyID')})")
+        if record[property_id_position] in property_ids:
+            raise Exception(f"Added property {record[property_id_position]} is already in the inventory; send it under changed instead")
+        property_ids.add(record[property_id_position])
+        records.append(record)
+    return InventoryStore.from_records(records, digest)
+
+
+class InventoryRegistry:
+    """
+    Inventories registered once by their callers and then referred to by ID.
+
+    IDs are content hashes: registering the same payload twice returns the
+    same ID, and a patch produces a new ID derived from its base and the patch,
+    leaving the base version untouched for calls and cursors still using it.
+    """
+
+    def __init__(self, max_inventories=MAX_REGISTERED_INVENTORIES, directory=INVENTORY_REGISTRY_DIR):
+        self.max_inventories = max_inventories
+        self.directory = directory
+        self._stores = OrderedDict()
+        self._lock = Lock()
+
+    def _put(self, inventory_id, store):
+        with self._lock:
+            self._stores[inventory_id] = store
+            self._stores.move_to_end(inventory_id)
+            while len(self._stores) > self.max_inventories:
+                self._stores.popitem(last=False)
+
+    def _persist(self, inventory_id, store):
+        path = self._path(inventory_id)
+        if path is not None:
+            from modules.inventory_snapshot import write_store_snapshot
+            write_store_snapshot(store, path)
+
+    def _path(self, inventory_id):
+        """Snapshot directory of an inventory, or None without a registry directory or for a malformed ID."""
+        if not self.directory or not inventory_id or any(c not in '0123456789abcdef' for c in inventory_id):
+            return None
+        return os.path.join(self.directory, inventory_id)
+
+    def _open(self, inventory_id):
+        path = self._path(inventory_id)
+        if path is None or not os.path.isdir(path):
+            return None
+        from modules.inventory_snapshot import open_snapshot
+        store = open_snapshot(path)
+        store.digest = inventory_id
+        return store
+
+    def register(self, projects_data):
+        """Parse and index a projects_data payload. Returns (inventory_id, store)."""
+        inventory_id = inventory_digest(projects_data)
+        store = self.find(inventory_id)
+        if store is None:
+            store = InventoryStore(parse_projects_data(projects_data), digest=inventory_id)
+            self._persist(inventory_id, store)
+            self._put(inventory_id, store)
+        return inventory_id, store
+
+    def patch(self, base_id, patch):
+        """Apply a patch to a registered inventory. Returns (new inventory_id, store)."""
+        inventory_id = patch_digest(base_id, patch)
+        store = self.find(inventory_id)
+        if store is None:
+            store = apply_patch(self.get(base_id), patch, inventory_id)
+            self._persist(inventory_id, store)
+            self._put(inventory_id, store)
+        return inventory_id, store
+
+    def find(self, inventory_id):
+        with self._lock:
+            store = self._stores.get(inventory_id)
+            if store is not None:
+                self._stores.move_to_end(inventory_id)
+                return store
+        store = self._open(inventory_id)
+        if store is not None:
+            self._put(inventory_id, store)
+        return store
+
+    def get(self, inventory_id):
+        store = self.find(inventory_id)
+        if store is None:
+            raise Exception(f"Unknown inventory_id {inventory_id}; register the inventory again")
+        return store
+
+    def remove(self, inventory_id):
+        with self._lock:
+            found = self._stores.pop(inventory_id, None) is not None
+        path = self._path(inventory_id)
+        if path is not None and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            found = True
+        return found
+
+    def summary(self, inventory_id, store, **extra):
+        return {"inventory_id": inventory_id, "rows": int(store.valid.sum()), **extra}
+
+
+inventory_registry = InventoryRegistry()
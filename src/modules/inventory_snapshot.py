@@ -0,0 +1,303 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+from threading import Lock
+
+import numpy as np
+
+from modules.inventory_index import SortedIndex, InvertedIndex
+from modules.inventory_store import InventoryStore, STORED_FIELDS, NUMERIC_COLUMNS, normalize_type
+
+# Snapshot used by tool calls that do not send projects_data
+INVENTORY_SNAPSHOT = os.getenv("INVENTORY_SNAPSHOT")
+# Seconds between checks for a newer snapshot version
+INVENTORY_SNAPSHOT_RELOAD_INTERVAL = float(os.getenv("INVENTORY_SNAPSHOT_RELOAD_INTERVAL", 5))
+# Decoded value-table entries each process keeps per snapshot (least recently used dropped first)
+SNAPSHOT_DECODED_VALUES = int(os.getenv("SNAPSHOT_DECODED_VALUES", 65536))
+
+SNAPSHOT_VERSION = 1
+
+# A snapshot is a directory holding one subdirectory per written version and a
+# CURRENT file naming the active one, so a new version can be published while
+# processes still have the previous one mapped. Each version holds:
+#   manifest.json            version, row count, record fields, digest, type vocabulary
+#   <column>.npy             float64 NUMERIC_COLUMNS and the valid-row mask
+#   price_order/_sorted.npy  SortedIndex arrays for price and area (area_order/_sorted)
+#   type_codes/_order/_bounds.npy  InvertedIndex arrays for the property type
+#   record_codes.npy         int32 (rows x fields) codes into the value table, -1 for invalid rows
+#   value_offsets.npy, values.npy  value table: distinct JSON-encoded field values, back to back
+
+
+def save_array(directory, name, array):
+    np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+
+def load_array(directory, name):
+    # asarray drops the np.memmap subclass but keeps the same memory-mapped buffer
+    return np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r'))
+
+
+def encode_records(records):
+    """Dictionary-encode compact records: (rows x fields code matrix, value offsets, value bytes)."""
+    value_codes = {}
+    # Compact records share interned strings and lists, so most values are
+    # recognised without encoding them again: scalars by value, the rest by identity
+    seen = {}
+    chunks = []
+    record_codes = np.full((len(records), len(STORED_FIELDS)), -1, dtype=np.int32)
+    for row, record in enumerate(records):
+        if record is None:
+            continue
+        codes = []
+        for value in record:
+            key = (type(value), value) if isinstance(value, (str, int, float, type(None))) else id(value)
+            code = seen.get(key)
+            if code is None:
+                encoded = json.dumps(value, separators=(',', ':')).encode('utf-8')
+                code = value_codes.get(encoded)
+                if code is None:
+                    code = value_codes[encoded] = len(chunks)
+                    chunks.append(encoded)
+                seen[key] = code
+            codes.append(code)
+        record_codes[row] = codes
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in chunks], out=offsets[1:])
+    values = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+    return record_codes, offsets, values
+
+
+def write_snapshot(rows, path):
+    """
+    Write inventory rows (the projects_data shape) as a new snapshot version
+    under path and make it current. Returns the snapshot digest.
+    """
+    return write_store_snapshot(InventoryStore(rows), path)
+
+
+def write_store_snapshot(store, path):
+    """write_snapshot() for an InventoryStore that is already built."""
+    record_codes, offsets, values = encode_records(store.records)
+    arrays = {name: getattr(store, name) for name in NUMERIC_COLUMNS}
+    arrays.update({
+        'valid': store.valid,
+        'price_order': store.price_index.order,
+        'price_sorted': store.price_index.sorted_values,
+        'area_order': store.area_index.order,
+        'area_sorted': store.area_index.sorted_values,
+        'type_codes': store.type_index.codes,
+        'type_order': store.type_index.order,
+        'type_bounds': store.type_index.bounds,
+        'record_codes': record_codes,
+        'value_offsets': offsets,
+        'values': values,
+    })
+
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    digest = digest.hexdigest()
+
+    os.makedirs(path, exist_ok=True)
+    version = digest[:16]
+    version_dir = os.path.join(path, version)
+    if not os.path.isdir(version_dir):
+        staging_dir = tempfile.mkdtemp(dir=path, prefix='.staging-')
+        for name, array in arrays.items():
+            save_array(staging_dir, name, array)
+        manifest = {
+            'version': SNAPSHOT_VERSION,
+            'rows': len(store),
+            'fields': list(STORED_FIELDS),
+            'digest': digest,
+            'types': list(store.type_index.vocabulary),
+            'created_at': time.time(),
+        }
+        with open(os.path.join(staging_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(staging_dir, version_dir)
+        except OSError:
+            # Another writer published the same version first
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            if not os.path.isdir(version_dir):
+                raise
+
+    previous = read_current(path)
+    fd, current_tmp = tempfile.mkstemp(dir=path, prefix='.current-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(path, 'CURRENT'))
+
+    # Keep the previous version for processes that still have it mapped
+    for name in os.listdir(path):
+        if name not in (version, previous, 'CURRENT') and not name.startswith('.'):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    print(f"Wrote inventory snapshot {version} ({len(store)} rows) to {path}")
+    return digest
+
+
+def read_current(path):
+    try:
+        with open(os.path.join(path, 'CURRENT')) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class SnapshotRecords:
+    """
+    Compact records of a snapshot, decoded on access from the memory-mapped
+    code matrix and value table. The most recently used max_decoded values
+    are kept decoded, so hot values (types, locations, developers) are shared
+    between rows without each process building a heap copy of the whole table.
+    """
+
+    def __init__(self, record_codes, offsets, values, max_decoded=SNAPSHOT_DECODED_VALUES):
+        self.record_codes = record_codes
+        self.offsets = offsets
+        self.values = values
+        self.value = lru_cache(maxsize=max_decoded)(self.decode)
+
+    def __len__(self):
+        return len(self.record_codes)
+
+    def decode(self, code):
+        start, stop = self.offsets[code], self.offsets[code + 1]
+        return json.loads(self.values[start:stop].tobytes())
+
+    def __getitem__(self, row):
+        codes = self.record_codes[row]
+        if codes[0] < 0:
+            return None
+        return tuple(self.value(int(code)) for code in codes)
+
+
+def open_snapshot(path):
+    """InventoryStore over the current version of the snapshot at path, memory-mapped rather than read."""
+    version = read_current(path)
+    directory = os.path.join(path, version) if version else path
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise Exception(f"No inventory snapshot found at {path}")
+    if manifest['version'] != SNAPSHOT_VERSION:
+        raise Exception(f"Unsupported inventory snapshot version {manifest['version']} at {directory}")
+    if manifest['fields'] != list(STORED_FIELDS):
+        raise Exception(f"Inventory snapshot at {directory} was written with different record fields")
+
+    load = lambda name: load_array(directory, name)
+    type_index = InvertedIndex.from_codes(
+        manifest['types'], load('type_codes'), load('type_order'), load('type_bounds'), normalize=normalize_type
+    )
+    return InventoryStore.from_columns(
+        manifest['digest'],
+        {name: load(name) for name in NUMERIC_COLUMNS},
+        type_index,
+        SortedIndex.from_sorted(load('price_order'), load('price_sorted')),
+        SortedIndex.from_sorted(load('area_order'), load('area_sorted')),
+        SnapshotRecords(load('record_codes'), load('value_offsets'), load('values')),
+        load('valid'),
+    )
+
+
+def payload_snapshot_store(projects_data, digest, directory, max_inventories):
+    """
+    InventoryStore of a projects_data payload, kept as a snapshot under
+    directory so every process sharing the directory maps one copy. The first
+    process to see a payload parses it and writes the snapshot while the others
+    wait for it on a lock; the least recently used snapshots beyond
+    max_inventories are then removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, digest)
+    with open(f"{path}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        written = read_current(path) is None
+        if written:
+            write_store_snapshot(InventoryStore.from_projects_data(projects_data), path)
+        else:
+            # Marks the snapshot as recently used
+            os.utime(path)
+        store = open_snapshot(path)
+    store.digest = digest
+    if written:
+        prune_payload_snapshots(directory, max_inventories)
+    return store
+
+
+def prune_payload_snapshots(directory, max_inventories):
+    """Remove the least recently used payload snapshots beyond max_inventories, skipping any being written or opened."""
+    snapshots = []
+    for entry in os.scandir(directory):
+        if entry.is_dir() and not entry.name.startswith('.'):
+            snapshots.append((entry.stat().st_mtime, entry.name))
+    snapshots.sort(reverse=True)
+    for _, name in snapshots[max_inventories:]:
+        path = os.path.join(directory, name)
+        with open(f"{path}.lock", 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            # Processes that have the snapshot mapped keep their copy until they drop it
+            shutil.rmtree(path, ignore_errors=True)
+            os.unlink(f"{path}.lock")
+
+
+class SnapshotLoader:
+    """
+    Opens the snapshot once and switches to a newer version when CURRENT
+    changes, checking at most every reload_interval seconds. A version that
+    fails to open leaves the previous one in place.
+    """
+
+    def __init__(self, path, reload_interval=INVENTORY_SNAPSHOT_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = Lock()
+        self._version = read_current(path)
+        self._checked_at = time.monotonic()
+        self.store = open_snapshot(path)
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    self._maybe_reload()
+        return self.store
+
+    def _maybe_reload(self):
+        try:
+            version = read_current(self.path)
+            if version != self._version:
+                self.store = open_snapshot(self.path)
+                self._version = version
+                print(f"Opened inventory snapshot {version} from {self.path}")
+        except Exception as e:
+            print(f"Failed to reload inventory snapshot from {self.path}: {e}")
+
+
+_loaders = {}
+_loaders_lock = Lock()
+
+
+def get_snapshot_store(path=None):
+    """InventoryStore of the snapshot at path (default INVENTORY_SNAPSHOT), opened once per process."""
+    path = path or INVENTORY_SNAPSHOT
+    if not path:
+        raise Exception("projects_data is required when no INVENTORY_SNAPSHOT is configured")
+    with _loaders_lock:
+        loader = _loaders.get(path)
+        if loader is None:
+            loader = _loaders[path] = SnapshotLoader(path)
+    return loader.get()
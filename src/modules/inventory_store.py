@@ -0,0 +1,305 @@
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+from collections.abc import Mapping
+from threading import Lock
+
+import numpy as np
+
+from modules.codec import parse_projects_data
+from modules.inventory_index import SortedIndex, InvertedIndex
+
+# Maximum number of distinct projects_data payloads kept parsed in memory
+# (and, with INVENTORY_CACHE_DIR, kept there as snapshots).
+MAX_CACHED_INVENTORIES = int(os.getenv("MAX_CACHED_INVENTORIES", 32))
+# Set to a directory shared by the worker processes (serve.py does) to keep parsed
+# projects_data payloads there as snapshots, so each payload is parsed by one
+# worker and memory-mapped by the others instead of parsed again by each
+INVENTORY_CACHE_DIR = os.getenv("INVENTORY_CACHE_DIR")
+
+
+def project_property(property):
+    """Build the outward-facing record for one inventory row."""
+    return {
+        'projectID': property['projectID'],
+        'projectName': property['projectName'],
+        'propertyDeveloper': property['propertyDeveloper'],
+        'location': property['location'],
+        'description': property['description'],
+        'purpose': property['purpose'],
+        'start_date': property['start_date'],
+        'completion_date': property['completion_date'],
+        'facilities': property['facilities'],
+        'no_of_installments': property['no_of_installments'],
+        'no_of_properties': property['no_of_properties'],
+        'percentage_sold': property['percentage_sold'],
+        'propertyID': property['propertyID'],
+        'no_of_rooms': property['no_of_rooms'],
+        'type': property.get('type'),
+        'total_area_sqmeter': property['total_area_sqmeter'],
+        'no_of_bathrooms': property['no_of_bathrooms'],
+        'price': property['price'],
+        'interior_sqmeter': property['interior_sqmeter'],
+        'balcony_terrace_sqmeter': property['balcony_terrace_sqmeter'],
+        'rooftop_sqmeter': property['rooftop_sqmeter'],
+        'total_living_space_sqmeter': property['total_living_space_sqmeter'],
+        'installment_payment_plan': property['installment_payment_plan'],
+        'VAT': property['VAT'],
+        'stamp_duty': property['stamp_duty'],
+        'title_deed_transfer': property['title_deed_transfer'],
+        'lawyer_fees': property['lawyer_fees'],
+        'ImageURL OR VideoURL': property['ImageURL'] or property['VideoURL'],
+    }
+
+
+# Field order of the compact records held by InventoryStore; the keys of project_property()
+RECORD_FIELDS = (
+    'projectID', 'projectName', 'propertyDeveloper', 'location', 'description', 'purpose', 'start_date',
+    'completion_date', 'facilities', 'no_of_installments', 'no_of_properties', 'percentage_sold', 'propertyID',
+    'no_of_rooms', 'type', 'total_area_sqmeter', 'no_of_bathrooms', 'price', 'interior_sqmeter',
+    'balcony_terrace_sqmeter', 'rooftop_sqmeter', 'total_living_space_sqmeter', 'installment_payment_plan', 'VAT',
+    'stamp_duty', 'title_deed_transfer', 'lawyer_fees', 'ImageURL OR VideoURL',
+)
+FIELD_POSITIONS = {field: position for position, field in enumerate(RECORD_FIELDS)}
+# Row fields kept after RECORD_FIELDS in each compact record. They are not part of
+# the outward-facing record, which merges them, but a patch may change either one.
+SOURCE_FIELDS = ('ImageURL', 'VideoURL')
+STORED_FIELDS = RECORD_FIELDS + SOURCE_FIELDS
+
+
+def compact_value(value, shared):
+    """Intern strings and share identical lists of strings (facilities, URLs) between rows."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        key = tuple(value)
+        if key not in shared:
+            shared[key] = [sys.intern(item) for item in key]
+        return shared[key]
+    return value
+
+
+def compact_record(row, shared):
+    """One projects_data row as a tuple of values in STORED_FIELDS order."""
+    record = project_property(row)
+    return tuple(compact_value(record[field], shared) for field in RECORD_FIELDS) + tuple(
+        compact_value(row[field], shared) for field in SOURCE_FIELDS
+    )
+
+
+class RowView(Mapping):
+    """
+    Read-only view of one compact inventory row, keyed like the outward-facing
+    record. Filter results hand these out instead of a dict per property per
+    request; the dict is only built when serialized (or with dict(view)).
+    """
+
+    __slots__ = ('_record', 'row')
+
+    def __init__(self, record, row):
+        self._record = record
+        self.row = row
+
+    def __getitem__(self, key):
+        return self._record[FIELD_POSITIONS[key]]
+
+    def __contains__(self, key):
+        return key in FIELD_POSITIONS
+
+    def __iter__(self):
+        return iter(RECORD_FIELDS)
+
+    def __len__(self):
+        return len(RECORD_FIELDS)
+
+    def __repr__(self):
+        return f"RowView({self.row}, {dict(self)!r})"
+
+
+# float64 columns of an InventoryStore
+NUMERIC_COLUMNS = ('price', 'total_area_sqmeter', 'no_of_rooms', 'no_of_bathrooms', 'price_per_sqm')
+
+
+def normalize_type(value):
+    return str(value).lower()
+
+
+def inventory_digest(projects_data):
+    return hashlib.sha256(projects_data.encode('utf-8')).hexdigest()
+
+
+class InventoryStore:
+    """
+    Columnar, parse-once representation of a projects_data payload.
+
+    The numeric filter fields are held as NumPy arrays and the property type
+    as integer codes, so a filter is a handful of vectorized comparisons
+    instead of a per-row Python loop. Sorted indexes on price and area and an
+    inverted index on type let a query start from the rows in range and only
+    check the remaining conditions on those.
+    """
+
+    def __init__(self, rows, digest=None):
+        # Rows are held as tuples in STORED_FIELDS order rather than 28-key dicts,
+        # with repeated project strings and facility lists stored once.
+        # Rows that cannot be projected are kept out of every result.
+        records = []
+        shared = {}
+        for row in rows:
+            try:
+                records.append(compact_record(row, shared))
+            except Exception as e:
+                print("Error filtering properties: ", e)
+                records.append(None)
+        self.build(records, digest)
+
+    @classmethod
+    def from_records(cls, records, digest=None):
+        """Store over already compacted records (None for rows to keep out of results)."""
+        store = cls.__new__(cls)
+        store.build(records, digest)
+        return store
+
+    def build(self, records, digest):
+        self.digest = digest
+        self.records = records
+        self.valid = np.array([record is not None for record in records], dtype=bool)
+        column = lambda field: np.array(
+            [record[FIELD_POSITIONS[field]] if record is not None else np.nan for record in records], dtype=np.float64
+        )
+        self.price = column('price')
+        self.total_area_sqmeter = column('total_area_sqmeter')
+        self.no_of_rooms = column('no_of_rooms')
+        self.no_of_bathrooms = column('no_of_bathrooms')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.price_per_sqm = self.price / self.total_area_sqmeter
+
+        types = [record[FIELD_POSITIONS['type']] if record is not None else None for record in records]
+        self.type_index = InvertedIndex(['' if value is None else value for value in types], normalize=normalize_type)
+        self.type_codes = self.type_index.codes
+        self.price_index = SortedIndex(self.price)
+        self.area_index = SortedIndex(self.total_area_sqmeter)
+
+    @classmethod
+    def from_columns(cls, digest, columns, type_index, price_index, area_index, records, valid):
+        """
+        Store over prebuilt columns, indexes and records, e.g. memory-mapped from
+        an inventory snapshot. columns maps each NUMERIC_COLUMNS name to an array.
+        """
+        store = cls.__new__(cls)
+        store.digest = digest
+        for name in NUMERIC_COLUMNS:
+            setattr(store, name, columns[name])
+        store.type_index = type_index
+        store.type_codes = type_index.codes
+        store.price_index = price_index
+        store.area_index = area_index
+        store.records = records
+        store.valid = valid
+        return store
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_projects_data(cls, projects_data):
+        rows = parse_projects_data(projects_data)
+        return cls(rows, digest=inventory_digest(projects_data))
+
+    def mask(self, parameters, rows=None):
+        """
+        Boolean mask of rows matching the InvestmentOptionsSchema filters, over
+        the whole inventory or only the given row positions.
+        """
+        column = (lambda values: values) if rows is None else (lambda values: values[rows])
+        price = column(self.price)
+        mask = column(self.valid) & (price >= parameters.budget_min) & (price <= parameters.budget_max)
+        if parameters.size_min:
+            mask &= column(self.total_area_sqmeter) >= parameters.size_min
+        if parameters.size_max:
+            mask &= column(self.total_area_sqmeter) <= parameters.size_max
+        if parameters.bedrooms_min:
+            mask &= column(self.no_of_rooms) >= parameters.bedrooms_min
+        if parameters.bedrooms_max:
+            mask &= column(self.no_of_rooms) <= parameters.bedrooms_max
+        if parameters.bathrooms_min:
+            mask &= column(self.no_of_bathrooms) >= parameters.bathrooms_min
+        if parameters.bathrooms_max:
+            mask &= column(self.no_of_bathrooms) <= parameters.bathrooms_max
+        if parameters.property_type:
+            code = self.type_index.code(parameters.property_type)
+            if code is None:
+                return np.zeros(len(mask), dtype=bool)
+            mask &= column(self.type_codes) == code
+        return mask
+
+    def candidate_rows(self, parameters):
+        """Smallest row set any single index can narrow the query down to."""
+        candidates = [self.price_index.range(parameters.budget_min, parameters.budget_max)]
+        if parameters.size_min or parameters.size_max:
+            candidates.append(self.area_index.range(parameters.size_min or None, parameters.size_max or None))
+        if parameters.property_type:
+            candidates.append(self.type_index.rows(parameters.property_type))
+        return min(candidates, key=len)
+
+    def filter(self, parameters):
+        """Indices of matching rows, in inventory order."""
+        rows = np.sort(self.candidate_rows(parameters))
+        return rows[self.mask(parameters, rows)]
+
+    def field(self, row, key):
+        return self.records[row][FIELD_POSITIONS[key]]
+
+    def view(self, row):
+        return RowView(self.records[row], int(row))
+
+    def iter_views(self, rows):
+        """Lazily yield a RowView for each row position."""
+        for row in rows:
+            yield RowView(self.records[row], int(row))
+
+    def sort_column(self, sort_by):
+        """NumPy column backing a sort key, or None when the key is only available on the records."""
+        if sort_by in NUMERIC_COLUMNS:
+            return getattr(self, sort_by)
+        return None
+
+
+_stores = OrderedDict()
+_stores_lock = Lock()
+
+
+def get_inventory_store(projects_data, inventory_id=None):
+    """
+    Return the InventoryStore for a projects_data payload, parsing it only the
+    first time a given payload (by content hash) is seen. An inventory_id
+    selects a registered inventory instead, and with neither the configured
+    inventory snapshot is used.
+    """
+    if inventory_id is not None:
+        from modules.inventory_registry import inventory_registry
+        return inventory_registry.get(inventory_id)
+    if projects_data is None:
+        from modules.inventory_snapshot import get_snapshot_store
+        return get_snapshot_store()
+
+    digest = inventory_digest(projects_data)
+    with _stores_lock:
+        store = _stores.get(digest)
+        if store is not None:
+            _stores.move_to_end(digest)
+            return store
+
+    if INVENTORY_CACHE_DIR:
+        from modules.inventory_snapshot import payload_snapshot_store
+        store = payload_snapshot_store(projects_data, digest, INVENTORY_CACHE_DIR, MAX_CACHED_INVENTORIES)
+    else:
+        store = InventoryStore.from_projects_data(projects_data)
+
+    with _stores_lock:
+        _stores[digest] = store
+        _stores.move_to_end(digest)
+        while len(_stores) > MAX_CACHED_INVENTORIES:
+            _stores.popitem(last=False)
+    return store
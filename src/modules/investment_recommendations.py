@@ -1,16 +1,48 @@
+import asyncio
 import logging
-from models import InvestmentOptionsSchema
-from modules.cost_comparison import run_cost_comparison_module
-from modules.rental_income_forecast import run_rental_income_forecast
-from modules.risk_analysis import run_risk_analysis_module
-from modules.property_details_and_insights import run_property_details_and_insights
+from modules.request_context import AnalysisContext
+from modules.cost_comparison import run_cost_comparison_module, format_property_data
+from modules.rental_income_forecast import run_rental_income_forecast, arun_rental_income_forecast, format_rental_income_forecast
+from modules.risk_analysis import run_risk_analysis_module, arun_risk_analysis_module, assess_property_risk
+from modules.property_details_and_insights import run_property_details_and_insights, format_property_details
+from modules.streaming import StreamingResult
+from modules.jobs import report_partial, check_cancelled
+
+def run_stage(name, run_module, context):
+    check_cancelled()
+    result = run_module(context=context)
+    report_partial(name, result)
+    return result
+
+
+async def run_stages(stages):
+    """
+    Run (name, awaitable) stages concurrently and return their results in
+    order. When running as a job, each result is published as its stage
+    completes, and a cancelled job cancels the stages still running.
+    """
+    tasks = {asyncio.ensure_future(awaitable): name for name, awaitable in stages}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                report_partial(tasks[task], task.result())
+            check_cancelled()
+    finally:
+        for task in pending:
+            task.cancel()
+    return [task.result() for task in tasks]
+
 
 def run_investment_recommendation_wrapper(**kwargs):
     """
     Run the investment recommendation wrapper. Returns a list of recommendations based on input parameters.
     
-    This function initializes the InvestmentOptionsSchema with input parameters,
-    runs each module's function, and compiles the results into a single dictionary.
+    This function builds one AnalysisContext from the input parameters, so the
+    inventory is parsed and filtered once and each property's price list and
+    rental income is fetched once, runs each module's function against it, and
+    compiles the results into a single dictionary.
 
     Args:
         **kwargs: Arbitrary keyword arguments containing input parameters.
@@ -19,40 +51,84 @@ def run_investment_recommendation_wrapper(**kwargs):
         dict: A dictionary containing the recommendations.
     """
     logging.info("Starting investment recommendation wrapper")
-    # Initialize the InvestmentOptionsSchema with input parameters
-    #try:
-    #    parameters = InvestmentOptionsSchema(**kwargs)
-    #except Exception as e:
-     #   logging.error(f"Error initializing InvestmentOptionsSchema: {e}")
-      #  return {"error": str(e)}
-    
-    # Run each module's function and collect results
-    cost_comparison_result = run_cost_comparison_module(**kwargs)
-    rental_income_forecast_result = run_rental_income_forecast(**kwargs)
-    risk_analysis_result = run_risk_analysis_module(**kwargs)
-    property_details_result = run_property_details_and_insights(**kwargs)
+    # Initialize the shared request context with input parameters
+    try:
+        context = AnalysisContext.from_props(**kwargs)
+    except Exception as e:
+        logging.error(f"Error initializing InvestmentOptionsSchema: {e}")
+        return {"error": str(e)}
+
+    # Fetch everything the modules need up front, in bulk
+    context.get_rental_incomes(raise_errors=False)
+    context.get_price_lists(raise_errors=False)
+
+    # Run each module's function and collect results. When running as a job, each
+    # module's result is published as it completes and a cancelled job stops between modules
+    cost_comparison_result = run_stage("cost_comparison", run_cost_comparison_module, context)
+    rental_income_forecast_result = run_stage("rental_income_forecast", run_rental_income_forecast, context)
+    risk_analysis_result = run_stage("risk_analysis", run_risk_analysis_module, context)
+    property_details_result = run_stage("property_details_and_insights", run_property_details_and_insights, context)
+
+    return context.paginate(compile_recommendations(cost_comparison_result, rental_income_forecast_result, risk_analysis_result, property_details_result))
+
+
+async def arun_investment_recommendation_wrapper(**kwargs):
+    """
+    Async variant of run_investment_recommendation_wrapper. The four modules
+    run concurrently; the ones that fetch from the data service await the
+    async client, the CPU-only ones run in a worker thread. A cancelled job
+    stops when the next module completes, cancelling the others.
+    """
+    logging.info("Starting async investment recommendation wrapper")
+    try:
+        context = await AnalysisContext.afrom_props(**kwargs)
+    except Exception as e:
+        logging.error(f"Error initializing InvestmentOptionsSchema: {e}")
+        return {"error": str(e)}
+
+    # Filter (in a worker thread) before the modules fan out across threads, then fetch in bulk
+    await context.aselect()
+    await asyncio.gather(
+        context.aget_rental_incomes(raise_errors=False),
+        context.aget_price_lists(raise_errors=False)
+    )
+
+    check_cancelled()
+    cost_comparison_result, rental_income_forecast_result, risk_analysis_result, property_details_result = await run_stages([
+        ("cost_comparison", asyncio.to_thread(run_cost_comparison_module, context=context)),
+        ("rental_income_forecast", arun_rental_income_forecast(context=context)),
+        ("risk_analysis", arun_risk_analysis_module(context=context)),
+        ("property_details_and_insights", asyncio.to_thread(run_property_details_and_insights, context=context))
+    ])
+    return context.paginate(compile_recommendations(cost_comparison_result, rental_income_forecast_result, risk_analysis_result, property_details_result))
+
+
+def index_by_property(items, property_id_of):
+    """Map propertyID -> item, keeping the first item seen for each property."""
+    index = {}
+    if isinstance(items, list):
+        for item in items:
+            index.setdefault(property_id_of(item), item)
+    return index
+
+
+def compile_recommendations(cost_comparison_result, rental_income_forecast_result, risk_analysis_result, property_details_result):
+    # Index each module's output by propertyID once, then join in a single pass
+    rental_income_forecasts = index_by_property(rental_income_forecast_result.get('rental_income_forecast'), lambda item: item['propertyID'])
+    risk_reports = index_by_property(risk_analysis_result.get('risk_analysis'), lambda item: item['Risk Report']['propertyID'])
+    property_details = index_by_property(property_details_result.get('property_details'), lambda item: item['propertyID'])
 
     recommendations = []
-    for property in cost_comparison_result['properties']:
+    for property in cost_comparison_result.get('properties', []):
         property_id = property['propertyID']
-        RIF = None; RA = None; PDI = None
-        for item in rental_income_forecast_result['rental_income_forecast']:
-            if property_id == item['propertyID']:
-                RIF = item
-                break
-        for item in risk_analysis_result['risk_analysis']:
-            if property_id == item['Risk Report']['propertyID']:
-                RA = item['Risk Report']
-                break
-        for item in property_details_result['property_details']:
-            if property_id == item['propertyID']:
-                PDI = item['Property Details']
-                break
+        RIF = rental_income_forecasts.get(property_id)
+        RA = risk_reports.get(property_id)
+        PDI = property_details.get(property_id)
         if RIF and RA and PDI:
             recommended_property = {
                 'Cost Comparison': property,
                 'Rental Income Forecast': RIF,
-                'Risk Analysis': RA,
+                'Risk Analysis': RA['Risk Report'],
                 'Property Details and Insights': PDI
             }
             recommendations.append(recommended_property)
@@ -60,6 +136,44 @@ def run_investment_recommendation_wrapper(**kwargs):
     return {"recommendations": recommendations}
 
 
+def iter_investment_recommendations(context: AnalysisContext = None, **kwargs):
+    """
+    Yield recommendations one property at a time, as soon as each is complete,
+    instead of building every module's full result list first. Properties
+    without rental income or a payment plan are skipped, as in the wrapper.
+    """
+    context = context or AnalysisContext.from_props(**kwargs)
+    rental_incomes = context.get_rental_incomes(raise_errors=False)
+    price_lists = context.get_price_lists(raise_errors=False)
+
+    for property in context.iter_filtered_projects():
+        property_id = property['propertyID']
+        rental_income = rental_incomes.get(property_id)
+        if not rental_income:
+            continue
+        risk_analysis = assess_property_risk(property, rental_income, price_lists.get(property_id))
+        if not risk_analysis:
+            continue
+        yield {
+            'Cost Comparison': format_property_data(property),
+            'Rental Income Forecast': format_rental_income_forecast(property, rental_income),
+            'Risk Analysis': risk_analysis['Risk Report'],
+            'Property Details and Insights': format_property_details(property)
+        }
+
+
+def stream_investment_recommendations(**kwargs):
+    """StreamingResult counterpart of run_investment_recommendation_wrapper, for streamed responses."""
+    try:
+        context = AnalysisContext.from_props(**kwargs)
+    except Exception as e:
+        logging.error(f"Error initializing InvestmentOptionsSchema: {e}")
+        return {"error": str(e)}
+    # Filter before the response starts, so a bad payload or cursor is reported as a normal error
+    context.select()
+    return StreamingResult("recommendations", iter_investment_recommendations(context), lambda: context.paginate({}))
+
+
 if __name__ == "__main__":
     params = {
             "budget_min": 100000,
@@ -0,0 +1,420 @@
+import fcntl
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from modules.metrics import register_collector, write_json, read_json, process_alive
+
+# Jobs running at once per server process; further jobs wait in the queue
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", 2))
+# Jobs allowed to wait; submissions beyond this are rejected
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", 100))
+# Seconds a finished job (and its result) is kept for polling
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", 3600))
+# Set to a directory shared by the worker processes (serve.py does) so any worker
+# can report on or cancel a job queued by another
+JOB_STORE_DIR = os.getenv("JOB_STORE_DIR")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    One queued tool call. Tools running as a job can publish partial results
+    with report_partial() and stop early at check_cancelled() once the job
+    has been cancelled.
+    """
+
+    def __init__(self, tool_name, run, priority=0):
+        self.id = uuid.uuid4().hex
+        self.tool_name = tool_name
+        self.priority = priority
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.store = None
+        self.pid = os.getpid()
+        self._run = run
+        self._cancel_requested = threading.Event()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    @classmethod
+    def from_record(cls, record):
+        """A read-only Job from a JobStore record, possibly of a job run by another worker."""
+        job = cls(record["tool_name"], None, record["priority"])
+        job.id = record["job_id"]
+        job.pid = record["pid"]
+        for field in ("status", "created_at", "started_at", "finished_at", "partial", "result", "error"):
+            setattr(job, field, record.get(field))
+        if job.status not in FINISHED and not process_alive(job.pid):
+            job.status = FAILED
+            job.error = "The worker running the job exited before it finished"
+        return job
+
+    def record(self):
+        record = self.status_dict(partial=True)
+        record["pid"] = self.pid
+        record["result"] = self.result
+        return record
+
+    def save(self):
+        if self.store is not None:
+            # One write at a time, so an older record is never written over a newer one
+            with self._save_lock:
+                self.store.write(self.record())
+
+    @property
+    def cancel_requested(self):
+        if not self._cancel_requested.is_set() and self.store is not None and self.store.cancel_requested(self.id):
+            # Cancelled through another worker
+            self._cancel_requested.set()
+        return self._cancel_requested.is_set()
+
+    def report(self, key, value):
+        with self._lock:
+            self.partial[key] = value
+        self.save()
+
+    def cancel(self):
+        """Cancel a queued job at once; a running job stops at its next check_cancelled()."""
+        with self.store.lock() if self.store is not None else nullcontext():
+            with self._lock:
+                if self.status in FINISHED:
+                    return False
+                self._cancel_requested.set()
+                if self.store is not None:
+                    self.store.flag_cancel(self.id)
+                if self.status == QUEUED:
+                    self._finish(CANCELLED)
+            self.save()
+        return True
+
+    def abandon(self, error):
+        """Fail a job this process will not finish; a running job also stops at its next check_cancelled()."""
+        with self._lock:
+            if self.status in FINISHED:
+                return
+            self._cancel_requested.set()
+            self._finish(FAILED, error=error)
+        self.save()
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self._run = None
+
+    def start(self):
+        with self._lock:
+            if self.status != QUEUED:
+                return False
+            if self.cancel_requested:
+                self._finish(CANCELLED)
+                return False
+            self.status = RUNNING
+            self.started_at = time.time()
+            return True
+
+    def execute(self):
+        if self.store is None:
+            started = self.start()
+        else:
+            # Under the store's lock, so a cancellation through another worker either sees the job
+            # still queued and cancels it, or sees it running and leaves it to check_cancelled()
+            with self.store.lock():
+                started = self.start()
+                self.save()
+        if not started:
+            return
+        token = current_job.set(self)
+        try:
+            result = self._run()
+            status, error = (CANCELLED, None) if self.cancel_requested else (SUCCEEDED, None)
+        except JobCancelled:
+            result, status, error = None, CANCELLED, None
+        except Exception as e:
+            print(f"Job {self.id} ({self.tool_name}) failed: {e!r}")
+            result, status, error = None, FAILED, str(e) or type(e).__name__
+        finally:
+            current_job.reset(token)
+        with self._lock:
+            if self.status != RUNNING:
+                # Abandoned while it ran
+                return
+            self._finish(status, result if status == SUCCEEDED else None, error)
+        self.save()
+
+    def status_dict(self, partial=False):
+        with self._lock:
+            status = {
+                "job_id": self.id,
+                "tool_name": self.tool_name,
+                "status": self.status,
+                "priority": self.priority,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "completed_stages": list(self.partial),
+            }
+            if self.error is not None:
+                status["error"] = self.error
+            if partial:
+                status["partial"] = dict(self.partial)
+            return status
+
+
+class JobStore:
+    """
+    Job records (status, partial results and result) kept as one JSON file per
+    job in a directory shared by the worker processes. A job is run by the
+    worker it was submitted to, which rewrites its record on every change;
+    cancelling it through another worker leaves a <job_id>.cancel file that
+    the running worker sees at its next check_cancelled().
+    """
+
+    def __init__(self, directory, ttl=JOB_RESULT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, job_id, suffix=".json"):
+        # Job IDs come from request paths; anything but a uuid4 hex is not a job
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        return os.path.join(self.directory, job_id + suffix)
+
+    @contextmanager
+    def lock(self):
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def write(self, record):
+        try:
+            write_json(self.path(record["job_id"]), record)
+        except (TypeError, ValueError) as e:
+            write_json(self.path(record["job_id"]), dict(
+                record, status=FAILED, result=None, error=f"The job's result cannot be stored: {e}",
+            ))
+
+    def read(self, job_id):
+        path = self.path(job_id)
+        return read_json(path) if path else None
+
+    def flag_cancel(self, job_id):
+        open(self.path(job_id, ".cancel"), "w").close()
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self.path(job_id, ".cancel"))
+
+    def cancel(self, job_id):
+        """Cancel a job run by any worker. Returns its record, None for an unknown job."""
+        with self.lock():
+            record = self.read(job_id)
+            if record is None or record["status"] in FINISHED:
+                return record
+            self.flag_cancel(job_id)
+            if record["status"] == QUEUED:
+                record.update(status=CANCELLED, finished_at=time.time())
+                write_json(self.path(job_id), record)
+            return record
+
+    def sweep(self):
+        """Remove the records of jobs finished more than ttl seconds ago, or whose worker has exited since."""
+        cutoff = time.time() - self.ttl
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            try:
+                if os.stat(path).st_mtime >= cutoff:
+                    continue
+                if entry.endswith(".json"):
+                    record = read_json(path)
+                    if record is not None and record["status"] not in FINISHED and process_alive(record["pid"]):
+                        continue
+                    os.unlink(path)
+                elif entry.endswith(".tmp"):
+                    os.unlink(path)
+                elif entry.endswith(".cancel") and not os.path.exists(path[:-len(".cancel")] + ".json"):
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+class JobQueue:
+    """
+    Priority queue of jobs run by a bounded set of worker threads. Higher
+    priority runs first, FIFO within a priority. Worker threads are started
+    on first submission, once per process. With a JobStore, jobs are reported
+    on and cancelled through the store, so any process sharing it can do so.
+    """
+
+    def __init__(self, max_concurrency=JOB_MAX_CONCURRENCY, max_queued=JOB_MAX_QUEUED, result_ttl=JOB_RESULT_TTL,
+                 store=None):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.store = store
+        self._heap = []
+        self._sequence = itertools.count()
+        self._jobs = {}
+        # Jobs taken off the heap whose execute() has not returned, including the write of their final record
+        self._executing = 0
+        self._condition = threading.Condition()
+        self._workers_pid = None
+
+    def _start_workers(self):
+        if self._workers_pid == os.getpid():
+            return
+        self._workers_pid = os.getpid()
+        for number in range(self.max_concurrency):
+            threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True).start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._heap)
+                self._executing += 1
+            try:
+                job.execute()
+            finally:
+                with self._condition:
+                    self._executing -= 1
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                self._jobs.pop(job_id, None)
+
+    def submit(self, tool_name, run, priority=0):
+        """Queue run() (a zero-argument callable returning the tool result) as a job. Returns the Job."""
+        with self._condition:
+            self._expire()
+            queued = sum(1 for _, _, job in self._heap if job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({queued} jobs waiting)")
+            job = Job(tool_name, run, priority)
+            job.store = self.store
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (-priority, next(self._sequence), job))
+            self._start_workers()
+            self._condition.notify()
+        if self.store is not None:
+            job.save()
+            self.store.sweep()
+        return job
+
+    def get(self, job_id):
+        if self.store is None:
+            return self._jobs.get(job_id)
+        record = self.store.read(job_id)
+        return Job.from_record(record) if record is not None else None
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        elif self.store is not None:
+            # Queued by another worker
+            if self.store.cancel(job_id) is None:
+                return None
+        return self.get(job_id)
+
+    def active(self):
+        return [job for job in list(self._jobs.values()) if job.status not in FINISHED]
+
+    def drain(self, timeout):
+        """
+        Wait up to timeout seconds for this process's queued and running jobs
+        to finish, then fail the rest, so a worker that exits leaves no job
+        that will never complete.
+        """
+        deadline = time.monotonic() + timeout
+        while (self._executing or self.active()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for job in self.active():
+            job.abandon("The server shut down before the job finished; submit it again")
+
+    def stats(self):
+        counts = {}
+        for job in list(self._jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+
+job_queue = JobQueue(store=JobStore(JOB_STORE_DIR) if JOB_STORE_DIR else None)
+
+register_collector("jobs", lambda: [
+    ("cmnd_jobs", "Jobs held by the job queue, by status", "gauge",
+     [({"status": status}, count) for status, count in sorted(job_queue.stats().items())]),
+])
+
+current_job = ContextVar("current_job", default=None)
+
+
+def report_partial(key, value):
+    """Publish a partial result of the running job under key. Does nothing outside a job."""
+    job = current_job.get()
+    if job is not None:
+        job.report(key, value)
+
+
+def check_cancelled():
+    """Raise JobCancelled if the running job has been cancelled. Does nothing outside a job."""
+    job = current_job.get()
+    if job is not None and job.cancel_requested:
+        raise JobCancelled(f"Job {job.id} was cancelled")
+
+
+def wants_job(tool, data):
+    """Whether a /run-cmnd-tool call is queued as a job: "job": true|false in the body, by default the tool's isLongRunningTool."""
+    return bool(data.get("job", tool.get("isLongRunningTool", False)))
+
+
+def job_priority(data):
+    """The "priority" of a /run-cmnd-tool call (higher runs first), 0 by default."""
+    try:
+        return int(data.get("priority", 0))
+    except (TypeError, ValueError):
+        raise ValueError(f"priority must be an integer, got {data.get('priority')!r}")
+
+
+def job_result_response(job):
+    """(body, HTTP status) for polling a job's result: 200 when done, 202 with partial results while it runs."""
+    if job.status == SUCCEEDED:
+        body = job.status_dict()
+        body["result"] = job.result
+        return body, 200
+    body = job.status_dict(partial=True)
+    if job.status == FAILED:
+        return body, 500
+    if job.status == CANCELLED:
+        return body, 409
+    return body, 202
@@ -0,0 +1,337 @@
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Set to a directory shared by the worker processes (serve.py does) so /metrics
+# reports the totals of every worker rather than those of the one answering
+METRICS_DIR = os.getenv("METRICS_DIR")
+# Seconds between writes of a worker's metrics to METRICS_DIR
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+# Name of the tool the current request (or job) is running, for span labels
+current_tool = ContextVar("current_tool", default="")
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def family(self):
+        with self._lock:
+            samples = [
+                (self.name, list(zip(self.labels, label_values)), value)
+                for label_values, value in sorted(self._values.items())
+            ]
+        return (self.name, self.help, "counter", samples)
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (not cumulative), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        position = len(self.buckets)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                position = index
+                break
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def family(self):
+        samples = []
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                labels = list(zip(self.labels, label_values))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", labels + [("le", format_value(bound))], cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return (self.name, self.help, "histogram", samples)
+
+
+stage_seconds = Histogram(
+    "cmnd_stage_seconds", "Seconds spent in each stage of a tool call", ("tool", "stage")
+)
+upstream_requests = Counter(
+    "cmnd_upstream_requests_total", "Requests sent to the data service", ("tool", "endpoint", "status")
+)
+upstream_seconds = Histogram(
+    "cmnd_upstream_request_seconds", "Data service request latency", ("endpoint",)
+)
+
+
+@contextmanager
+def using_tool(tool_name):
+    """Label the spans recorded in this context with tool_name."""
+    token = current_tool.set(tool_name)
+    try:
+        yield
+    finally:
+        current_tool.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """Time the block and record it under the current tool and stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe((current_tool.get(), stage), time.perf_counter() - start)
+
+
+def upstream_endpoint(path):
+    """Data service path with property IDs replaced, so each endpoint is one label value."""
+    return re.sub(r"/available_projects/[^/]+/", "/available_projects/{id}/", path.split("?")[0])
+
+
+def record_upstream(path, status, seconds):
+    endpoint = upstream_endpoint(path)
+    upstream_requests.inc((current_tool.get(), endpoint, str(status)))
+    upstream_seconds.observe((endpoint,), seconds)
+
+
+# name -> fn() returning [(metric name, help, type, [(labels dict, value)])];
+# modules register one for the statistics they already keep
+_collectors = {}
+# cache label -> fn() returning TTLCache.stats()
+_caches = {}
+
+
+def register_collector(name, collect):
+    _collectors[name] = collect
+
+
+def register_cache(name, stats):
+    _caches[name] = stats
+
+
+def cache_families(caches):
+    """Metric families for the TTLCache.stats() of each {cache label: stats}."""
+    families = []
+    for key, kind, help in (
+        ("hits", "counter", "Cache hits"),
+        ("misses", "counter", "Cache misses"),
+        ("coalesced", "counter", "Lookups that waited for an identical in-flight load"),
+        ("evictions", "counter", "Entries evicted for size"),
+        ("expirations", "counter", "Entries dropped after their TTL"),
+        ("entries", "gauge", "Entries held"),
+        ("bytes", "gauge", "Estimated bytes held"),
+    ):
+        name = f"cmnd_cache_{key}_total" if kind == "counter" else f"cmnd_cache_{key}"
+        families.append((name, help, kind, [({"cache": cache}, stats.get(key, 0)) for cache, stats in caches.items()]))
+    return families
+
+
+def hit_ratio_family(families):
+    """cmnd_cache_hit_ratio, from the (possibly merged) cache hit and miss counters."""
+    totals = {}
+    for name, _, _, samples in families:
+        if name in ("cmnd_cache_hits_total", "cmnd_cache_misses_total"):
+            for _, labels, value in samples:
+                hits_misses = totals.setdefault(tuple(labels), [0, 0])
+                hits_misses[name == "cmnd_cache_misses_total"] += value
+    samples = [
+        ("cmnd_cache_hit_ratio", list(labels), hits / (hits + misses) if hits + misses else 0.0)
+        for labels, (hits, misses) in totals.items()
+    ]
+    return ("cmnd_cache_hit_ratio", "Share of lookups served from the cache", "gauge", samples)
+
+
+def process_families():
+    """[(family name, help, type, [(sample name, [(label, value)], value)])] of this process."""
+    families = [stage_seconds.family(), upstream_requests.family(), upstream_seconds.family()]
+    collectors = list(_collectors.items())
+    if _caches:
+        collectors.append(("cache", lambda: cache_families({name: stats() for name, stats in list(_caches.items())})))
+    for name, collect in collectors:
+        try:
+            collected = collect()
+        except Exception as e:
+            print(f"Error collecting {name} metrics: {e}")
+            continue
+        for metric, help, kind, samples in collected:
+            families.append((metric, help, kind, [(metric, list(labels.items()), value) for labels, value in samples]))
+    return families
+
+
+def merge_families(sources):
+    """
+    Sum the families of several processes, given as [(families, alive)].
+    Counters and histograms add up over every process that ever ran; gauges
+    only over the processes still alive.
+    """
+    merged = {}
+    for families, alive in sources:
+        for name, help, kind, samples in families:
+            if kind == "gauge" and not alive:
+                continue
+            family = merged.setdefault(name, (name, help, kind, {}))
+            for sample_name, labels, value in samples:
+                key = (sample_name, tuple(map(tuple, labels)))
+                family[3][key] = family[3].get(key, 0) + value
+    return [
+        (name, help, kind, [(sample_name, list(labels), value) for (sample_name, labels), value in samples.items()])
+        for name, help, kind, samples in merged.values()
+    ]
+
+
+def write_json(path, value):
+    """Write value to path as JSON atomically, so readers never see a partial file."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush():
+    """Write this process's metrics to METRICS_DIR, where the other workers' /metrics read them."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    write_json(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), process_families())
+
+
+_flushing_pid = None
+
+
+def start_flushing():
+    """Flush this process's metrics every METRICS_FLUSH_INTERVAL seconds from a daemon thread."""
+    global _flushing_pid
+    if not METRICS_DIR or _flushing_pid == os.getpid():
+        return
+    _flushing_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                flush()
+            except Exception as e:
+                print(f"Error writing metrics: {e}")
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+
+
+def shared_families():
+    """
+    This process's families merged with those the other workers wrote to
+    METRICS_DIR. The counters of workers that have exited are folded into
+    retired.json so their totals are kept without a file per dead worker.
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    own = process_families()
+    sources = [(own, True)]
+    with open(os.path.join(METRICS_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired_path = os.path.join(METRICS_DIR, "retired.json")
+        retired = read_json(retired_path) or []
+        exited = []
+        for entry in os.listdir(METRICS_DIR):
+            pid = entry[:-len(".json")]
+            if not entry.endswith(".json") or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            families = read_json(os.path.join(METRICS_DIR, entry))
+            if families is None:
+                continue
+            if process_alive(int(pid)):
+                sources.append((families, True))
+            else:
+                exited.append((entry, families))
+        if exited:
+            retired = merge_families([(retired, False)] + [(families, False) for _, families in exited])
+            write_json(retired_path, retired)
+            for entry, _ in exited:
+                os.unlink(os.path.join(METRICS_DIR, entry))
+        sources.append((retired, False))
+    return merge_families(sources)
+
+
+def render_family(metric, help, kind, samples):
+    lines = [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+    for sample_name, labels, value in samples:
+        names = tuple(name for name, _ in labels)
+        label_values = tuple(label_value for _, label_value in labels)
+        lines.append(f"{sample_name}{format_labels(names, label_values)} {format_value(value)}")
+    return lines
+
+
+def render_metrics():
+    """Every metric in the Prometheus text exposition format, summed over the workers sharing METRICS_DIR."""
+    families = shared_families() if METRICS_DIR else process_families()
+    families.append(hit_ratio_family(families))
+    lines = []
+    for family in families:
+        lines.extend(render_family(*family))
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,6 @@
-from models import InvestmentOptionsSchema
-from modules.filter_investment_options import filter_investment_options
+from modules.request_context import AnalysisContext
 from modules.access_data import fetch_price_list
+from modules.streaming import StreamingResult
 
 def gather_property_details(property_id):
     # print("here 1")
@@ -33,43 +33,54 @@ def gather_property_details(property_id):
             })
     return details
 
-def run_property_details_and_insights(**kwargs):
-    try:
-        parameters = InvestmentOptionsSchema(**kwargs)
-    except Exception as e:
-        return {"error": str(e)}
+def run_property_details_and_insights(context: AnalysisContext = None, **kwargs):
+    if context is None:
+        try:
+            context = AnalysisContext.from_props(**kwargs)
+        except Exception as e:
+            return {"error": str(e)}
 
-    filtered_projects = filter_investment_options(parameters)
-    
-    property_details = []
-    for item in filtered_projects:
-        
-            property_details.append({
-                'propertyID': item['propertyID'],
-                'Project Name': item['projectName'],
-                'Property Developer': item['propertyDeveloper'],
-                'Location': item['location'],
-                'Purpose': item['purpose'],
-                'Completion Date': item['completion_date'],
-                'Facilities': ", ".join(item['facilities']),
-                # TODO - Replace with correct ImageURLs
-                'ImageURL': ["https://static.tildacdn.com/stor3335-6430-4635-a664-303033613461/19958823.jpg", "https://optim.tildacdn.one/tild3831-3338-4936-b035-626534353538/-/format/webp/90156560.jpeg", "https://optim.tildacdn.com/stor3830-3761-4335-b033-396166663233/-/format/webp/93188055.jpg", "https://optim.tildacdn.com/stor3465-3132-4464-b562-636266383936/-/format/webp/44491027.jpg"],
-                '360 view': "",
-                'Number of Rooms': item['no_of_rooms'],
-                'Number of Bathrooms': item['no_of_bathrooms'],
-                'Interior Area (sqm)': item['interior_sqmeter'],
-                'Balcony/Terrace Area (sqm)': item['balcony_terrace_sqmeter'],
-                'Rooftop Area (sqm)': item['rooftop_sqmeter'],
-                'Total Living Space (sqm)': item['total_living_space_sqmeter'],
-                'Price': item['price'],
-                'Price Per Square Meter': item['price'] / item['total_living_space_sqmeter'],    
-                'Installment Payment Plan': item['installment_payment_plan']              
-            })
+    property_details = [format_property_details(item) for item in context.iter_filtered_projects()]
+    return context.paginate({"property_details": property_details})
 
-            if item['propertyDeveloper'] == 'Dovec Construction':
-                property_details[-1]['360 view'] = 'https://360.dovecconstruction.com/'
-            if item['propertyDeveloper'] == 'Noyanlar Construction':
-                property_details[-1]['360 view'] = 'https://360.noyanlar.com/'
+def stream_property_details_and_insights(context: AnalysisContext = None, **kwargs):
+    """StreamingResult counterpart of run_property_details_and_insights, formatting one property at a time."""
+    if context is None:
+        try:
+            context = AnalysisContext.from_props(**kwargs)
+        except Exception as e:
+            return {"error": str(e)}
 
-            # print(property_details[-1])
-    return {"property_details": property_details}
\ No newline at end of file
+    # Filter before the response starts, so a bad payload or cursor is reported as a normal error
+    context.select()
+    property_details = (format_property_details(item) for item in context.iter_filtered_projects())
+    return StreamingResult("property_details", property_details, lambda: context.paginate({}))
+
+def format_property_details(item):
+    details = {
+        'propertyID': item['propertyID'],
+        'Project Name': item['projectName'],
+        'Property Developer': item['propertyDeveloper'],
+        'Location': item['location'],
+        'Purpose': item['purpose'],
+        'Completion Date': item['completion_date'],
+        'Facilities': ", ".join(item['facilities']),
+        # TODO - Replace with correct ImageURLs
+        'ImageURL': ["https://static.tildacdn.com/stor3335-6430-4635-a664-303033613461/19958823.jpg", "https://optim.tildacdn.one/tild3831-3338-4936-b035-626534353538/-/format/webp/90156560.jpeg", "https://optim.tildacdn.com/stor3830-3761-4335-b033-396166663233/-/format/webp/93188055.jpg", "https://optim.tildacdn.com/stor3465-3132-4464-b562-636266383936/-/format/webp/44491027.jpg"],
+        '360 view': "",
+        'Number of Rooms': item['no_of_rooms'],
+        'Number of Bathrooms': item['no_of_bathrooms'],
+        'Interior Area (sqm)': item['interior_sqmeter'],
+        'Balcony/Terrace Area (sqm)': item['balcony_terrace_sqmeter'],
+        'Rooftop Area (sqm)': item['rooftop_sqmeter'],
+        'Total Living Space (sqm)': item['total_living_space_sqmeter'],
+        'Price': item['price'],
+        'Price Per Square Meter': item['price'] / item['total_living_space_sqmeter'],    
+        'Installment Payment Plan': item['installment_payment_plan']              
+    }
+
+    if item['propertyDeveloper'] == 'Dovec Construction':
+        details['360 view'] = 'https://360.dovecconstruction.com/'
+    if item['propertyDeveloper'] == 'Noyanlar Construction':
+        details['360 view'] = 'https://360.noyanlar.com/'
+    return details
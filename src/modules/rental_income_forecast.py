@@ -1,34 +1,43 @@
-from models import InvestmentOptionsSchema
-from modules.filter_investment_options import filter_investment_options
-from modules.access_data import fetch_rental_income
+import asyncio
 
-def run_rental_income_forecast(**kwargs):
-    parameters = InvestmentOptionsSchema(**kwargs)
-    filtered_projects = filter_investment_options(parameters)
+from modules.request_context import AnalysisContext
+
+def format_rental_income_forecast(project, rental_income):
+    return {
+        "propertyID": project['propertyID'],
+        "projectName": project['projectName'],
+        "propertyDeveloper": project['propertyDeveloper'],
+        "location": project['location'],
+        "purpose": project['purpose'],
+        "description": project['description'],
+        "rental_income": {
+            'optimistic': rental_income['optimistic'],
+            'pessimistic': rental_income['pessimistic'],
+            'realistic': rental_income['realistic']
+        }
+    }
+
+def build_rental_income_forecast(filtered_projects, rental_incomes):
     forecast = []
-    
+
     for project in filtered_projects:
-        property_id = project['propertyID']
-        try:
-            rental_income = fetch_rental_income(property_id)
-        except Exception as e:
-            rental_income = None
-            print(f"Error fetching rental income for property ID {property_id}: {e}")
-        
+        rental_income = rental_incomes.get(project['propertyID'])
         if rental_income:
-            forecast.append({
-                "propertyID": property_id,
-                "projectName": project['projectName'],
-                "propertyDeveloper": project['propertyDeveloper'],
-                "location": project['location'],
-                "purpose": project['purpose'],
-                "description": project['description'],
-                "rental_income": {
-                    'optimistic': rental_income['optimistic'],
-                    'pessimistic': rental_income['pessimistic'],
-                    'realistic': rental_income['realistic']
-                }
-            })
+            forecast.append(format_rental_income_forecast(project, rental_income))
 
     result = {"rental_income_forecast": forecast if len(forecast) > 0 else 'No property found with the given criteria.'}
     return result
+
+def run_rental_income_forecast(context: AnalysisContext = None, **kwargs):
+    context = context or AnalysisContext.from_props(**kwargs)
+
+    # Failed lookups are logged and skipped, as with the old per-property loop
+    rental_incomes = context.get_rental_incomes(raise_errors=False)
+    return context.paginate(build_rental_income_forecast(context.iter_filtered_projects(), rental_incomes))
+
+async def arun_rental_income_forecast(context: AnalysisContext = None, **kwargs):
+    context = context or await AnalysisContext.afrom_props(**kwargs)
+
+    rental_incomes = await context.aget_rental_incomes(raise_errors=False)
+    forecast = await asyncio.to_thread(build_rental_income_forecast, context.iter_filtered_projects(), rental_incomes)
+    return context.paginate(forecast)
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+from models import InvestmentOptionsSchema
+from modules.metrics import span
+from modules.filter_investment_options import select_investment_page
+from modules.access_data import fetch_price_lists, fetch_rental_incomes, afetch_price_lists, afetch_rental_incomes
+
+
+class AnalysisContext:
+    """
+    Request-scoped state shared by the analysis modules.
+
+    Holds the validated parameters, the filtered inventory (computed once on
+    first use) and a memo of the price lists and rental incomes fetched so
+    far, so a composite tool call parses, filters and fetches each property
+    only once.
+    """
+
+    def __init__(self, parameters: InvestmentOptionsSchema):
+        self.parameters = parameters
+        self.price_lists = {}
+        self.rental_incomes = {}
+        self._page = None
+        self._filtered_projects = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_props(cls, **props):
+        with span("validation"):
+            parameters = InvestmentOptionsSchema(**props)
+        return cls(parameters)
+
+    @classmethod
+    async def afrom_props(cls, **props):
+        """from_props in a worker thread, so validating a large projects_data does not block the event loop."""
+        return await asyncio.to_thread(cls.from_props, **props)
+
+    def select(self):
+        """(store, rows, next_cursor) for the requested page, filtered once per context."""
+        with self._lock:
+            if self._page is None:
+                self._page = select_investment_page(self.parameters)
+            return self._page
+
+    async def aselect(self):
+        """select() in a worker thread: parsing and filtering the inventory is CPU work the event loop should not wait on."""
+        if self._page is not None:
+            return self._page
+        return await asyncio.to_thread(self.select)
+
+    @property
+    def filtered_projects(self):
+        """The filtered properties as a list of read-only RowViews."""
+        store, rows, _ = self.select()
+        with self._lock:
+            if self._filtered_projects is None:
+                self._filtered_projects = list(store.iter_views(rows))
+            return self._filtered_projects
+
+    def iter_filtered_projects(self):
+        """Lazily yield the filtered properties as read-only RowViews, without building a list."""
+        store, rows, _ = self.select()
+        return store.iter_views(rows)
+
+    @property
+    def next_cursor(self):
+        """Cursor for the page after this one, when a limit was requested and more properties match."""
+        return self.select()[2]
+
+    def paginate(self, result):
+        """Attach next_cursor to a module result when there is another page."""
+        if self.next_cursor:
+            result["next_cursor"] = self.next_cursor
+        return result
+
+    @property
+    def property_ids(self):
+        store, rows, _ = self.select()
+        return [store.field(i, 'propertyID') for i in rows]
+
+    def _missing(self, memo, property_ids):
+        return [property_id for property_id in dict.fromkeys(property_ids) if property_id not in memo]
+
+    def _select(self, memo, property_ids):
+        return {property_id: memo[property_id] for property_id in property_ids if property_id in memo}
+
+    def get_rental_incomes(self, property_ids=None, raise_errors=True):
+        property_ids = self.property_ids if property_ids is None else property_ids
+        missing = self._missing(self.rental_incomes, property_ids)
+        if missing:
+            self.rental_incomes.update(fetch_rental_incomes(missing, raise_errors=raise_errors))
+        return self._select(self.rental_incomes, property_ids)
+
+    def get_price_lists(self, property_ids=None, raise_errors=True):
+        property_ids = self.property_ids if property_ids is None else property_ids
+        missing = self._missing(self.price_lists, property_ids)
+        if missing:
+            self.price_lists.update(fetch_price_lists(missing, raise_errors=raise_errors))
+        return self._select(self.price_lists, property_ids)
+
+    async def aget_rental_incomes(self, property_ids=None, raise_errors=True):
+        if property_ids is None:
+            await self.aselect()
+            property_ids = self.property_ids
+        missing = self._missing(self.rental_incomes, property_ids)
+        if missing:
+            self.rental_incomes.update(await afetch_rental_incomes(missing, raise_errors=raise_errors))
+        return self._select(self.rental_incomes, property_ids)
+
+    async def aget_price_lists(self, property_ids=None, raise_errors=True):
+        if property_ids is None:
+            await self.aselect()
+            property_ids = self.property_ids
+        missing = self._missing(self.price_lists, property_ids)
+        if missing:
+            self.price_lists.update(await afetch_price_lists(missing, raise_errors=raise_errors))
+        return self._select(self.price_lists, property_ids)
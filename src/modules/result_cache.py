@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from models import InvestmentOptionsSchema
+from modules.cache import TTLCache, DiskCache, MISSING
+from modules.metrics import register_cache
+
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 120))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 256))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+# Set to a directory to also keep results on disk, shared across processes and restarts
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR")
+# Bounds of the on-disk results (serve.py keeps them in /dev/shm, i.e. memory), and
+# seconds between sweeps of expired and over-limit entries
+RESULT_CACHE_DIR_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_DIR_MAX_ENTRIES", 4096))
+RESULT_CACHE_DIR_MAX_BYTES = int(os.getenv("RESULT_CACHE_DIR_MAX_BYTES", 256 * 1024 * 1024))
+RESULT_CACHE_SWEEP_INTERVAL = float(os.getenv("RESULT_CACHE_SWEEP_INTERVAL", 30))
+
+
+def result_cache_key(tool_name, props):
+    """
+    Hash of the tool name and its validated parameters, with projects_data
+    replaced by its digest. Defaults are filled in by validation, so props that
+    only differ in spelling out a default share a key. Returns None for props
+    that do not validate.
+    """
+    try:
+        parameters = InvestmentOptionsSchema(**props)
+    except Exception:
+        return None
+    # Imported here so the inventory store (and NumPy) load with the first tool, not the server
+    from modules.inventory_store import inventory_digest, get_inventory_store
+
+    normalized = parameters.model_dump(exclude={"projects_data"})
+    if parameters.inventory_id is not None:
+        # Inventory IDs are content hashes already
+        normalized["projects_data"] = parameters.inventory_id
+    elif parameters.projects_data is None:
+        # Calls against the inventory snapshot are keyed by the snapshot version
+        normalized["projects_data"] = get_inventory_store(None).digest
+    else:
+        normalized["projects_data"] = inventory_digest(parameters.projects_data)
+    payload = json.dumps([tool_name, normalized], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_error_result(result):
+    return isinstance(result, dict) and "error" in result
+
+
+class ToolResultCache:
+    """
+    Results of tool calls keyed by result_cache_key, held in memory and
+    optionally on disk. Error results are never stored, and identical calls
+    that arrive while one is running wait for its result.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def _claim(self, key):
+        cached, waiting, owned = self.memory.claim([key])
+        if key in cached:
+            return cached[key], None, owned
+        return MISSING, waiting.get(key), owned
+
+    def _from_disk(self, key, owned):
+        if self.disk is None:
+            return MISSING
+        result = self.disk.get(key, MISSING)
+        if result is not MISSING:
+            self.memory.fulfil(owned, {key: result})
+        return result
+
+    def _store(self, key, owned, result):
+        if is_error_result(result):
+            self.memory.fulfil(owned)
+            return
+        self.memory.fulfil(owned, {key: result})
+        if self.disk is not None:
+            try:
+                self.disk.set(key, result)
+            except Exception as e:
+                print(f"Error writing result cache entry {key}: {e}")
+
+    def get_or_run(self, tool_name, props, run):
+        key = result_cache_key(tool_name, props)
+        if key is None:
+            return run()
+        result, waiting, owned = self._claim(key)
+        if result is not MISSING:
+            return result
+        if waiting is not None:
+            result = waiting.result()
+            return run() if result is MISSING else result
+        result = self._from_disk(key, owned)
+        if result is not MISSING:
+            return result
+        try:
+            result = run()
+        except BaseException as e:
+            self.memory.fulfil(owned, error=e)
+            raise
+        self._store(key, owned, result)
+        return result
+
+    async def aget_or_run(self, tool_name, props, run):
+        """
+        get_or_run for a coroutine function run. Hashing the props (and their
+        projects_data) and encoding or decoding the result run in a worker
+        thread, so the event loop is left free for other calls.
+        """
+        key = await asyncio.to_thread(result_cache_key, tool_name, props)
+        if key is None:
+            return await run()
+        result, waiting, owned = self._claim(key)
+        if result is not MISSING:
+            return result
+        if waiting is not None:
+            result = await asyncio.wrap_future(waiting)
+            return await run() if result is MISSING else result
+        try:
+            result = await asyncio.to_thread(self._from_disk, key, owned)
+            if result is not MISSING:
+                return result
+            result = await run()
+        except BaseException as e:
+            self.memory.fulfil(owned, error=e)
+            raise
+        await asyncio.to_thread(self._store, key, owned, result)
+        return result
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        return self.memory.stats()
+
+
+result_cache = ToolResultCache(
+    TTLCache(ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES),
+    DiskCache(
+        RESULT_CACHE_DIR, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_DIR_MAX_ENTRIES,
+        max_bytes=RESULT_CACHE_DIR_MAX_BYTES, sweep_interval=RESULT_CACHE_SWEEP_INTERVAL,
+    ) if RESULT_CACHE_DIR else None,
+)
+
+register_cache("result", result_cache.stats)
@@ -1,33 +1,30 @@
-from models import InvestmentOptionsSchema
-from modules.filter_investment_options import filter_investment_options
 from modules.access_data import fetch_rental_income, fetch_price_list
+from modules.request_context import AnalysisContext
+from modules.risk_model import RISK_FACTORS, get_risk_model
+from modules.executor import map_chunks, amap_chunks
 from datetime import datetime
+from functools import partial
+import asyncio
 import numpy as np
 
 class RiskScorer:
-    def __init__(self):
-        pass
+    def __init__(self, model=None):
+        # A fixed RiskModel, or None to follow the hot-reloaded model file
+        self._model = model
+
+    @property
+    def model(self):
+        return self._model or get_risk_model()
 
     def location_risk(self, location):
-        # Change this implementation.
-        risk_scores = {
-            "All": 1.0,
-            "Kyrenia": 0.2,
-            "Iskele": 0.3,
-            "Guzelyurt": 0.4,
-            "Nicosia": 0.5,
-            "Famagusta": 0.6,
-            "Lefke": 0.7,
-            "Karpaz Peninsula": 0.8
-        }
-        return risk_scores.get(location, 1.0)
+        return self.model.locations.score(location)
 
     def price_risk(self, min_price, max_price):
         price_volatility = max_price - min_price
         return price_volatility / max_price
 
-    def completion_sale_risk(self, percentage_sold, start_date, completion_date):
-        days_to_completion = (datetime.strptime(completion_date, '%Y-%m-%d') - datetime.now()).days
+    def completion_sale_risk(self, percentage_sold, start_date, completion_date, now=None):
+        days_to_completion = (datetime.strptime(completion_date, '%Y-%m-%d') - (now or datetime.now())).days
         sale_risk = 1 - (percentage_sold / 100)
         return sale_risk + (days_to_completion / 365)
 
@@ -42,24 +39,22 @@ class RiskScorer:
         return additional_fees / total_amount
 
     def developer_risk(self, property_developer):
-        # Placeholder for developer risk scoring logic, this is the chance to give dovec a priority
-        if property_developer == "Dovec Construction":
-            return 0.0
-        return 1.0
+        return self.model.developers.score(property_developer)
 
 class RiskEvaluator:
     def __init__(self, scorer):
         self.scorer = scorer
 
-    def evaluate_property(self, property_data):
-        location_score = self.scorer.location_risk(property_data['location'])
+    def evaluate_property(self, property_data, now=None):
+        model = self.scorer.model
+        location_score = model.locations.score(property_data['location'])
         price_score = self.scorer.price_risk(property_data['min_price'], property_data['max_price'])
         completion_sale_score = self.scorer.completion_sale_risk(
-            property_data['percentage_sold'], property_data['start_date'], property_data['completion_date']
+            property_data['percentage_sold'], property_data['start_date'], property_data['completion_date'], now
         )
         rental_income_score = self.scorer.rental_income_risk(property_data['rental_income'])
         financial_score = self.scorer.financial_risk(property_data['payment_plan'])
-        developer_score = self.scorer.developer_risk(property_data['property_developer'])
+        developer_score = model.developers.score(property_data['property_developer'])
 
         risk_scores = {
             "location": location_score,
@@ -69,39 +64,107 @@ class RiskEvaluator:
             "financial": financial_score,
             "developer": developer_score
         }
-        composite_score = np.mean(list(risk_scores.values()))
+        composite_score = model.composite(risk_scores.values())
         return composite_score, risk_scores
 
+class BatchRiskEvaluator:
+    """
+    Scores a whole filtered set at once. Every risk factor is computed as a
+    NumPy column with the same arithmetic as RiskScorer, so the numbers match
+    RiskEvaluator.evaluate_property exactly. Rows the scalar path cannot
+    score (a zero price, yield or total amount, a missing value) are handed
+    to it, so they raise the same error instead of scoring inf or NaN.
+    """
+    def __init__(self, scorer):
+        self.scorer = scorer
+        self.evaluator = RiskEvaluator(scorer)
+
+    def days_to_completion(self, completion_dates, now):
+        try:
+            completion = np.array(completion_dates, dtype='datetime64[D]')
+            # NumPy also reads dates strptime rejects, such as '2026-05' or 'NaT'
+            if np.isnat(completion).any() or np.datetime_as_string(completion).tolist() != list(completion_dates):
+                raise ValueError("completion dates are not all YYYY-MM-DD")
+        except ValueError:
+            completion = np.array([datetime.strptime(date, '%Y-%m-%d') for date in completion_dates], dtype='datetime64[D]')
+        # Floor division matches timedelta.days
+        return (completion.astype('datetime64[us]') - np.datetime64(now, 'us')) // np.timedelta64(1, 'D')
+
+    def evaluate_properties(self, properties_data, now=None):
+        """
+        Returns (composite_scores, score_matrix), where score_matrix has one row
+        per property and one column per entry in RISK_FACTORS.
+        """
+        now = now or datetime.now()
+        model = self.scorer.model
+        count = len(properties_data)
+        if not count:
+            return np.zeros(0), np.zeros((0, len(RISK_FACTORS)))
+
+        min_price = np.array([data['min_price'] for data in properties_data], dtype=np.float64)
+        max_price = np.array([data['max_price'] for data in properties_data], dtype=np.float64)
+        percentage_sold = np.array([data['percentage_sold'] for data in properties_data], dtype=np.float64)
+        pessimistic_yield = np.array([data['rental_income']['pessimistic']['annual_net_rental_yield'] for data in properties_data], dtype=np.float64)
+        optimistic_yield = np.array([data['rental_income']['optimistic']['annual_net_rental_yield'] for data in properties_data], dtype=np.float64)
+        additional_fees = np.array([sum(data['payment_plan']['additional_fees'].values()) for data in properties_data], dtype=np.float64)
+        total_amount = np.array([data['payment_plan']['total_amount'] for data in properties_data], dtype=np.float64)
+        days_to_completion = self.days_to_completion([data['completion_date'] for data in properties_data], now)
+
+        scores = np.empty((count, len(RISK_FACTORS)), dtype=np.float64)
+        scores[:, 0] = model.locations.lookup([data['location'] for data in properties_data])
+        scores[:, 5] = model.developers.lookup([data['property_developer'] for data in properties_data])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores[:, 1] = (max_price - min_price) / max_price
+            scores[:, 2] = (1 - (percentage_sold / 100)) + (days_to_completion / 365)
+            scores[:, 3] = (optimistic_yield - pessimistic_yield) / optimistic_yield
+            scores[:, 4] = additional_fees / total_amount
+            composite_scores = model.composite_columns(scores)
+
+        for row in np.flatnonzero(~np.isfinite(scores).all(axis=1)):
+            composite_score, risk_scores = self.evaluator.evaluate_property(properties_data[row], now)
+            composite_scores[row] = composite_score
+            scores[row] = [risk_scores[factor] for factor in RISK_FACTORS]
+        return composite_scores, scores
+
 class RiskReportGenerator:
-    def generate_report(self, property_data, risk_score, risk_factors):
+    # One recommendation per entry in RISK_FACTORS, given when that factor exceeds the threshold
+    RECOMMENDATIONS = [
+        "Consider alternative locations with lower risk.",
+        "Evaluate price stability in the area.",
+        "Check project completion and sales status.",
+        "Assess rental income stability.",
+        "Review payment plan and additional fees.",
+        "Investigate developer's track record.",
+    ]
+    THRESHOLD = 0.5
+
+    def generate_report(self, property_data, risk_score, risk_factors, recommendations=None):
         report = {
             "propertyID": property_data['propertyID'],
             "property_name": property_data['projectName'],
             "location": property_data['location'],
             "risk_score": risk_score,
             "risk_factors": risk_factors,
-            "recommendations": self.generate_recommendations(risk_factors)
+            "recommendations": self.generate_recommendations(risk_factors) if recommendations is None else recommendations
         }
         return report
 
     def generate_recommendations(self, risk_factors):
-        recommendations = []
-        if risk_factors['location'] > 0.5:
-            recommendations.append("Consider alternative locations with lower risk.")
-        if risk_factors['price'] > 0.5:
-            recommendations.append("Evaluate price stability in the area.")
-        if risk_factors['completion_sale'] > 0.5:
-            recommendations.append("Check project completion and sales status.")
-        if risk_factors['rental_income'] > 0.5:
-            recommendations.append("Assess rental income stability.")
-        if risk_factors['financial'] > 0.5:
-            recommendations.append("Review payment plan and additional fees.")
-        if risk_factors['developer'] > 0.5:
-            recommendations.append("Investigate developer's track record.")
-        return recommendations
+        return [
+            recommendation for factor, recommendation in zip(RISK_FACTORS, self.RECOMMENDATIONS)
+            if risk_factors[factor] > self.THRESHOLD
+        ]
+
+    def recommendation_mask(self, score_matrix):
+        """Boolean matrix aligned with a BatchRiskEvaluator score matrix: True where a recommendation applies."""
+        return score_matrix > self.THRESHOLD
+
+    def recommendations_from_mask(self, mask_row):
+        return [recommendation for recommendation, flagged in zip(self.RECOMMENDATIONS, mask_row) if flagged]
 
 scorer = RiskScorer()
 evaluator = RiskEvaluator(scorer)
+batch_evaluator = BatchRiskEvaluator(scorer)
 report_generator = RiskReportGenerator()
 
 
@@ -130,51 +193,106 @@ def gather_property_details(property_id):
 
     return details
 
-def run_risk_analysis_module(**kwargs):
-    parameters = InvestmentOptionsSchema(**kwargs)
-    filtered_projects = filter_investment_options(parameters)
+def risk_property_data(item, rental_income, price_list):
+    """Scoring input for one filtered property, or None without rental income or payment plan."""
+    if price_list: payment_plan = price_list[0]['payment_plan']
+    else: payment_plan = None
+    if not (rental_income and payment_plan):
+        return None
+    return {
+        "propertyID": item['propertyID'],
+        "projectName": item['projectName'],
+        "propertyDeveloper": item['propertyDeveloper'],
+        "location": item['location'],
+        "purpose": item['purpose'],
+        "completion_date": item['completion_date'],
+        "facilities": item['facilities'],
+        "min_price": item['price'],
+        "max_price": item['price'],
+        "percentage_sold": item['percentage_sold'],
+        "start_date": item['start_date'],
+        "rental_income": rental_income,
+        "payment_plan": payment_plan,
+        "property_developer": item['propertyDeveloper'],
+        "developer_history": {}  # Placeholder for developer history
+    }
+
+def risk_analysis_entry(item, report):
+    return {
+        'Project Name': item['projectName'],
+        'Property Developer': item['propertyDeveloper'],
+        'Location': item['location'],
+        'Purpose': item['purpose'],
+        'Completion Date': item['completion_date'],
+        'Facilities': ", ".join(item['facilities']),
+        'Property Type': item['type'],
+        'Risk Report': report
+    }
+
+def assess_property_risk(item, rental_income, price_list):
+    """Risk analysis entry for one filtered property, or None without rental income or payment plan."""
+    property_data = risk_property_data(item, rental_income, price_list)
+    if property_data is None:
+        return None
+    risk_score, risk_factors = evaluator.evaluate_property(property_data)
+    report = report_generator.generate_report(property_data, risk_score, risk_factors)
+    return risk_analysis_entry(item, report)
+
+def score_risk_chunk(entries, now=None):
+    """
+    Risk analysis entries for a chunk of (item, rental_income, price_list),
+    leaving out properties without rental income or payment plan.
+    """
+    scored_items = []
+    properties_data = []
+    for item, rental_income, price_list in entries:
+        property_data = risk_property_data(item, rental_income, price_list)
+        if property_data is not None:
+            scored_items.append(item)
+            properties_data.append(property_data)
+
+    # Score the whole chunk in one pass and apply the recommendation thresholds as a mask
+    composite_scores, score_matrix = batch_evaluator.evaluate_properties(properties_data, now)
+    recommendation_mask = report_generator.recommendation_mask(score_matrix)
+
     risk_analysis_report = []
-    
+    for row, (item, property_data) in enumerate(zip(scored_items, properties_data)):
+        risk_factors = dict(zip(RISK_FACTORS, score_matrix[row].tolist()))
+        recommendations = report_generator.recommendations_from_mask(recommendation_mask[row])
+        report = report_generator.generate_report(property_data, float(composite_scores[row]), risk_factors, recommendations)
+        risk_analysis_report.append(risk_analysis_entry(item, report))
+    return risk_analysis_report
+
+def risk_entries(filtered_projects, rental_incomes, price_lists):
     for item in filtered_projects:
-        projectID = item['projectID']
         property_id = item['propertyID']
-        rental_income = fetch_rental_income(property_id)
-        price_list = fetch_price_list(property_id)
-        property_developer = item['propertyDeveloper']
-        if price_list: payment_plan = price_list[0]['payment_plan']
-        else: payment_plan = None
-        if rental_income and payment_plan:
-            property_data = {
-                "propertyID": property_id,
-                "projectName": item['projectName'],
-                "propertyDeveloper": item['propertyDeveloper'],
-                "location": item['location'],
-                "purpose": item['purpose'],
-                "completion_date": item['completion_date'],
-                "facilities": item['facilities'],
-                "min_price": item['price'],
-                "max_price": item['price'],  
-                "percentage_sold": item['percentage_sold'],
-                "start_date": item['start_date'],
-                "rental_income": rental_income,
-                "payment_plan": payment_plan,
-                "property_developer": property_developer,
-                "developer_history": {}  # Placeholder for developer history
-            }
-            risk_score, risk_factors = evaluator.evaluate_property(property_data)
-            report = report_generator.generate_report(property_data, risk_score, risk_factors)
-            risk_analysis_report.append({
-                'Project Name': item['projectName'],
-                'Property Developer': item['propertyDeveloper'],
-                'Location': item['location'],
-                'Purpose': item['purpose'],
-                'Completion Date': item['completion_date'],
-                'Facilities': ", ".join(item['facilities']),
-                'Property Type': item['type'],
-                'Risk Report': report
-            })
-
-    return {"risk_analysis": risk_analysis_report}
+        yield item, rental_incomes.get(property_id), price_lists.get(property_id)
+
+def build_risk_analysis(filtered_projects, rental_incomes, price_lists):
+    # Scored on the tool's executor, in chunks across a process pool when the tool is
+    # flagged isCpuHeavy; every chunk is scored as of the same moment
+    score = partial(score_risk_chunk, now=datetime.now())
+    return {"risk_analysis": map_chunks(score, risk_entries(filtered_projects, rental_incomes, price_lists))}
+
+async def abuild_risk_analysis(filtered_projects, rental_incomes, price_lists):
+    score = partial(score_risk_chunk, now=datetime.now())
+    return {"risk_analysis": await amap_chunks(score, risk_entries(filtered_projects, rental_incomes, price_lists))}
+
+def run_risk_analysis_module(context: AnalysisContext = None, **kwargs):
+    context = context or AnalysisContext.from_props(**kwargs)
+
+    rental_incomes = context.get_rental_incomes()
+    price_lists = context.get_price_lists()
+    return context.paginate(build_risk_analysis(context.iter_filtered_projects(), rental_incomes, price_lists))
+
+async def arun_risk_analysis_module(context: AnalysisContext = None, **kwargs):
+    context = context or await AnalysisContext.afrom_props(**kwargs)
+
+    rental_incomes, price_lists = await asyncio.gather(
+        context.aget_rental_incomes(),
+        context.aget_price_lists()
+    )
+    return context.paginate(await abuild_risk_analysis(context.iter_filtered_projects(), rental_incomes, price_lists))
 
 
 # Testing
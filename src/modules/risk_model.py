@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from threading import Lock
+
+import numpy as np
+
+RISK_MODEL_PATH = os.getenv("RISK_MODEL_PATH", os.path.join(os.path.dirname(__file__), "risk_model.json"))
+# Seconds between checks of the model file for changes
+RISK_MODEL_RELOAD_INTERVAL = float(os.getenv("RISK_MODEL_RELOAD_INTERVAL", 5))
+
+# Column order of the score matrix produced by BatchRiskEvaluator
+RISK_FACTORS = ["location", "price", "completion_sale", "rental_income", "financial", "developer"]
+
+
+class LookupTable:
+    """
+    Name -> score table compiled to integer codes. Unknown names map to the
+    last code, which holds the default score.
+    """
+
+    def __init__(self, scores, default):
+        self.codes = {name: code for code, name in enumerate(scores)}
+        self.default_code = len(self.codes)
+        self.scores = np.array(list(scores.values()) + [default], dtype=np.float64)
+
+    def score(self, name):
+        return float(self.scores[self.codes.get(name, self.default_code)])
+
+    def encode(self, names):
+        return np.fromiter((self.codes.get(name, self.default_code) for name in names), dtype=np.intp, count=len(names))
+
+    def lookup(self, names):
+        return self.scores[self.encode(names)]
+
+
+class RiskModel:
+    """Location and developer scores plus per-factor composite weights, as loaded from the model file."""
+
+    def __init__(self, definition):
+        self.locations = LookupTable(definition.get("location_scores", {}), definition.get("default_location_score", 1.0))
+        self.developers = LookupTable(definition.get("developer_scores", {}), definition.get("default_developer_score", 1.0))
+        weights = definition.get("weights", {})
+        unknown = set(weights) - set(RISK_FACTORS)
+        if unknown:
+            raise ValueError(f"Unknown risk factors in weights: {sorted(unknown)}")
+        self.weights = [float(weights.get(factor, 1.0)) for factor in RISK_FACTORS]
+        self.total_weight = sum(self.weights)
+        if self.total_weight <= 0:
+            raise ValueError("Risk factor weights must sum to a positive number")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def composite(self, scores):
+        """Weighted mean of the factor scores, given in RISK_FACTORS order."""
+        total = 0
+        for weight, score in zip(self.weights, scores):
+            total += weight * score
+        return total / self.total_weight
+
+    def composite_columns(self, score_matrix):
+        """composite() for every row of a score matrix, summed in the same order."""
+        composite = self.weights[0] * score_matrix[:, 0]
+        for column in range(1, len(RISK_FACTORS)):
+            composite += self.weights[column] * score_matrix[:, column]
+        return composite / self.total_weight
+
+
+class RiskModelLoader:
+    """
+    Loads the risk model once and re-reads the file when its modification time
+    changes, checking at most every reload_interval seconds. A file that fails
+    to load leaves the previous model in place.
+    """
+
+    def __init__(self, path=RISK_MODEL_PATH, reload_interval=RISK_MODEL_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = Lock()
+        self._mtime = os.path.getmtime(path)
+        self._checked_at = time.monotonic()
+        self.model = RiskModel.from_file(path)
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    self._maybe_reload()
+        return self.model
+
+    def _maybe_reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime != self._mtime:
+                self.model = RiskModel.from_file(self.path)
+                self._mtime = mtime
+                print(f"Reloaded risk model from {self.path}")
+        except Exception as e:
+            print(f"Failed to reload risk model from {self.path}: {e}")
+
+
+risk_model_loader = RiskModelLoader()
+
+
+def get_risk_model():
+    return risk_model_loader.get()
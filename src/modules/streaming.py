@@ -0,0 +1,75 @@
+import json
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+JSON_MIMETYPE = "application/json"
+
+
+class StreamingResult:
+    """
+    A tool result whose list under `key` is produced lazily, so it can be
+    written to the client while it is being computed instead of being built
+    and serialized in memory first.
+
+    trailer() is called once the items are exhausted and returns any fields
+    that follow the list (e.g. next_cursor).
+    """
+
+    def __init__(self, key, items, trailer=None):
+        self.key = key
+        self.items = items
+        self.trailer = trailer
+
+    def _trailer(self):
+        return self.trailer() if self.trailer else {}
+
+    def iter_json(self):
+        """Chunks of the same JSON object the non-streaming tool returns: {key: [...], **trailer}."""
+        yield f'{{{json.dumps(self.key)}:['
+        try:
+            for position, item in enumerate(self.items):
+                yield ("," if position else "") + json.dumps(item)
+            trailer = self._trailer()
+        except Exception as e:
+            # The status line is already sent, so report the failure inside the document
+            print(f"Error streaming {self.key}: {e}")
+            trailer = {"error": str(e)}
+        yield "]"
+        for name, value in trailer.items():
+            yield f",{json.dumps(name)}:{json.dumps(value)}"
+        yield "}"
+
+    def iter_ndjson(self):
+        """One JSON line per item, then a line with the trailer fields if there are any."""
+        try:
+            for item in self.items:
+                yield json.dumps(item) + "\n"
+            trailer = self._trailer()
+        except Exception as e:
+            print(f"Error streaming {self.key}: {e}")
+            trailer = {"error": str(e)}
+        if trailer:
+            yield json.dumps(trailer) + "\n"
+
+    def iter_chunks(self, mode):
+        return self.iter_ndjson() if mode == "ndjson" else self.iter_json()
+
+    def materialize(self):
+        return {self.key: list(self.items), **self._trailer()}
+
+
+def stream_mode(data, accept=None):
+    """
+    Streaming mode requested for a /run-cmnd-tool call: "ndjson", "json"
+    (chunked JSON) or None. Set with "stream": true | "json" | "ndjson" in the
+    request body, or with an Accept: application/x-ndjson header.
+    """
+    stream = data.get("stream")
+    if stream == "ndjson" or (accept and NDJSON_MIMETYPE in accept):
+        return "ndjson"
+    if stream in (True, "json"):
+        return "json"
+    return None
+
+
+def stream_mimetype(mode):
+    return NDJSON_MIMETYPE if mode == "ndjson" else JSON_MIMETYPE
@@ -0,0 +1,229 @@
+"""
+Production entry point: serves the tool server (main.app) from a pool of
+worker processes sharing one listening socket.
+
+    python serve.py
+
+The master imports the app and its tools once and then forks the workers, so
+they start warm and share those pages copy-on-write. Workers that have served
+MAX_REQUESTS requests are replaced, and SIGTERM (or SIGINT) lets in-flight
+requests finish for up to GRACEFUL_TIMEOUT seconds before workers are killed.
+A worker that stops (either way) first finishes the jobs it has queued, within
+GRACEFUL_TIMEOUT, and reports those it could not finish as failed.
+
+State is shared between workers through directories (SHARED_DIRS): registered
+inventories, inline projects_data payloads (parsed by one worker and then
+memory-mapped by all), tool results and data service lookups, jobs (so any
+worker can report on or cancel a job), and each worker's metrics, so /metrics reports the totals of all of them. Unless set,
+these are placed in a directory under /dev/shm (shared memory) that lives as
+long as the master, and an INVENTORY_SNAPSHOT is memory-mapped by every worker
+rather than loaded by each. Admission limits are divided between the workers.
+"""
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8888))
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+# Requests a worker serves before it is replaced (0 = never), plus up to
+# MAX_REQUESTS_JITTER more so workers do not all restart at the same time
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", 0))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", 0))
+# Seconds workers get to finish in-flight requests on shutdown
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", 30))
+BACKLOG = int(os.getenv("BACKLOG", 2048))
+
+# Directory settings of the state shared by the workers, and their default names
+# under the shared state directory
+SHARED_DIRS = {
+    "INVENTORY_REGISTRY_DIR": "inventories",
+    "INVENTORY_CACHE_DIR": "payloads",
+    "RESULT_CACHE_DIR": "results",
+    "DATA_CACHE_DIR": "data",
+    "JOB_STORE_DIR": "jobs",
+    "METRICS_DIR": "metrics",
+}
+
+
+def shared_state_dir():
+    """Create a directory for state shared by the workers, in shared memory where available."""
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return tempfile.mkdtemp(prefix="cmnd-serve-", dir=root)
+
+
+def listen(host, port, backlog=BACKLOG):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload(registry):
+    """Import every enabled tool and open the inventory snapshot before forking."""
+    for tool in registry:
+        for field in ("runCmd", "streamCmd"):
+            registry.load(tool, field)
+    if os.getenv("INVENTORY_SNAPSHOT"):
+        from modules.inventory_snapshot import get_snapshot_store
+        get_snapshot_store()
+
+
+class RequestCounter:
+    """WSGI middleware calling on_limit once max_requests requests have been served."""
+
+    def __init__(self, app, max_requests, on_limit):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        try:
+            return self.app(environ, start_response)
+        finally:
+            with self._lock:
+                self.count += 1
+                reached = self.count == self.max_requests
+            if reached:
+                self.on_limit()
+
+
+def run_worker(app, sock):
+    from werkzeug.serving import make_server
+    from modules.executor import process_executor
+    from modules.jobs import job_queue
+    from modules.metrics import start_flushing, flush
+
+    server = None
+    deadline = None
+
+    def stop(*_):
+        nonlocal deadline
+        # The master kills workers GRACEFUL_TIMEOUT seconds after asking them to stop
+        if deadline is None:
+            deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        # shutdown() waits for serve_forever() to return, so it cannot run on the serving thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    if MAX_REQUESTS:
+        app = RequestCounter(app, MAX_REQUESTS + random.randint(0, MAX_REQUESTS_JITTER), stop)
+    server = make_server(HOST, PORT, app, threaded=True, fd=sock.fileno())
+    # Keep request threads joinable so server_close() waits for in-flight requests
+    server.daemon_threads = False
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    start_flushing()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        # Jobs still queued or running are finished (they may use the process pool) or reported as failed
+        if deadline is None:
+            deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        job_queue.drain(max(0, deadline - time.monotonic() - 1))
+        process_executor.shutdown()
+        # Last write, so the requests served since the previous one still count once this worker is gone
+        flush()
+
+
+class Master:
+    def __init__(self, app, sock, workers=WORKERS):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.pids = set()
+        self.stopping = False
+
+    def spawn(self):
+        # Flush first so output buffered by the master is not written again by the worker
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(self.app, self.sock)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                status = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(status)
+        self.pids.add(pid)
+        return pid
+
+    def stop(self, *_):
+        self.stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        print(f"Serving on {HOST}:{PORT} with {self.workers} workers (master {os.getpid()})")
+
+        deadline = None
+        while self.pids:
+            if self.stopping and deadline is None:
+                deadline = time.monotonic() + GRACEFUL_TIMEOUT
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if deadline is not None and time.monotonic() > deadline:
+                    print(f"Killing {len(self.pids)} workers still running after {GRACEFUL_TIMEOUT}s")
+                    for pid in self.pids:
+                        os.kill(pid, signal.SIGKILL)
+                    deadline = float("inf")
+                time.sleep(0.1)
+                continue
+            self.pids.discard(pid)
+            if not self.stopping:
+                code = os.waitstatus_to_exitcode(status)
+                print(f"Worker {pid} exited ({code}), starting a replacement")
+                self.spawn()
+        self.sock.close()
+
+
+def main():
+    state_dir = None
+    if WORKERS > 1 and not all(os.getenv(name) for name in SHARED_DIRS):
+        state_dir = shared_state_dir()
+        for name, directory in SHARED_DIRS.items():
+            os.environ.setdefault(name, os.path.join(state_dir, directory))
+
+    # Each worker has its own process pool for CPU-heavy tools; share the CPUs between them
+    os.environ.setdefault("CPU_POOL_WORKERS", str(max(1, (os.cpu_count() or 1) // WORKERS)))
+    # Each worker admits its share of the configured admission limits
+    os.environ.setdefault("ADMISSION_PROCESSES", str(WORKERS))
+
+    # Imported only now so the modules pick up the shared directories, pool size and limits set above
+    from main import app
+    from tools import registry
+
+    try:
+        sock = listen(HOST, PORT)
+        preload(registry)
+        Master(app, sock).run()
+    finally:
+        if state_dir:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import hashlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Comma-separated tool names; CMND_TOOLS_ENABLED turns on tools registered with
+# enabled=False, CMND_TOOLS_DISABLED turns off any tool.
+CMND_TOOLS_ENABLED = os.getenv("CMND_TOOLS_ENABLED", "")
+CMND_TOOLS_DISABLED = os.getenv("CMND_TOOLS_DISABLED", "")
+
+REQUIRED_FIELDS = ("name", "description", "parameters", "runCmd", "functionType", "rerun", "rerunWithDifferentParameters")
+
+
+def parse_names(value):
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def split_import_path(target):
+    """'package.module:function' -> ('package.module', 'function')."""
+    module_name, _, attribute = target.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"Expected 'module:function', got {target!r}")
+    return module_name, attribute
+
+
+def import_target(target):
+    module_name, attribute = split_import_path(target)
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def measure_import(module_name):
+    """Seconds to import module_name in a fresh interpreter, i.e. its cold-start cost."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module_name}; print(time.perf_counter() - start)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def validate_tool(tool):
+    missing = [field for field in REQUIRED_FIELDS if field not in tool]
+    if missing:
+        raise ValueError(f"Tool {tool.get('name')!r} is missing {', '.join(missing)}")
+    if not isinstance(tool["name"], str) or not tool["name"]:
+        raise ValueError(f"Tool name must be a non-empty string, got {tool['name']!r}")
+    for field in ("runCmd", "streamCmd"):
+        command = tool.get(field)
+        if isinstance(command, str):
+            split_import_path(command)
+        elif field in tool and not callable(command):
+            raise ValueError(f"Tool {tool['name']!r} {field} must be callable or a 'module:function' string")
+    for field in ("weight", "maxConcurrency"):
+        if field in tool and (not isinstance(tool[field], int) or tool[field] < 1):
+            raise ValueError(f"Tool {tool['name']!r} {field} must be a positive integer, got {tool[field]!r}")
+    if not isinstance(tool["parameters"], dict):
+        raise ValueError(f"Tool {tool['name']!r} parameters must be a JSON schema dict")
+
+
+def manifest_entry(tool):
+    return {
+        "name": tool["name"],
+        "description": tool["description"],
+        "jsonSchema": tool["parameters"],
+        "isDangerous": tool.get("isDangerous", False),
+        "functionType": tool["functionType"],
+        "isLongRunningTool": tool.get("isLongRunningTool", False),
+        "preCallPrompt": tool.get("preCallPrompt"),
+        "postCallPrompt": tool.get("postCallPrompt"),
+        "rerun": tool["rerun"],
+        "rerunWithDifferentParameters": tool["rerunWithDifferentParameters"],
+    }
+
+
+class ToolRegistry:
+    """
+    Tools indexed by name.
+
+    Entries are validated when registered, and the /cmnd-tools manifest is
+    serialized once (with an ETag) and rebuilt only when the set of enabled
+    tools changes. Whether a tool is enabled is decided at registration from
+    its "enabled" flag and the CMND_TOOLS_ENABLED / CMND_TOOLS_DISABLED config.
+
+    runCmd may be a 'module:function' string, imported on the tool's first
+    call, so a server only pays the import cost of the tools it actually runs.
+    """
+
+    def __init__(self, enabled=CMND_TOOLS_ENABLED, disabled=CMND_TOOLS_DISABLED):
+        self.enabled_names = parse_names(enabled)
+        self.disabled_names = parse_names(disabled)
+        self._tools = {}
+        self._loaded = {}
+        self.load_seconds = {}
+        self._lock = threading.Lock()
+        self._manifest = None
+
+    def is_enabled(self, tool):
+        name = tool["name"]
+        if name in self.disabled_names:
+            return False
+        return tool.get("enabled", True) or name in self.enabled_names
+
+    def register(self, tool):
+        """Validate and add a tool definition. Returns it, enabled or not."""
+        validate_tool(tool)
+        if not self.is_enabled(tool):
+            return tool
+        with self._lock:
+            if tool["name"] in self._tools:
+                raise ValueError(f"Tool {tool['name']!r} is already registered")
+            self._tools[tool["name"]] = tool
+            self._manifest = None
+        return tool
+
+    def tool(self, name, description, parameters, **metadata):
+        """Decorator registering the decorated function as a tool's runCmd."""
+        def decorator(run_cmd):
+            self.register({
+                "name": name,
+                "description": description,
+                "parameters": parameters,
+                "runCmd": run_cmd,
+                "functionType": "backend",
+                "rerun": True,
+                "rerunWithDifferentParameters": True,
+                **metadata,
+            })
+            return run_cmd
+        return decorator
+
+    def unregister(self, name):
+        with self._lock:
+            for field in ("runCmd", "streamCmd"):
+                self._loaded.pop((name, field), None)
+            if self._tools.pop(name, None) is not None:
+                self._manifest = None
+
+    def load(self, tool, field="runCmd"):
+        """The tool's run (or stream) function, importing its module on first use. None if the tool has none."""
+        command = tool.get(field)
+        if command is None or callable(command):
+            return command
+        key = (tool["name"], field)
+        loaded = self._loaded.get(key)
+        if loaded is None:
+            with self._lock:
+                loaded = self._loaded.get(key)
+                if loaded is None:
+                    start = time.perf_counter()
+                    loaded = import_target(command)
+                    self.load_seconds[key] = time.perf_counter() - start
+                    self._loaded[key] = loaded
+                    print(f"Loaded {field} of tool {tool['name']} from {command} in {self.load_seconds[key] * 1000:.1f} ms")
+        return loaded
+
+    def get(self, name):
+        return self._tools.get(name)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(list(self._tools.values()))
+
+    def __len__(self):
+        return len(self._tools)
+
+    def _build_manifest(self):
+        with self._lock:
+            if self._manifest is None:
+                entries = [manifest_entry(tool) for tool in self._tools.values()]
+                body = json.dumps({"tools": entries}, separators=(",", ":")).encode("utf-8")
+                etag = hashlib.sha256(body).hexdigest()[:32]
+                self._manifest = (entries, body, etag)
+            return self._manifest
+
+    def manifest(self):
+        return self._build_manifest()[0]
+
+    def manifest_json(self):
+        """(serialized {"tools": [...]} body, ETag) for the /cmnd-tools response."""
+        _, body, etag = self._build_manifest()
+        return body, etag
+
+    def not_modified(self, if_none_match):
+        """True when an If-None-Match header already names the current manifest."""
+        if not if_none_match:
+            return False
+        _, _, etag = self._build_manifest()
+        tags = {tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")}
+        return etag in tags or "*" in tags
+
+    def import_report(self):
+        """[(tool name, module, cold import seconds)] for the enabled tools, slowest first."""
+        report = []
+        for tool in self:
+            run_cmd = tool["runCmd"]
+            module_name = split_import_path(run_cmd)[0] if isinstance(run_cmd, str) else run_cmd.__module__
+            report.append((tool["name"], module_name, measure_import(module_name)))
+        return sorted(report, key=lambda row: row[2], reverse=True)
+
+    def print_import_report(self):
+        for name, module_name, seconds in self.import_report():
+            print(f"{seconds * 1000:9.1f} ms  {name} ({module_name})")
@@ -1,67 +1,94 @@
-from modules.cost_comparison import run_cost_comparison_module
-from modules.risk_analysis import run_risk_analysis_module
-from modules.property_details_and_insights import run_property_details_and_insights
-from modules.rental_income_forecast import run_rental_income_forecast
-from modules.investment_recommendations import run_investment_recommendation_wrapper
 from models import InvestmentOptionsSchema, custom_json_schema
+from tool_registry import ToolRegistry
 
-# Define the tool configuration and metadata for CMND.ai
-tools = [
-    {
-        "name": "cost_comparison_module",
-        "description": "Filters and compares investment options based on user-defined criteria & Costs",
-        "parameters": custom_json_schema(InvestmentOptionsSchema),
-        "runCmd": run_cost_comparison_module,
-        "isDangerous": False,
-        "functionType": "backend",
-        "isLongRunningTool": False,
-        "rerun": True,
-        "rerunWithDifferentParameters": True
-    },
-    # {
-    #    "name": "rental_income_forecast_module",
-    #    "description": "Presents detailed rental income forecast for properties",
-    #    "parameters": custom_json_schema(InvestmentOptionsSchema),
-    #    "runCmd": run_rental_income_forecast,
-    #    "isDangerous": False,
-    #    "functionType": "backend",
-    #     "isLongRunningTool": False,
-    #     "rerun": True,
-    #     "rerunWithDifferentParameters": False
-    # },
+# Define the tool configuration and metadata for CMND.ai.
+# runCmd is a 'module:function' string, so each analysis module is imported on its tool's first call.
+# streamCmd, where given, returns a StreamingResult and serves calls that ask for a streamed response.
+# Tools registered with "enabled": False are left out unless named in CMND_TOOLS_ENABLED.
+# Tools flagged "isCpuHeavy" run their batch work (risk scoring) in a process pool.
+# Calls to tools flagged "isLongRunningTool" are queued as jobs and return a job ID to poll.
+# "weight" is a tool's expected cost in admission capacity units and "maxConcurrency" caps its
+# concurrent calls; calls that find no capacity wait briefly and are then shed with a 429.
+registry = ToolRegistry()
 
-    {
-        "name": "property_details_and_insights_module",
-        "description": "Provides detailed insights for each property",
-        "parameters": custom_json_schema(InvestmentOptionsSchema),
-        "runCmd": run_property_details_and_insights,
-        "isDangerous": False,
-        "functionType": "backend",
-        "isLongRunningTool": False,
-        "rerun": True,
-        "rerunWithDifferentParameters": True
-    }
-#     {
-#         "name": "risk_analysis_module",
-#         "description": "Analyzes risk factors associated with property investment",
-#         "parameters": custom_json_schema(InvestmentOptionsSchema),
-#         "runCmd": run_risk_analysis_module,
-#         "isDangerous": False,
-#         "functionType": "backend",
-#         "isLongRunningTool": False,
-#         "rerun": True,
-#         "rerunWithDifferentParameters": True
-#         # "postCallPrompt": "after getting investment data, look at the most expensive and the cheapest options and put them on a bar chart"
-#     },
-#    {
-#         "name": "investment_recommendations_module",
-#         "description": "Provides investment recommendations based on predefined criteria",
-#         "parameters": custom_json_schema(InvestmentOptionsSchema),
-#         "runCmd": run_investment_recommendation_wrapper,
-#         "isDangerous": False,
-#         "functionType": "backend",
-#         "isLongRunningTool": False,
-#         "rerun": True,
-#         "rerunWithDifferentParameters": False
-#     }    
-]
\ No newline at end of file
+registry.register({
+    "name": "cost_comparison_module",
+    "description": "Filters and compares investment options based on user-defined criteria & Costs",
+    "parameters": custom_json_schema(InvestmentOptionsSchema),
+    "runCmd": "modules.cost_comparison:run_cost_comparison_module",
+    "isDangerous": False,
+    "functionType": "backend",
+    "isLongRunningTool": False,
+    "weight": 1,
+    "rerun": True,
+    "rerunWithDifferentParameters": True
+})
+
+registry.register({
+    "name": "rental_income_forecast_module",
+    "description": "Presents detailed rental income forecast for properties",
+    "parameters": custom_json_schema(InvestmentOptionsSchema),
+    "runCmd": "modules.rental_income_forecast:arun_rental_income_forecast",
+    "isDangerous": False,
+    "functionType": "backend",
+    "isLongRunningTool": False,
+    "weight": 2,
+    "rerun": True,
+    "rerunWithDifferentParameters": False,
+    "enabled": False
+})
+
+registry.register({
+    "name": "property_details_and_insights_module",
+    "description": "Provides detailed insights for each property",
+    "parameters": custom_json_schema(InvestmentOptionsSchema),
+    "runCmd": "modules.property_details_and_insights:run_property_details_and_insights",
+    "streamCmd": "modules.property_details_and_insights:stream_property_details_and_insights",
+    "isDangerous": False,
+    "functionType": "backend",
+    "isLongRunningTool": False,
+    "weight": 1,
+    "rerun": True,
+    "rerunWithDifferentParameters": True
+})
+
+registry.register({
+    "name": "risk_analysis_module",
+    "description": "Analyzes risk factors associated with property investment",
+    "parameters": custom_json_schema(InvestmentOptionsSchema),
+    "runCmd": "modules.risk_analysis:arun_risk_analysis_module",
+    "isDangerous": False,
+    "functionType": "backend",
+    "isLongRunningTool": False,
+    "isCpuHeavy": True,
+    "weight": 3,
+    "rerun": True,
+    "rerunWithDifferentParameters": True,
+    # "postCallPrompt": "after getting investment data, look at the most expensive and the cheapest options and put them on a bar chart"
+    "enabled": False
+})
+
+registry.register({
+    "name": "investment_recommendations_module",
+    "description": "Provides investment recommendations based on predefined criteria",
+    "parameters": custom_json_schema(InvestmentOptionsSchema),
+    "runCmd": "modules.investment_recommendations:arun_investment_recommendation_wrapper",
+    "streamCmd": "modules.investment_recommendations:stream_investment_recommendations",
+    "isDangerous": False,
+    "functionType": "backend",
+    "isLongRunningTool": True,
+    "weight": 6,
+    "maxConcurrency": 2,
+    "rerun": True,
+    "rerunWithDifferentParameters": False,
+    "enabled": False
+})
+
+
+def get_tools_manifest():
+    return registry.manifest()
+
+
+if __name__ == "__main__":
+    # Cold-start import cost of every enabled tool: python tools.py
+    registry.print_import_report()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# The modules import each other as top-level packages from src/, as when main.py is run from there
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+# The data service is a standalone app in data/
+sys.path.insert(1, os.path.join(ROOT, "data"))
+
+
+@pytest.fixture
+def register_tool():
+    """Register test tools in the server's registry for the duration of a test."""
+    from tools import registry
+    names = []
+
+    def register(name, run_cmd, **metadata):
+        registry.register({
+            "name": name,
+            "description": f"Test tool {name}",
+            "parameters": {"type": "object", "properties": {}, "required": []},
+            "runCmd": run_cmd,
+            "functionType": "backend",
+            "rerun": True,
+            "rerunWithDifferentParameters": True,
+            **metadata,
+        })
+        names.append(name)
+        return registry.get(name)
+
+    yield register
+    for name in names:
+        registry.unregister(name)
@@ -0,0 +1,73 @@
+import threading
+from contextlib import contextmanager
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+
+def price_list(property_id):
+    return [{"No": 1, "payment_plan": {"price": 100_000, "total_amount": 106_000}, "propertyID": property_id}]
+
+
+def rental_income(property_id):
+    return {"propertyID": property_id, "realistic": {"net_income": 20_000, "ROI": 7}}
+
+
+def data_service(bulk_methods=("GET", "POST"), failing=()):
+    """
+    Flask app serving a price list and rental income for any property ID,
+    with the bulk endpoints answering only bulk_methods (none: not offered).
+    Requests for the failing property IDs get a 500. app.requests lists the
+    (method, path) of every request received.
+    """
+    app = Flask(__name__)
+    app.requests = []
+
+    @app.before_request
+    def record():
+        app.requests.append((request.method, request.path))
+
+    @app.route("/projects/available_projects/<property_id>/price_list")
+    def get_price_list(property_id):
+        if property_id in failing:
+            return "upstream error", 500
+        return jsonify(price_list(property_id))
+
+    @app.route("/projects/available_projects/<property_id>/rental_income")
+    def get_rental_income(property_id):
+        if property_id in failing:
+            return "upstream error", 500
+        return jsonify(rental_income(property_id))
+
+    if bulk_methods:
+        @app.route("/projects/available_projects/price_lists", methods=list(bulk_methods))
+        def get_price_lists():
+            return jsonify({property_id: price_list(property_id) for property_id in request.json["propertyIDs"]})
+
+        @app.route("/projects/available_projects/rental_incomes", methods=list(bulk_methods))
+        def get_rental_incomes():
+            return jsonify({property_id: rental_income(property_id) for property_id in request.json["propertyIDs"]})
+
+    return app
+
+
+def recording(app):
+    """WSGI app passing requests on to app; its .requests lists the (method, path) of each."""
+    def record(environ, start_response):
+        record.requests.append((environ["REQUEST_METHOD"], environ["PATH_INFO"]))
+        return app(environ, start_response)
+    record.requests = []
+    return record
+
+
+@contextmanager
+def serving(app):
+    """Serve app on a free local port from a thread; yields its base URL."""
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.port}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,49 @@
+import json
+import random
+
+TYPES = ("Apartment", "Villa", "Penthouse", "Studio")
+
+
+def make_rows(count=200, seed=1):
+    """Flattened inventory rows as the filter expects them, with repeated prices and areas so sorts have ties."""
+    rng = random.Random(seed)
+    rows = []
+    for number in range(count):
+        project = number // 10
+        price = rng.choice(range(100_000, 2_000_000, 50_000))
+        rows.append({
+            "projectID": f"P{project}",
+            "projectName": f"Project {rng.randint(0, 30)}",
+            "propertyDeveloper": "Developer",
+            "location": rng.choice(("Girne", "Iskele")),
+            "description": "A \"quoted\" description, it's fine",
+            "purpose": "Residential",
+            "start_date": "2024-01-01",
+            "completion_date": rng.choice(("2026-06-30", "2027-12-31", "2028-03-15")),
+            "facilities": ["Pool", "Gym"],
+            "no_of_installments": 12,
+            "no_of_properties": 10,
+            "percentage_sold": rng.uniform(0, 100),
+            "propertyID": f"P{project}-{number}",
+            "no_of_rooms": rng.randint(1, 5),
+            "type": rng.choice(TYPES),
+            "total_area_sqmeter": float(rng.choice(range(40, 400, 20))),
+            "no_of_bathrooms": float(rng.randint(1, 4)),
+            "price": float(price),
+            "interior_sqmeter": 50.0,
+            "balcony_terrace_sqmeter": 3.0,
+            "rooftop_sqmeter": 0.0,
+            "total_living_space_sqmeter": 53.0,
+            "installment_payment_plan": [],
+            "VAT": price * 0.05,
+            "stamp_duty": price * 0.06,
+            "title_deed_transfer": price * 0.03,
+            "lawyer_fees": 2000.0,
+            "ImageURL": "https://example.com/image.jpg",
+            "VideoURL": None,
+        })
+    return rows
+
+
+def make_projects_data(count=200, seed=1):
+    return json.dumps(make_rows(count, seed))
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+from modules.access_data import DataServiceClient, AsyncDataServiceClient
+from modules.cache import TTLCache
+from tests.data_service import data_service, serving, price_list, rental_income
+
+IDS = ["A001", "A002", "B001"]
+BULK = ("POST", "/projects/available_projects/price_lists")
+
+
+def per_property(app):
+    return sorted(path for method, path in app.requests if path.endswith("/price_list"))
+
+
+def test_bulk_endpoint_is_one_request():
+    app = data_service()
+    with serving(app) as url:
+        client = DataServiceClient(base_url=url)
+        assert client.fetch_price_lists(IDS + ["A001"]) == {property_id: price_list(property_id) for property_id in IDS}
+    assert app.requests == [BULK]
+
+
+# 404: the data service predates the bulk endpoints; 405: it only offers them over GET
+@pytest.mark.parametrize("bulk_methods", [(), ("GET",)])
+def test_falls_back_to_per_property_requests(bulk_methods):
+    app = data_service(bulk_methods)
+    with serving(app) as url:
+        client = DataServiceClient(base_url=url)
+        assert client.fetch_price_lists(IDS) == {property_id: price_list(property_id) for property_id in IDS}
+        assert client.fetch_rental_incomes(IDS) == {property_id: rental_income(property_id) for property_id in IDS}
+    assert per_property(app) == [f"/projects/available_projects/{property_id}/price_list" for property_id in sorted(IDS)]
+
+
+def test_async_client_falls_back_to_per_property_requests():
+    app = data_service(bulk_methods=())
+
+    async def fetch(url):
+        client = AsyncDataServiceClient(base_url=url)
+        try:
+            return await client.fetch_price_lists(IDS)
+        finally:
+            await client.client.aclose()
+
+    with serving(app) as url:
+        assert asyncio.run(fetch(url)) == {property_id: price_list(property_id) for property_id in IDS}
+    assert len(per_property(app)) == len(IDS)
+
+
+def test_failed_properties_are_left_out_unless_errors_are_raised():
+    app = data_service(bulk_methods=(), failing=("A002",))
+    with serving(app) as url:
+        client = DataServiceClient(base_url=url)
+        assert list(client.fetch_price_lists(IDS, raise_errors=False)) == ["A001", "B001"]
+        with pytest.raises(Exception, match="Failed to fetch price list data: 500"):
+            client.fetch_price_lists(IDS)
+
+
+def test_cached_lookups_are_reused_until_they_expire():
+    app = data_service()
+    with serving(app) as url:
+        client = DataServiceClient(base_url=url, cache=TTLCache(ttl=0.2))
+        client.fetch_price_lists(IDS[:2])
+        # Only the property not fetched yet is requested
+        assert client.fetch_price_lists(IDS) == {property_id: price_list(property_id) for property_id in IDS}
+        assert client.fetch_price_list("A001") == price_list("A001")
+        assert app.requests == [BULK] * 2
+        time.sleep(0.25)
+        client.fetch_price_lists(IDS)
+    assert app.requests == [BULK] * 3
@@ -0,0 +1,178 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import main_async
+from modules.admission import AdmissionController, Overloaded
+from modules.jobs import job_queue
+from modules.streaming import StreamingResult
+
+HEAVY = {"name": "heavy", "weight": 3}
+LIGHT = {"name": "light", "weight": 1}
+
+
+def controller(**options):
+    return AdmissionController(**{"capacity": 4, "reserved": 1, "max_waiting": 1, "queue_timeout": 0.2, **options})
+
+
+def test_light_tools_keep_the_reserved_capacity():
+    admission = controller()
+    assert admission.try_acquire(HEAVY) is not None
+    assert admission.try_acquire(HEAVY) is None
+    assert admission.try_acquire(LIGHT) is not None
+    assert admission.stats()["in_use"] == 4
+
+
+def test_max_concurrency_caps_a_tool():
+    admission = controller(capacity=16)
+    tool = {"name": "capped", "weight": 1, "maxConcurrency": 2}
+    assert admission.try_acquire(tool) is not None
+    assert admission.try_acquire(tool) is not None
+    assert admission.try_acquire(tool) is None
+
+
+def test_call_is_shed_after_the_queue_timeout():
+    admission = controller()
+    admission.acquire(HEAVY)
+    started = time.monotonic()
+    with pytest.raises(Overloaded) as shed:
+        admission.acquire(HEAVY)
+    assert time.monotonic() - started >= 0.2
+    assert shed.value.retry_after >= 1
+    assert admission.stats()["shed"] == {"heavy": 1}
+
+
+def test_call_is_shed_at_once_when_the_queue_is_full():
+    admission = controller(queue_timeout=1)
+    admission.acquire(HEAVY)
+    waiter = threading.Thread(target=pytest.raises, args=(Overloaded, admission.acquire, HEAVY))
+    waiter.start()
+    while not admission.stats()["waiting"].get("heavy"):
+        time.sleep(0.01)
+    started = time.monotonic()
+    with pytest.raises(Overloaded, match="queue full"):
+        admission.acquire(HEAVY)
+    assert time.monotonic() - started < 0.5
+    waiter.join()
+
+
+def test_unshed_call_waits_for_capacity():
+    admission = controller()
+    started_at = admission.acquire(HEAVY)
+    admitted = threading.Event()
+    waiter = threading.Thread(target=lambda: (admission.acquire(HEAVY, shed=False), admitted.set()))
+    waiter.start()
+    assert not admitted.wait(0.4)
+    admission.release(HEAVY, started_at)
+    assert admitted.wait(1)
+    waiter.join()
+
+
+def test_stream_slot_is_held_until_the_chunks_are_written():
+    admission = controller()
+    with admission.admit_stream(HEAVY) as stream:
+        assert admission.stats()["in_use"] == 3
+        chunks = stream.wrap(iter(["a", "b"]))
+    assert admission.stats()["in_use"] == 3
+    assert list(chunks) == ["a", "b"]
+    assert admission.stats()["in_use"] == 0
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_stream_slot_is_released_when_nothing_is_streamed(fail):
+    admission = controller()
+    with pytest.raises(RuntimeError) if fail else nullcontext():
+        with admission.admit_stream(HEAVY):
+            if fail:
+                raise RuntimeError("tool failed")
+    assert admission.stats()["in_use"] == 0
+
+
+@pytest.fixture(params=["flask", "async"])
+def server(request, monkeypatch):
+    """(admission controller, POST to /run-cmnd-tool) for each server, with a small test controller."""
+    admission = controller(capacity=3, reserved=0)
+    monkeypatch.setattr(main, "admission", admission)
+    monkeypatch.setattr(main_async, "admission", admission)
+    if request.param == "flask":
+        client = main.app.test_client()
+        yield admission, lambda body: client.post("/run-cmnd-tool", json=body)
+    else:
+        with TestClient(main_async.app) as client:
+            yield admission, lambda body: client.post("/run-cmnd-tool", json=body)
+
+
+def blocking_tool(release):
+    def run(**props):
+        release.wait(5)
+        return {"done": True}
+    return run
+
+
+def test_overloaded_call_gets_429_with_retry_after(server, register_tool):
+    admission, post = server
+    release = threading.Event()
+    register_tool("test_heavy", blocking_tool(release), weight=3)
+    holder = threading.Thread(target=post, args=({"toolName": "test_heavy", "props": {"n": 1}},))
+    holder.start()
+    while not admission.stats()["running"].get("test_heavy"):
+        time.sleep(0.01)
+    response = post({"toolName": "test_heavy", "props": {"n": 2}})
+    release.set()
+    holder.join()
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_jobs_are_admitted_when_they_start(server, register_tool):
+    admission, post = server
+    release = threading.Event()
+    register_tool("test_job", blocking_tool(release), weight=3)
+    response = post({"toolName": "test_job", "props": {"n": 3}, "job": True})
+    assert response.status_code == 202
+    job = job_queue.get((response.json() if callable(response.json) else response.json)["job_id"])
+    while not admission.stats()["running"].get("test_job"):
+        time.sleep(0.01)
+    assert admission.stats()["in_use"] == 3
+    release.set()
+    while job.status != "succeeded":
+        time.sleep(0.01)
+    assert admission.stats()["in_use"] == 0
+    assert admission.stats()["admitted"]["test_job"] == 1
+
+
+def test_streams_are_admitted_before_they_are_built(server, register_tool):
+    admission, post = server
+    in_use_when_built = []
+
+    def stream(**props):
+        in_use_when_built.append(admission.stats()["in_use"])
+        return StreamingResult("items", iter([1, 2, 3]))
+
+    register_tool("test_stream", lambda **props: {"items": [1, 2, 3]}, streamCmd=stream, weight=2)
+    response = post({"toolName": "test_stream", "props": {}, "stream": "ndjson"})
+    assert response.status_code == 200
+    body = response.get_data(as_text=True) if hasattr(response, "get_data") else response.text
+    assert body.split() == ["1", "2", "3"]
+    assert in_use_when_built == [2]
+    assert admission.stats()["in_use"] == 0
+
+
+def test_limits_are_divided_between_processes():
+    admission = controller(capacity=16, reserved=4, max_waiting=10, processes=4)
+    assert (admission.capacity, admission.reserved, admission.max_waiting) == (4, 1, 3)
+    capped = {"name": "capped", "weight": 1, "maxConcurrency": 6}
+    assert admission.try_acquire(capped) is not None
+    assert admission.try_acquire(capped) is not None
+    assert admission.try_acquire(capped) is None
+
+
+def test_tool_heavier_than_a_process_share_is_still_admitted():
+    admission = controller(capacity=16, reserved=4, processes=8)
+    tool = {"name": "very heavy", "weight": 6}
+    assert admission.weight(tool) == admission.capacity - admission.reserved
+    assert admission.try_acquire(tool) is not None
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+
+from modules.cache import TTLCache, DiskCache, SharedTTLCache
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_concurrent_misses_load_once():
+    cache = TTLCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"value": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("key", loader))) for _ in range(8)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Every other caller waits on the load in flight
+    wait_for(lambda: cache.stats()["coalesced"] == 7)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"value": 1}] * 8
+    assert cache.stats()["misses"] == 1
+    assert cache.get("key") == {"value": 1}
+
+
+def test_loader_error_reaches_waiting_callers_and_is_not_cached():
+    cache = TTLCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load("key", failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    owner = threading.Thread(target=call)
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    wait_for(lambda: cache.stats()["coalesced"] == 1)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert errors == ["upstream down"] * 2
+    assert cache.get_or_load("key", lambda: 2) == 2
+
+
+def test_get_many_or_load_only_loads_missing_keys():
+    cache = TTLCache(ttl=60)
+    cache.set("a", 1)
+    requested = []
+
+    def loader(keys):
+        requested.append(sorted(keys))
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    assert cache.get_many_or_load(["a", "b", "missing"], loader) == {"a": 1, "b": "B"}
+    assert requested == [["b", "missing"]]
+
+
+def test_async_callers_share_one_load():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_load("key", loader) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_entries_expire_and_are_evicted_by_size():
+    cache = TTLCache(ttl=0.05, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=60)
+    cache.set("key", {"value": [1, 2]})
+    assert cache.get("key") == {"value": [1, 2]}
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def disk_keys(directory):
+    return sorted(path.stem for path in directory.glob("*.json"))
+
+
+def test_disk_cache_evicts_entries_closest_to_expiry(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=60, max_entries=3, sweep_interval=3600)
+    for number in range(5):
+        cache.set(f"key{number}", number, ttl=60 + number)
+    cache.sweep()
+    assert disk_keys(tmp_path) == ["key2", "key3", "key4"]
+    assert cache.evictions == 2
+
+
+def test_disk_cache_is_bounded_by_bytes(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=60, max_bytes=10_000, sweep_interval=3600)
+    for number in range(20):
+        cache.set(f"key{number}", "x" * 1000, ttl=60 + number)
+    # Writes past an eighth of the bound trigger sweeps on the way
+    assert sum(path.stat().st_size for path in tmp_path.glob("*.json")) <= 10_000 + 1100
+    cache.sweep()
+    assert sum(path.stat().st_size for path in tmp_path.glob("*.json")) <= 10_000
+    assert "key19" in disk_keys(tmp_path)
+
+
+def test_disk_cache_sweeps_expired_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=0.05, sweep_interval=0.05)
+    cache.set("old", 1)
+    cache.set("kept", 2, ttl=60)
+    time.sleep(0.06)
+    # Any call after sweep_interval sweeps; the expired entry goes without being read
+    assert cache.get("kept") == 2
+    assert disk_keys(tmp_path) == ["kept"]
+    assert cache.expirations == 1
+
+
+def test_shared_cache_loads_once_across_processes(tmp_path):
+    # Two caches over one directory stand in for two worker processes
+    first, second = (SharedTTLCache(DiskCache(str(tmp_path), ttl=60), ttl=60) for _ in range(2))
+    loaded = []
+
+    def loader(keys):
+        loaded.extend(keys)
+        return {key: {"id": key[1]} for key in keys}
+
+    assert first.get_many_or_load([("price_list", "A"), ("price_list", "B")], loader) == {
+        ("price_list", "A"): {"id": "A"}, ("price_list", "B"): {"id": "B"},
+    }
+    assert second.get_many_or_load([("price_list", "A"), ("price_list", "C")], loader) == {
+        ("price_list", "A"): {"id": "A"}, ("price_list", "C"): {"id": "C"},
+    }
+    assert asyncio.run(second.aget_or_load(("price_list", "B"), lambda: asyncio.sleep(0, {"id": "wrong"}))) == {"id": "B"}
+    assert loaded == [("price_list", "A"), ("price_list", "B"), ("price_list", "C")]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from modules.codec import decode_projects_data, parse_projects_data, python_literal_to_json, JSON_BACKEND
+from tests.inventory import make_rows
+
+TRICKY_STRINGS = [
+    "it's", 'say "hi"', "both ' and \"", 'a", "b', "back\\slash", "tab\tnew\nline", "\x01\x7f",
+    "Ünïcödé ✓", "None of True or False", "", "'", '"',
+]
+
+
+def tricky_rows():
+    rows = make_rows(20)
+    for row, text in zip(rows, TRICKY_STRINGS):
+        row["description"] = text
+        row["facilities"] = [text, "Pool"]
+        row["VideoURL"] = None
+        row["flag"] = row["no_of_rooms"] > 2
+    return rows
+
+
+@pytest.mark.parametrize("rows", [make_rows(50), tricky_rows()])
+def test_json_round_trip(rows):
+    assert decode_projects_data(json.dumps(rows)) == (rows, JSON_BACKEND)
+
+
+@pytest.mark.parametrize("rows", [make_rows(50), tricky_rows()])
+def test_repr_round_trip(rows):
+    assert decode_projects_data(repr(rows)) == (rows, "python")
+
+
+def test_constants_inside_strings_are_kept():
+    rows = [{"a": "None of True", "b": None, "c": True, "d": [False, 1.5, -2]}]
+    assert json.loads(python_literal_to_json(repr(rows))) == rows
+
+
+def test_single_quoted_json():
+    assert decode_projects_data("[{'a': true, 'b': null, 'c': 'x'}]") == ([{"a": True, "b": None, "c": "x"}], "python")
+
+
+def test_literals_json_cannot_express_fall_back_to_literal_eval():
+    rows, fmt = decode_projects_data("[{'a': (1, 2), 'b': '\\N{BULLET}\\0'}]")
+    assert rows == [{"a": (1, 2), "b": "•\0"}]
+    assert fmt == "python literal"
+
+
+@pytest.mark.parametrize("payload", ["[{'a': 1", "not a payload", "[{'a': foo}]"])
+def test_invalid_payload_raises(payload):
+    with pytest.raises(Exception, match="Failed to parse projects data"):
+        decode_projects_data(payload)
+
+
+def test_parse_projects_data_requires_a_list():
+    with pytest.raises(Exception, match="expected a list"):
+        parse_projects_data('{"a": 1}')
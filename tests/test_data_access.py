@@ -0,0 +1,51 @@
+import pytest
+
+import data_access
+
+PRICE_LISTS = "/projects/available_projects/price_lists"
+RENTAL_INCOMES = "/projects/available_projects/rental_incomes"
+
+
+@pytest.fixture
+def client():
+    return data_access.app.test_client()
+
+
+@pytest.fixture
+def property_ids():
+    return list(data_access.rental_income_data)[:3]
+
+
+@pytest.mark.parametrize("bulk_path, single", [(PRICE_LISTS, "price_list"), (RENTAL_INCOMES, "rental_income")])
+def test_bulk_response_matches_single_requests(client, property_ids, bulk_path, single):
+    bulk = client.post(bulk_path, json={"propertyIDs": property_ids + property_ids[:1]}).json
+    assert list(bulk) == property_ids
+    for property_id in property_ids:
+        assert bulk[property_id] == client.get(f"/projects/available_projects/{property_id}/{single}").json
+
+
+def test_property_ids_in_the_query_string(client, property_ids):
+    first, second, third = property_ids
+    response = client.get(f"{RENTAL_INCOMES}?propertyIDs={first},{second}&propertyIDs={third}")
+    assert list(response.json) == property_ids
+
+
+def test_unknown_property_gets_an_empty_document(client):
+    assert client.post(RENTAL_INCOMES, json={"propertyIDs": ["missing"]}).json == {"missing": {}}
+    assert client.post(PRICE_LISTS, json={"propertyIDs": ["missing"]}).json == {"missing": []}
+
+
+def test_fields_project_nested_paths(client, property_ids):
+    property_id = property_ids[0]
+    income = data_access.rental_income_data[property_id]
+    response = client.post(RENTAL_INCOMES, json={"propertyIDs": [property_id], "fields": ["propertyID", "realistic.ROI"]})
+    assert response.json == {property_id: {"propertyID": property_id, "realistic": {"ROI": income["realistic"]["ROI"]}}}
+
+    # "*" matches every scenario; lists of records are projected item by item
+    response = client.get(f"{RENTAL_INCOMES}?propertyIDs={property_id}&fields=*.ROI")
+    assert response.json[property_id] == {scenario: {"ROI": income[scenario]["ROI"]} for scenario in ("pessimistic", "realistic", "optimistic")}
+    response = client.get(f"{PRICE_LISTS}?propertyIDs={property_id}&fields=payment_plan.price,floor")
+    assert response.json[property_id] == [
+        {"payment_plan": {"price": entry["payment_plan"]["price"]}, "floor": entry["floor"]}
+        for entry in data_access.price_list_data[property_id]
+    ]
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import random
+from functools import partial
+
+import pytest
+
+from modules.executor import (
+    ProcessExecutor, inline_executor, process_executor, executor_for, call_with_executor, map_chunks, amap_chunks,
+)
+from modules.risk_analysis import score_risk_chunk
+from tests.inventory import make_rows
+from tests.test_risk_analysis import NOW, rental_income, price_list
+
+
+def chunk_info(chunk):
+    """Each item with the process and size of the chunk it was run in."""
+    return [(item, os.getpid(), len(chunk)) for item in chunk]
+
+
+@pytest.fixture
+def executor():
+    executor = ProcessExecutor(workers=2, chunk_size=7, min_items=10)
+    yield executor
+    executor.shutdown()
+
+
+def risk_entries(count=60, seed=4):
+    rng = random.Random(seed)
+    return [
+        (row, rental_income(rng) if number % 7 else None, price_list(rng, row["price"]) if number % 5 else [])
+        for number, row in enumerate(make_rows(count, seed))
+    ]
+
+
+def test_chunks_run_in_the_pool_in_item_order(executor):
+    results = executor.map_chunks(chunk_info, range(30))
+    assert [item for item, _, _ in results] == list(range(30))
+    assert [size for _, _, size in results] == [7] * 28 + [2] * 2
+    assert os.getpid() not in {pid for _, pid, _ in results}
+
+
+def test_small_batches_run_inline(executor):
+    results = executor.map_chunks(chunk_info, range(9))
+    assert results == [(item, os.getpid(), 9) for item in range(9)]
+    assert executor._pool is None
+
+
+def test_process_pool_matches_inline_risk_scores(executor):
+    entries = risk_entries()
+    score = partial(score_risk_chunk, now=NOW)
+    expected = inline_executor.map_chunks(score, entries)
+    assert expected
+    assert executor.map_chunks(score, entries) == expected
+    assert asyncio.run(executor.amap_chunks(score, entries)) == expected
+    assert asyncio.run(inline_executor.amap_chunks(score, entries)) == expected
+
+
+def test_tools_run_on_their_executor(executor):
+    assert executor_for({"isCpuHeavy": True}) is process_executor
+    assert executor_for({}) is inline_executor
+
+    def batch(items):
+        return map_chunks(chunk_info, items)
+
+    async def abatch(items):
+        return await amap_chunks(chunk_info, items)
+
+    assert {pid for _, pid, _ in call_with_executor(inline_executor, batch, items=range(30))} == {os.getpid()}
+    assert os.getpid() not in {pid for _, pid, _ in call_with_executor(executor, batch, items=range(30))}
+    assert os.getpid() not in {pid for _, pid, _ in asyncio.run(call_with_executor(executor, abatch, items=range(30)))}
@@ -0,0 +1,95 @@
+import pytest
+
+from models import InvestmentOptionsSchema
+from modules.filter_investment_options import select_page, encode_cursor
+from modules.inventory_store import InventoryStore
+from tests.inventory import make_rows
+
+SORT_KEYS = [None, "price", "total_area_sqmeter", "price_per_sqm", "no_of_rooms", "projectName"]
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return make_rows(300)
+
+
+@pytest.fixture(scope="module")
+def store(rows):
+    return InventoryStore(rows, digest="test")
+
+
+def sort_value(row, sort_by):
+    if sort_by == "price_per_sqm":
+        return row["price"] / row["total_area_sqmeter"]
+    return row[sort_by]
+
+
+def expected_ids(rows, sort_by, descending, **filters):
+    """propertyIDs of every match, by a full stable sort of the filtered rows."""
+    matches = [row for row in rows
+               if filters.get("budget_min", 0) <= row["price"] <= filters["budget_max"]
+               and (not filters.get("property_type") or row["type"].lower() == filters["property_type"].lower())
+               and row["no_of_rooms"] >= filters.get("bedrooms_min", 0)]
+    if sort_by:
+        matches = sorted(matches, key=lambda row: sort_value(row, sort_by), reverse=descending)
+    return [row["propertyID"] for row in matches]
+
+
+def options(**props):
+    """InvestmentOptionsSchema from props, leaving out the ones that are None like a caller would."""
+    return InvestmentOptionsSchema(**{key: value for key, value in props.items() if value is not None})
+
+
+def page_ids(store, page):
+    return [store.field(row, "propertyID") for row in page]
+
+
+@pytest.mark.parametrize("sort_by", SORT_KEYS)
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("filters", [
+    {"budget_max": 10**7},
+    {"budget_min": 300_000, "budget_max": 1_500_000, "property_type": "villa"},
+    {"budget_max": 900_000, "bedrooms_min": 3},
+])
+def test_cursor_pages_match_full_sort(rows, store, sort_by, descending, filters):
+    expected = expected_ids(rows, sort_by, descending, **filters)
+    seen, cursor = [], None
+    while True:
+        parameters = options(sort_by=sort_by, descending=descending, limit=7, cursor=cursor, **filters)
+        _, page, cursor = select_page(store, parameters)
+        seen += page_ids(store, page)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+@pytest.mark.parametrize("sort_by", SORT_KEYS)
+def test_offset_and_limit_match_full_sort(rows, store, sort_by):
+    expected = expected_ids(rows, sort_by, True, budget_max=10**7)
+    for offset, limit in [(0, 1), (5, 10), (290, 50), (0, None)]:
+        parameters = options(budget_max=10**7, sort_by=sort_by, descending=True, offset=offset, limit=limit)
+        _, page, _ = select_page(store, parameters)
+        stop = None if limit is None else offset + limit
+        assert page_ids(store, page) == expected[offset:stop]
+
+
+def test_cursor_from_another_sort_is_rejected(store):
+    _, _, cursor = select_page(store, options(budget_max=10**7, sort_by="price", limit=5))
+    with pytest.raises(Exception, match="Cursor does not belong"):
+        select_page(store, options(budget_max=10**7, sort_by="total_area_sqmeter", limit=5, cursor=cursor))
+
+
+
+def test_cursor_from_another_inventory_is_rejected(rows, store):
+    _, _, cursor = select_page(store, options(budget_max=10**7, sort_by="price", limit=5))
+    other = InventoryStore(rows[:100], digest="other")
+    with pytest.raises(Exception, match="Cursor does not belong"):
+        select_page(other, options(budget_max=10**7, sort_by="price", limit=5, cursor=cursor))
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor", encode_cursor([1, 2]), encode_cursor({"inventory": "test"}), encode_cursor({"inventory": "test"})[:-3],
+])
+def test_tampered_cursor_is_rejected(store, cursor):
+    with pytest.raises(Exception, match="Invalid cursor"):
+        select_page(store, options(budget_max=10**7, sort_by="price", limit=5, cursor=cursor))
@@ -0,0 +1,58 @@
+import random
+
+import numpy as np
+import pytest
+
+import data_access
+from modules.inventory_index import SortedIndex, InvertedIndex, intersect_rows
+
+
+@pytest.fixture(scope="module")
+def values():
+    rng = random.Random(3)
+    return [float(rng.choice(range(0, 1000, 25))) for _ in range(500)]
+
+
+@pytest.mark.parametrize("low, high", [(None, None), (100, 400), (110, 390), (400, 100), (None, 250), (975, None), (2000, None)])
+def test_sorted_index_range_matches_scan(values, low, high):
+    rows = SortedIndex(values).range(low, high)
+    expected = [row for row, value in enumerate(values)
+                if (low is None or value >= low) and (high is None or value <= high)]
+    assert sorted(rows.tolist()) == expected
+    # In value order, ties in row order
+    assert rows.tolist() == sorted(expected, key=lambda row: values[row])
+
+
+def test_inverted_index_rows_match_scan():
+    types = ["Villa", "villa", "Apartment", "Studio", "VILLA", "Apartment"] * 20
+    index = InvertedIndex(types, normalize=str.lower)
+    assert index.rows("Villa").tolist() == [row for row, value in enumerate(types) if value.lower() == "villa"]
+    assert index.rows("studio").tolist() == [row for row, value in enumerate(types) if value == "Studio"]
+    assert index.rows("Castle").tolist() == []
+    assert index.code("APARTMENT") == index.codes[2]
+
+
+def test_intersect_rows():
+    rng = np.random.default_rng(5)
+    sets = [rng.choice(300, size=size, replace=False) for size in (200, 120, 250)]
+    expected = sorted(set(sets[0].tolist()) & set(sets[1].tolist()) & set(sets[2].tolist()))
+    assert intersect_rows(*sets).tolist() == expected
+
+
+@pytest.mark.parametrize("query", [
+    {},
+    {"location": "Kyrenia"},
+    {"purpose": "For Max Rental ROI", "min_price": 200_000},
+    {"location": "Iskele", "max_price": 150_000},
+    {"min_price": 300_000, "max_price": 400_000},
+])
+def test_data_service_project_query_matches_scan(query):
+    def matches(project):
+        prices = [property_type["price"] for property_type in project["property_types"]]
+        return ((query.get("location") is None or project["location"] == query["location"])
+                and (query.get("purpose") is None or project["purpose"] == query["purpose"])
+                and (query.get("min_price") is None or any(price >= query["min_price"] for price in prices))
+                and (query.get("max_price") is None or any(price <= query["max_price"] for price in prices)))
+
+    expected = [project["projectID"] for project in data_access.projects_data if matches(project)]
+    assert [project["projectID"] for project in data_access.project_index.query(**query)] == expected
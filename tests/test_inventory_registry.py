@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from modules.inventory_registry import InventoryRegistry
+from tests.inventory import make_rows
+
+
+def property_ids(store):
+    return [store.field(row, "propertyID") for row in range(len(store)) if store.records[row] is not None]
+
+
+@pytest.fixture(params=[False, True], ids=["memory", "snapshot"])
+def registry(request, tmp_path):
+    return InventoryRegistry(directory=str(tmp_path) if request.param else None)
+
+
+def reopened(registry, inventory_id):
+    """The inventory as another worker process would see it: from its snapshot when there is one."""
+    if registry.directory is None:
+        return registry.get(inventory_id)
+    return InventoryRegistry(directory=registry.directory).get(inventory_id)
+
+
+def test_patch_updates_removes_and_adds(registry):
+    rows = make_rows(30)
+    base_id, base = registry.register(json.dumps(rows))
+    added = dict(rows[0], propertyID="NEW-1", price=123.0)
+    new_id, _ = registry.patch(base_id, {
+        "removed": [rows[1]["propertyID"]],
+        "changed": [{"propertyID": rows[2]["propertyID"], "price": 1.0}, {"projectID": "P0", "no_of_rooms": 9}],
+        "added": [added],
+    })
+    store = reopened(registry, new_id)
+    ids = property_ids(store)
+    assert ids == [row["propertyID"] for row in rows if row is not rows[1]] + ["NEW-1"]
+    assert store.view(ids.index(rows[2]["propertyID"]))["price"] == 1.0
+    assert all(store.view(i)["no_of_rooms"] == 9 for i, id in enumerate(ids) if id.startswith("P0-"))
+    assert store.view(ids.index("NEW-1"))["price"] == 123.0
+    # The base version is left as it was
+    assert property_ids(reopened(registry, base_id)) == [row["propertyID"] for row in rows]
+
+
+def test_patch_changes_video_url(registry):
+    rows = make_rows(3)
+    rows[0].update(ImageURL="", VideoURL="https://example.com/old.mp4")
+    base_id, _ = registry.register(json.dumps(rows))
+    new_id, _ = registry.patch(base_id, {"changed": [{"propertyID": rows[0]["propertyID"], "VideoURL": "https://example.com/new.mp4"}]})
+    assert reopened(registry, new_id).view(0)["ImageURL OR VideoURL"] == "https://example.com/new.mp4"
+    # An image still takes precedence over a video, as when the row is first loaded
+    image_id, _ = registry.patch(new_id, {"changed": [{"propertyID": rows[0]["propertyID"], "ImageURL": "https://example.com/a.jpg"}]})
+    assert reopened(registry, image_id).view(0)["ImageURL OR VideoURL"] == "https://example.com/a.jpg"
+
+
+@pytest.mark.parametrize("added", [lambda rows: [rows[0]], lambda rows: [dict(rows[0], propertyID="X"), dict(rows[1], propertyID="X")]])
+def test_added_property_ids_must_be_new(registry, added):
+    rows = make_rows(5)
+    base_id, _ = registry.register(json.dumps(rows))
+    with pytest.raises(Exception, match="already in the inventory"):
+        registry.patch(base_id, {"added": added(rows)})
+
+
+def test_removed_property_can_be_added_back(registry):
+    rows = make_rows(5)
+    base_id, _ = registry.register(json.dumps(rows))
+    new_id, store = registry.patch(base_id, {"removed": [rows[0]["propertyID"]], "added": [dict(rows[0], price=5.0)]})
+    assert property_ids(store) == [row["propertyID"] for row in rows[1:]] + [rows[0]["propertyID"]]
+
+
+
+@pytest.mark.parametrize("patch, message", [
+    ({"removed": ["NOPE"]}, "Removed property NOPE is not in the inventory"),
+    ({"changed": [{"propertyID": "NOPE", "price": 1.0}]}, "Changed property NOPE is not in the inventory"),
+    ({"changed": [{"projectID": "NOPE", "price": 1.0}]}, "Changed project NOPE is not in the inventory"),
+    ({"changed": [{"price": 1.0}]}, "Changed entry 0 needs a propertyID or a projectID"),
+    ({"changed": [{"propertyID": "P0-0", "price": "cheap"}]}, "Changed property P0-0 has a non-numeric price"),
+    ({"added": [{"propertyID": "NEW-1"}]}, r"Added row 0 \(NEW-1\) is missing the field"),
+])
+def test_invalid_patch_is_rejected(registry, patch, message):
+    base_id, _ = registry.register(json.dumps(make_rows(5)))
+    with pytest.raises(Exception, match=message):
+        registry.patch(base_id, patch)
+
+
+def test_patch_endpoint_names_the_invalid_entry(monkeypatch):
+    import main
+    import modules.inventory_registry
+    monkeypatch.setattr(modules.inventory_registry, "inventory_registry", InventoryRegistry())
+    client = main.app.test_client()
+    base_id = client.post("/inventories", json={"projects_data": json.dumps(make_rows(5))}).json["inventory_id"]
+    response = client.patch(f"/inventories/{base_id}", json={"added": [dict(make_rows(1)[0], propertyID="NEW-1", price=None)]})
+    assert response.status_code == 400
+    assert b"Added row 0 (NEW-1) has a non-numeric price" in response.data
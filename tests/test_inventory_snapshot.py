@@ -0,0 +1,53 @@
+import os
+import time
+
+from modules.codec import parse_stats
+from modules.inventory_snapshot import SnapshotRecords, write_snapshot, open_snapshot, encode_records, payload_snapshot_store
+from modules.inventory_store import InventoryStore, inventory_digest
+from tests.inventory import make_rows, make_projects_data
+
+
+def test_snapshot_round_trip(tmp_path):
+    rows = make_rows(50)
+    store = InventoryStore(rows)
+    write_snapshot(rows, str(tmp_path))
+    snapshot = open_snapshot(str(tmp_path))
+    assert len(snapshot) == len(store)
+    assert [snapshot.view(row) for row in range(len(store))] == [store.view(row) for row in range(len(store))]
+    assert (snapshot.price == store.price).all()
+
+
+def test_decoded_values_are_bounded():
+    store = InventoryStore(make_rows(100))
+    records = SnapshotRecords(*encode_records(store.records), max_decoded=8)
+    assert [records[row] for row in range(len(store))] == list(store.records)
+    assert records.value.cache_info().currsize == 8
+
+
+def test_payload_is_parsed_once_across_processes(tmp_path):
+    projects_data = make_projects_data(40)
+    digest = inventory_digest(projects_data)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            payload_snapshot_store(projects_data, digest, str(tmp_path), 4)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    parses = sum(parse_stats.snapshot()["counts"].values())
+    store = payload_snapshot_store(projects_data, digest, str(tmp_path), 4)
+    # Mapped from the snapshot the other process wrote, not parsed again
+    assert sum(parse_stats.snapshot()["counts"].values()) == parses
+    assert store.digest == digest
+    parsed = InventoryStore.from_projects_data(projects_data)
+    assert [store.view(row) for row in range(len(store))] == [parsed.view(row) for row in range(len(parsed))]
+
+
+def test_least_recently_used_payloads_are_pruned(tmp_path):
+    payloads = [make_projects_data(5, seed) for seed in range(3)]
+    for projects_data in payloads:
+        payload_snapshot_store(projects_data, inventory_digest(projects_data), str(tmp_path), 2)
+        time.sleep(0.01)
+    kept = sorted(path.name for path in tmp_path.iterdir() if path.is_dir())
+    assert kept == sorted(inventory_digest(projects_data) for projects_data in payloads[1:])
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+from models import InvestmentOptionsSchema
+from modules.codec import parse_stats
+from modules.cost_comparison import run_cost_comparison_module, format_property_data
+from modules.filter_investment_options import filter_investment_options
+from modules.inventory_store import InventoryStore, STORED_FIELDS, compact_record, get_inventory_store, project_property
+from modules.request_context import AnalysisContext
+from tests.inventory import make_rows, make_projects_data
+
+
+def scan(rows, parameters):
+    """The per-row loop the columnar store replaced, as the reference for its results."""
+    matches = []
+    for row in rows:
+        if (parameters.budget_min <= row['price'] <= parameters.budget_max
+                and (not parameters.size_min or row['total_area_sqmeter'] >= parameters.size_min)
+                and (not parameters.size_max or row['total_area_sqmeter'] <= parameters.size_max)
+                and (not parameters.bedrooms_min or row['no_of_rooms'] >= parameters.bedrooms_min)
+                and (not parameters.bedrooms_max or row['no_of_rooms'] <= parameters.bedrooms_max)
+                and (not parameters.bathrooms_min or row['no_of_bathrooms'] >= parameters.bathrooms_min)
+                and (not parameters.bathrooms_max or row['no_of_bathrooms'] <= parameters.bathrooms_max)
+                and (not parameters.property_type or row['type'].lower() == parameters.property_type.lower())):
+            try:
+                matches.append(project_property(row))
+            except KeyError:
+                pass
+    if parameters.sort_by and matches and parameters.sort_by in matches[0]:
+        matches = sorted(matches, key=lambda record: record[parameters.sort_by])
+    return matches
+
+
+@pytest.fixture(scope="module")
+def rows():
+    rows = make_rows(300, seed=7)
+    # A row missing a field is left out of results rather than failing the call
+    del rows[10]['lawyer_fees']
+    return rows
+
+
+@pytest.mark.parametrize("filters", [
+    {"budget_max": 10**7},
+    {"budget_min": 500_000, "budget_max": 1_200_000},
+    {"budget_max": 10**7, "size_min": 100, "size_max": 250},
+    {"budget_max": 10**7, "bedrooms_min": 2, "bedrooms_max": 3, "bathrooms_min": 2, "bathrooms_max": 3},
+    {"budget_max": 10**7, "property_type": "VILLA", "sort_by": "price"},
+    {"budget_max": 1_500_000, "property_type": "Studio", "sort_by": "projectName"},
+    {"budget_max": 10**7, "property_type": "Castle"},
+    {"budget_min": 3_000_000, "budget_max": 10**7},
+])
+def test_store_filter_matches_row_scan(rows, filters):
+    parameters = InvestmentOptionsSchema(projects_data=json.dumps(rows), **filters)
+    assert filter_investment_options(parameters) == scan(rows, parameters)
+
+
+def test_payload_is_parsed_once():
+    projects_data = json.dumps(make_rows(20, seed=8))
+    parses = sum(parse_stats.snapshot()["counts"].values())
+    store = get_inventory_store(projects_data)
+    assert get_inventory_store(projects_data) is store
+    assert sum(parse_stats.snapshot()["counts"].values()) == parses + 1
+
+
+class CountingRecords(list):
+    """Store records that count the rows read."""
+
+    reads = 0
+
+    def __getitem__(self, row):
+        self.reads += 1
+        return super().__getitem__(row)
+
+
+def test_row_views_are_read_only_records():
+    rows = make_rows(5)
+    view = InventoryStore(rows).view(2)
+    assert dict(view) == project_property(rows[2])
+    assert list(view) == list(project_property(rows[2]))
+    assert "price" in view and "ImageURL" not in view
+    with pytest.raises(TypeError):
+        view["price"] = 1
+
+
+def test_filtered_rows_are_read_lazily():
+    context = AnalysisContext.from_props(projects_data=make_projects_data(100, seed=9), budget_max=10**7)
+    store, rows, _ = context.select()
+    store.records = CountingRecords(store.records)
+    properties = context.iter_filtered_projects()
+    assert store.records.reads == 0
+    first, second = next(properties), next(properties)
+    assert store.records.reads == 2
+    assert (first.row, second.row) == (rows[0], rows[1])
+
+
+def test_modules_give_the_same_output_for_views_and_dicts():
+    context = AnalysisContext.from_props(projects_data=make_projects_data(40, seed=10), budget_max=10**7)
+    assert run_cost_comparison_module(context=context) == {
+        "properties": [format_property_data(dict(view)) for view in context.iter_filtered_projects()],
+    }
+    empty = AnalysisContext.from_props(projects_data=make_projects_data(40, seed=10), budget_max=1)
+    assert run_cost_comparison_module(context=empty) == {"message": "No properties found matching the criteria."}
+
+
+def test_filter_results_are_copies():
+    projects_data = make_projects_data(10, seed=12)
+    first = filter_investment_options(InvestmentOptionsSchema(projects_data=projects_data, budget_max=10**7))
+    first[0]["price"] = -1
+    second = filter_investment_options(InvestmentOptionsSchema(projects_data=projects_data, budget_max=10**7))
+    assert second[0]["price"] != -1
+
+
+def test_compact_records_are_tuples_in_stored_field_order():
+    row = make_rows(1)[0]
+    record = compact_record(row, {})
+    assert isinstance(record, tuple)
+    expected = {**project_property(row), "ImageURL": row["ImageURL"], "VideoURL": row["VideoURL"]}
+    assert record == tuple(expected[field] for field in STORED_FIELDS)
+
+
+def test_repeated_strings_and_facility_lists_are_stored_once():
+    # Parsed JSON gives each row its own string and list objects
+    store = InventoryStore(json.loads(json.dumps(make_rows(20))))
+    first, second = store.view(0), store.view(1)
+    assert first["projectID"] is second["projectID"]
+    assert first["description"] is second["description"]
+    assert first["facilities"] is second["facilities"]
+
+
+def test_rows_that_cannot_be_projected_are_left_out():
+    rows = make_rows(6)
+    del rows[2]["price"]
+    store = InventoryStore(rows)
+    assert store.records[2] is None
+    assert store.valid.tolist() == [True, True, False, True, True, True]
+    rows_found = store.filter(InvestmentOptionsSchema(projects_data="[]", budget_max=10**8)).tolist()
+    assert rows_found == [0, 1, 3, 4, 5]
+
+    rebuilt = InventoryStore.from_records(store.records)
+    assert rebuilt.filter(InvestmentOptionsSchema(projects_data="[]", budget_max=10**8)).tolist() == rows_found
+    assert dict(rebuilt.view(3)) == dict(store.view(3))
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+import data_access
+import modules.access_data
+import modules.request_context
+from modules.access_data import DataServiceClient, AsyncDataServiceClient
+from modules.investment_recommendations import (
+    run_investment_recommendation_wrapper, arun_investment_recommendation_wrapper, compile_recommendations,
+    iter_investment_recommendations, stream_investment_recommendations,
+)
+from tests.data_service import recording, serving
+
+BULK_REQUESTS = [
+    ("POST", "/projects/available_projects/price_lists"),
+    ("POST", "/projects/available_projects/rental_incomes"),
+]
+
+
+@pytest.fixture(scope="module")
+def projects_data():
+    return json.dumps(data_access.inventory_rows())
+
+
+@pytest.fixture
+def data_service(monkeypatch):
+    """The data service app on a local port, with the tool server's clients pointed at it; yields its request log."""
+    service = recording(data_access.app)
+    with serving(service) as url:
+        async_clients = {}
+
+        def get_async_client():
+            loop = asyncio.get_running_loop()
+            if loop not in async_clients:
+                async_clients[loop] = AsyncDataServiceClient(base_url=url)
+            return async_clients[loop]
+
+        monkeypatch.setattr(modules.access_data, "client", DataServiceClient(base_url=url))
+        monkeypatch.setattr(modules.access_data, "get_async_client", get_async_client)
+        yield service.requests
+
+
+@pytest.fixture
+def selections(monkeypatch):
+    """Calls filtering the inventory, counted."""
+    calls = []
+    select = modules.request_context.select_investment_page
+
+    def counted(parameters):
+        calls.append(parameters)
+        return select(parameters)
+    monkeypatch.setattr(modules.request_context, "select_investment_page", counted)
+    return calls
+
+
+def test_each_property_is_filtered_and_fetched_once(data_service, selections, projects_data):
+    result = run_investment_recommendation_wrapper(projects_data=projects_data, budget_max=10**7)
+    assert len(result["recommendations"]) == len(data_access.inventory_rows())
+    assert len(selections) == 1
+    assert sorted(data_service) == BULK_REQUESTS
+
+
+def test_async_modules_share_one_context(data_service, selections, projects_data):
+    expected = run_investment_recommendation_wrapper(projects_data=projects_data, budget_max=500_000)
+    data_service.clear()
+    selections.clear()
+    result = asyncio.run(arun_investment_recommendation_wrapper(projects_data=projects_data, budget_max=500_000))
+    assert result == expected
+    assert len(selections) == 1
+    assert sorted(data_service) == BULK_REQUESTS
+
+
+def nested_join(cost_comparison, rental_income_forecast, risk_analysis, property_details):
+    """The scan of every module's list for every property that compile_recommendations replaced."""
+    recommendations = []
+    for property in cost_comparison['properties']:
+        property_id = property['propertyID']
+        RIF = next((item for item in rental_income_forecast['rental_income_forecast'] if item['propertyID'] == property_id), None)
+        RA = next((item['Risk Report'] for item in risk_analysis['risk_analysis'] if item['Risk Report']['propertyID'] == property_id), None)
+        PDI = next((item for item in property_details['property_details'] if item['propertyID'] == property_id), None)
+        if RIF and RA and PDI:
+            recommendations.append({
+                'Cost Comparison': property,
+                'Rental Income Forecast': RIF,
+                'Risk Analysis': RA,
+                'Property Details and Insights': PDI,
+            })
+    return {"recommendations": recommendations}
+
+
+def test_hash_join_matches_nested_scan():
+    ids = [f"P{number}" for number in range(30)]
+    # Modules may skip properties, list them in another order or list one twice; the first entry wins
+    results = (
+        {'properties': [{'propertyID': property_id, 'cost': number} for number, property_id in enumerate(ids)]},
+        {'rental_income_forecast': [{'propertyID': property_id, 'run': run} for run in (1, 2) for property_id in ids[::-1] if property_id != "P4"]},
+        {'risk_analysis': [{'Risk Report': {'propertyID': property_id}} for property_id in ids[::2]]},
+        {'property_details': [{'propertyID': property_id, 'run': run} for property_id in ids for run in (1, 2)]},
+    )
+    compiled = compile_recommendations(*results)
+    assert compiled == nested_join(*results)
+    assert len(compiled["recommendations"]) == 14
+
+
+def test_streamed_recommendations_match_the_wrapper(data_service, projects_data):
+    expected = run_investment_recommendation_wrapper(projects_data=projects_data, budget_max=10**7)
+    recommendations = iter_investment_recommendations(projects_data=projects_data, budget_max=10**7)
+    assert next(recommendations) == expected["recommendations"][0]
+    assert list(recommendations) == expected["recommendations"][1:]
+
+    result = stream_investment_recommendations(projects_data=projects_data, budget_max=10**7, limit=3)
+    assert json.loads("".join(result.iter_chunks("json"))) == run_investment_recommendation_wrapper(
+        projects_data=projects_data, budget_max=10**7, limit=3,
+    )
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from modules.investment_recommendations import run_stages, run_stage
+from modules.jobs import JobQueue, JobStore, check_cancelled, report_partial
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(max_concurrency=1, max_queued=10, result_ttl=60)
+
+
+def test_jobs_run_by_priority_then_in_order(queue):
+    release = threading.Event()
+    order = []
+    queue.submit("blocker", lambda: release.wait(5))
+    for name, priority in [("low", 0), ("high", 5), ("low-2", 0)]:
+        queue.submit(name, lambda name=name: order.append(name), priority=priority)
+    release.set()
+    wait_for(lambda: len(order) == 3)
+    assert order == ["high", "low", "low-2"]
+
+
+def test_queued_job_is_cancelled_at_once(queue):
+    release = threading.Event()
+    queue.submit("blocker", lambda: release.wait(5))
+    ran = []
+    job = queue.submit("queued", lambda: ran.append(True))
+    assert queue.cancel(job.id).status == "cancelled"
+    release.set()
+    time.sleep(0.1)
+    assert not ran
+
+
+def test_running_job_stops_at_its_next_check(queue):
+    started, cancelled = threading.Event(), threading.Event()
+    stages = []
+
+    def run():
+        for stage in range(3):
+            check_cancelled()
+            report_partial(f"stage{stage}", stage)
+            stages.append(stage)
+            started.set()
+            cancelled.wait(5)
+
+    job = queue.submit("staged", run)
+    started.wait(5)
+    queue.cancel(job.id)
+    cancelled.set()
+    wait_for(lambda: job.status == "cancelled")
+    assert stages == [0]
+    assert job.status_dict(partial=True)["partial"] == {"stage0": 0}
+    assert job.result is None
+
+
+def test_finished_job_cannot_be_cancelled(queue):
+    job = queue.submit("quick", lambda: 1)
+    wait_for(lambda: job.status == "succeeded")
+    assert not job.cancel()
+    assert job.result == 1
+
+
+def test_sync_stages_stop_between_modules(queue):
+    started, cancelled = threading.Event(), threading.Event()
+    ran = []
+
+    def module(name):
+        def run(context):
+            ran.append(name)
+            started.set()
+            cancelled.wait(5)
+            return {name: True}
+        return run
+
+    job = queue.submit("recommendations", lambda: [run_stage(name, module(name), None) for name in ("a", "b")])
+    started.wait(5)
+    job.cancel()
+    cancelled.set()
+    wait_for(lambda: job.status == "cancelled")
+    assert ran == ["a"]
+
+
+def test_async_stages_stop_when_the_next_stage_completes(queue):
+    stage_cancelled = []
+
+    async def stage(name, seconds):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            stage_cancelled.append(name)
+            raise
+        return name
+
+    async def run_all():
+        return await run_stages([("fast", stage("fast", 0.05)), ("slow", stage("slow", 5)), ("slower", stage("slower", 10))])
+
+    job = queue.submit("recommendations", lambda: asyncio.run(run_all()))
+    # Cancel while the first stage is running, so the job notices when it completes
+    wait_for(lambda: job.status == "running")
+    job.cancel()
+    started = time.monotonic()
+    wait_for(lambda: job.status == "cancelled")
+    assert time.monotonic() - started < 2
+    assert sorted(stage_cancelled) == ["slow", "slower"]
+    assert job.status_dict(partial=True)["partial"] == {"fast": "fast"}
+
+
+def test_async_stages_return_results_in_order_outside_a_job():
+    async def stage(value, seconds):
+        await asyncio.sleep(seconds)
+        return value
+
+    results = asyncio.run(run_stages([("a", stage(1, 0.03)), ("b", stage(2, 0.01)), ("c", stage(3, 0.02))]))
+    assert results == [1, 2, 3]
+
+
+def test_check_cancelled_outside_a_job_does_nothing():
+    check_cancelled()
+    report_partial("ignored", 1)
+
+
+def staged_until_cancelled():
+    report_partial("stage0", 0)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        check_cancelled()
+        time.sleep(0.01)
+
+
+def run_in_worker(directory, run, drain=True):
+    """Submit run as a job in a forked process sharing directory; returns (pid, job ID)."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            queue = JobQueue(max_concurrency=1, store=JobStore(directory))
+            job = queue.submit("staged", run)
+            os.write(write_end, job.id.encode())
+            if drain:
+                queue.drain(10)
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    job_id = os.read(read_end, 32).decode()
+    os.close(read_end)
+    return pid, job_id
+
+
+def test_any_worker_reports_on_and_cancels_a_job(tmp_path):
+    pid, job_id = run_in_worker(str(tmp_path), staged_until_cancelled)
+    queue = JobQueue(store=JobStore(str(tmp_path)))
+    wait_for(lambda: queue.get(job_id).status == "running" and queue.get(job_id).partial)
+    assert queue.get(job_id).status_dict(partial=True)["partial"] == {"stage0": 0}
+
+    assert queue.cancel(job_id).status == "running"
+    # The worker running the job stops at its next check_cancelled()
+    wait_for(lambda: queue.get(job_id).status == "cancelled")
+    os.waitpid(pid, 0)
+    assert queue.get(job_id).status_dict(partial=True)["partial"] == {"stage0": 0}
+    assert queue.get("0" * 32) is None
+    assert queue.get("../x") is None
+
+
+def test_result_is_read_from_another_worker(tmp_path):
+    pid, job_id = run_in_worker(str(tmp_path), lambda: {"result": [1, 2]})
+    os.waitpid(pid, 0)
+    job = JobQueue(store=JobStore(str(tmp_path))).get(job_id)
+    assert job.status == "succeeded"
+    assert job.result == {"result": [1, 2]}
+
+
+def test_queued_job_is_cancelled_at_once_through_another_worker(tmp_path):
+    owner = JobQueue(max_concurrency=1, store=JobStore(str(tmp_path)))
+    other = JobQueue(store=JobStore(str(tmp_path)))
+    release = threading.Event()
+    owner.submit("blocker", lambda: release.wait(5))
+    ran = []
+    job = owner.submit("queued", lambda: ran.append(True))
+    assert other.cancel(job.id).status == "cancelled"
+    release.set()
+    wait_for(lambda: job.status == "cancelled")
+    assert not ran
+    assert other.get(job.id).status == "cancelled"
+
+
+def test_job_of_a_worker_that_died_is_failed(tmp_path):
+    # The worker exits without draining, as a killed one would
+    pid, job_id = run_in_worker(str(tmp_path), staged_until_cancelled, drain=False)
+    os.waitpid(pid, 0)
+    job = JobQueue(store=JobStore(str(tmp_path))).get(job_id)
+    assert job.status == "failed"
+    assert "exited" in job.error
+
+
+def test_drain_finishes_jobs_then_fails_the_rest(tmp_path):
+    queue = JobQueue(max_concurrency=1, store=JobStore(str(tmp_path)))
+    release = threading.Event()
+    quick = queue.submit("quick", lambda: time.sleep(0.05) or 1)
+    slow = queue.submit("slow", lambda: release.wait(5))
+    queued = queue.submit("queued", lambda: 3)
+    queue.drain(0.5)
+    release.set()
+    reader = JobQueue(store=JobStore(str(tmp_path)))
+    assert reader.get(quick.id).status == "succeeded"
+    for job in (slow, queued):
+        assert job.status == "failed"
+        assert reader.get(job.id).status == "failed"
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from modules import metrics
+from modules.metrics import span, using_tool, render_metrics, flush
+
+
+def sample(text, line_prefix):
+    values = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(line_prefix + " ")]
+    assert len(values) <= 1
+    return values[0] if values else None
+
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setitem(metrics._collectors, "test", lambda: [
+        ("cmnd_test_gauge", "Test gauge", "gauge", [({}, 1)]),
+    ])
+    return tmp_path
+
+
+def run_in_worker(tool, calls):
+    """Record calls spans for tool in a forked process that flushes its metrics and exits."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            with using_tool(tool):
+                for _ in range(calls):
+                    with span("request"):
+                        pass
+            flush()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    return pid
+
+
+def test_histogram_buckets_are_cumulative():
+    with using_tool("metrics-buckets"):
+        with span("request"):
+            pass
+    text = render_metrics()
+    labels = '{tool="metrics-buckets",stage="request"'
+    assert sample(text, f'cmnd_stage_seconds_bucket{labels},le="+Inf"}}') == 1
+    assert sample(text, f'cmnd_stage_seconds_count{labels}}}') == 1
+
+
+def test_metrics_add_up_over_workers(shared_dir):
+    child = run_in_worker("metrics-shared", 3)
+    with using_tool("metrics-shared"):
+        with span("request"):
+            pass
+
+    text = render_metrics()
+    assert sample(text, 'cmnd_stage_seconds_count{tool="metrics-shared",stage="request"}') == 4
+    # The exited worker's counts are kept, its gauges are not
+    assert sample(text, "cmnd_test_gauge") == 1
+    assert not (shared_dir / f"{child}.json").exists()
+    assert (shared_dir / "retired.json").exists()
+
+    # Totals do not drop once the worker's file has been folded into retired.json
+    text = render_metrics()
+    assert sample(text, 'cmnd_stage_seconds_count{tool="metrics-shared",stage="request"}') == 4
+
+
+def test_live_worker_gauges_are_summed(shared_dir):
+    # PID 1 is always running, so its file stands in for another live worker
+    metrics.write_json(str(shared_dir / "1.json"), [
+        ("cmnd_test_gauge", "Test gauge", "gauge", [("cmnd_test_gauge", [], 2)]),
+    ])
+    assert sample(render_metrics(), "cmnd_test_gauge") == 3
+
+
+def test_cache_hit_ratio_is_computed_from_merged_counts(shared_dir, monkeypatch):
+    monkeypatch.setitem(metrics._caches, "metrics-test", lambda: {"hits": 1, "misses": 3})
+    # cache_families gives (labels dict, value) samples; store them the way flush() writes them
+    metrics.write_json(str(shared_dir / "1.json"), [
+        (name, help, kind, [(name, list(labels.items()), value) for labels, value in samples])
+        for name, help, kind, samples in metrics.cache_families({"metrics-test": {"hits": 4, "misses": 0}})
+    ])
+    assert sample(render_metrics(), 'cmnd_cache_hit_ratio{cache="metrics-test"}') == 5 / 8
@@ -0,0 +1,10 @@
+from models import InvestmentOptionsSchema, custom_json_schema
+
+
+def test_manifest_types_optional_parameters():
+    properties = custom_json_schema(InvestmentOptionsSchema)["properties"]
+    assert properties["limit"]["type"] == "integer"
+    assert properties["offset"]["type"] == "integer"
+    assert properties["cursor"]["type"] == "string"
+    assert properties["projects_data"]["type"] == "string"
+    assert properties["inventory_id"]["type"] == "string"
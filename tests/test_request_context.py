@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+import modules.request_context
+from modules.request_context import AnalysisContext
+from modules.executor import InlineExecutor
+from tests.inventory import make_projects_data
+
+
+async def ticks_while(awaitable, interval=0.01):
+    """Result of awaitable and how often the event loop got to run another task meanwhile."""
+    ticks = 0
+    done = False
+
+    async def ticker():
+        nonlocal ticks
+        while not done:
+            ticks += 1
+            await asyncio.sleep(interval)
+
+    task = asyncio.create_task(ticker())
+    try:
+        return await awaitable, ticks
+    finally:
+        done = True
+        await task
+
+
+def slow_on_loop(fn, seconds=0.2):
+    """fn that sleeps first and records whether it ran on the thread of the event loop."""
+    threads = []
+
+    def slow(*args, **kwargs):
+        threads.append(threading.get_ident())
+        time.sleep(seconds)
+        return fn(*args, **kwargs)
+    return slow, threads
+
+
+def test_async_context_validates_and_filters_off_the_event_loop(monkeypatch):
+    select, threads = slow_on_loop(modules.request_context.select_investment_page)
+    monkeypatch.setattr(modules.request_context, "select_investment_page", select)
+
+    async def main():
+        context = await AnalysisContext.afrom_props(projects_data=make_projects_data(50), budget_max=10**7)
+        (store, rows, _), ticks = await ticks_while(context.aselect())
+        return threading.get_ident(), len(rows), ticks
+
+    loop_thread, rows, ticks = asyncio.run(main())
+    assert rows == 50
+    assert threads and loop_thread not in threads
+    assert ticks >= 5
+
+
+def test_inline_batches_run_off_the_event_loop():
+    score, threads = slow_on_loop(lambda items: [item * 2 for item in items])
+
+    async def main():
+        result, ticks = await ticks_while(InlineExecutor().amap_chunks(score, range(3)))
+        return threading.get_ident(), result, ticks
+
+    loop_thread, result, ticks = asyncio.run(main())
+    assert result == [0, 2, 4]
+    assert loop_thread not in threads
+    assert ticks >= 5
@@ -0,0 +1,97 @@
+import random
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from modules.risk_analysis import batch_evaluator, evaluator, risk_property_data, score_risk_chunk, assess_property_risk
+from modules.risk_model import RISK_FACTORS
+from tests.inventory import make_rows
+
+NOW = datetime(2025, 3, 14, 15, 9, 26)
+
+
+def rental_income(rng):
+    pessimistic = rng.uniform(1, 5)
+    return {
+        "pessimistic": {"annual_net_rental_yield": pessimistic},
+        "optimistic": {"annual_net_rental_yield": pessimistic + rng.uniform(0, 4)},
+    }
+
+
+def price_list(rng, price):
+    fees = {"VAT": price * 0.05, "stamp_duty": price * 0.06, "lawyer": rng.choice([0, 1500, 2000])}
+    return [{"payment_plan": {"total_amount": price + sum(fees.values()), "additional_fees": fees}}]
+
+
+def properties_data(count=200, seed=7):
+    rng = random.Random(seed)
+    return [risk_property_data(row, rental_income(rng), price_list(rng, row["price"])) for row in make_rows(count, seed)]
+
+
+def scalar_scores(data):
+    composite, factors = evaluator.evaluate_property(data, NOW)
+    return composite, [factors[factor] for factor in RISK_FACTORS]
+
+
+def test_batch_matches_scalar_exactly():
+    data = properties_data()
+    composite_scores, score_matrix = batch_evaluator.evaluate_properties(data, NOW)
+    for row, property_data in enumerate(data):
+        composite, factors = scalar_scores(property_data)
+        assert composite_scores[row] == composite
+        assert score_matrix[row].tolist() == factors
+
+
+def test_batch_matches_scalar_on_dates_only_strptime_reads():
+    data = properties_data(10)
+    data[3]["completion_date"] = "2027-1-5"
+    composite_scores, score_matrix = batch_evaluator.evaluate_properties(data, NOW)
+    assert score_matrix[3].tolist() == scalar_scores(data[3])[1]
+
+
+def degenerate(field):
+    def set_price(data, value):
+        data["min_price"] = data["max_price"] = value
+    def set_yield(data, value):
+        data["rental_income"] = {"pessimistic": {"annual_net_rental_yield": value}, "optimistic": {"annual_net_rental_yield": value}}
+    def set_total(data, value):
+        data["payment_plan"] = dict(data["payment_plan"], total_amount=value)
+    def set_date(data, value):
+        data["completion_date"] = value
+    def set_sold(data, value):
+        data["percentage_sold"] = value
+    return {"price": set_price, "yield": set_yield, "total_amount": set_total, "date": set_date, "sold": set_sold}[field]
+
+
+@pytest.mark.parametrize("field, value", [
+    ("price", 0), ("price", 0.0), ("yield", 0), ("total_amount", 0), ("sold", None),
+    ("date", "2026-05"), ("date", "2026"), ("date", "NaT"), ("date", "2026-05-01T10:00"), ("date", None),
+])
+def test_batch_raises_like_scalar_on_degenerate_rows(field, value):
+    data = properties_data(20)
+    degenerate(field)(data[5], value)
+    with pytest.raises(Exception) as scalar_error:
+        evaluator.evaluate_property(data[5], NOW)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with pytest.raises(type(scalar_error.value)):
+            batch_evaluator.evaluate_properties(data, NOW)
+
+
+def test_batch_scores_are_finite():
+    composite_scores, score_matrix = batch_evaluator.evaluate_properties(properties_data(), NOW)
+    assert np.isfinite(composite_scores).all() and np.isfinite(score_matrix).all()
+
+
+def test_chunk_reports_match_per_property_reports():
+    rng = random.Random(3)
+    rows = make_rows(50, 3)
+    entries = []
+    for number, row in enumerate(rows):
+        # Some properties have no rental income or payment plan and are left out
+        entries.append((row, rental_income(rng) if number % 7 else None, price_list(rng, row["price"]) if number % 5 else []))
+    expected = [entry for entry in (assess_property_risk(*entry) for entry in entries) if entry is not None]
+    now = datetime.now()
+    assert score_risk_chunk(entries, now) == expected
@@ -0,0 +1,78 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from modules.risk_analysis import RiskScorer, RiskEvaluator, BatchRiskEvaluator
+from modules.risk_model import RiskModel, RiskModelLoader, RISK_MODEL_PATH, RISK_FACTORS
+
+PROPERTY = {
+    "location": "Iskele", "property_developer": "Dovec Construction", "min_price": 100_000, "max_price": 150_000,
+    "percentage_sold": 40, "start_date": "2024-01-01", "completion_date": "2027-06-30",
+    "rental_income": {"pessimistic": {"annual_net_rental_yield": 4}, "optimistic": {"annual_net_rental_yield": 9}},
+    "payment_plan": {"total_amount": 160_000, "additional_fees": {"VAT": 6_000, "stamp_duty": 3_000}},
+}
+
+
+def write_model(path, location_score):
+    with open(path, "w") as f:
+        json.dump({"location_scores": {"Iskele": location_score}}, f)
+
+
+def test_default_model_keeps_the_built_in_scores():
+    model = RiskModel.from_file(RISK_MODEL_PATH)
+    assert model.locations.score("Kyrenia") == 0.2
+    assert model.locations.score("Atlantis") == 1.0
+    assert model.developers.score("Dovec Construction") == 0.0
+    assert model.developers.score("Anyone") == 1.0
+    assert model.locations.lookup(["Lefke", "Atlantis"]).tolist() == [0.7, 1.0]
+    # Equal weights: the plain mean of the factor scores
+    scores = [0.2, 0.5, 1.25, 0.4, 0.1, 0.0]
+    assert model.composite(scores) == pytest.approx(np.mean(scores))
+
+
+def test_weights_apply_to_scalar_and_batch_scores():
+    model = RiskModel({"weights": {"location": 3, "developer": 0}})
+    scores = [0.2, 0.5, 1.25, 0.4, 0.1, 1.0]
+    assert model.composite(scores) == pytest.approx((3 * 0.2 + 0.5 + 1.25 + 0.4 + 0.1) / 7)
+
+    scorer = RiskScorer(model)
+    composite, _ = RiskEvaluator(scorer).evaluate_property(PROPERTY)
+    composite_scores, _ = BatchRiskEvaluator(scorer).evaluate_properties([PROPERTY, PROPERTY])
+    assert composite_scores.tolist() == [composite, composite]
+
+
+@pytest.mark.parametrize("definition, message", [
+    ({"weights": {"locaton": 1}}, "Unknown risk factors"),
+    ({"weights": {factor: 0 for factor in RISK_FACTORS}}, "positive"),
+])
+def test_invalid_model_is_rejected(definition, message):
+    with pytest.raises(ValueError, match=message):
+        RiskModel(definition)
+
+
+def test_changed_model_file_is_reloaded(tmp_path):
+    path = str(tmp_path / "risk_model.json")
+    write_model(path, 0.3)
+    loader = RiskModelLoader(path, reload_interval=0)
+    assert loader.get().locations.score("Iskele") == 0.3
+
+    write_model(path, 0.9)
+    os.utime(path, (0, os.path.getmtime(path) + 10))
+    assert loader.get().locations.score("Iskele") == 0.9
+
+    # A file that fails to load keeps the previous model
+    with open(path, "w") as f:
+        f.write("{")
+    os.utime(path, (0, os.path.getmtime(path) + 20))
+    assert loader.get().locations.score("Iskele") == 0.9
+
+
+def test_model_file_is_checked_at_most_every_interval(tmp_path):
+    path = str(tmp_path / "risk_model.json")
+    write_model(path, 0.3)
+    loader = RiskModelLoader(path, reload_interval=60)
+    write_model(path, 0.9)
+    os.utime(path, (0, os.path.getmtime(path) + 10))
+    assert loader.get().locations.score("Iskele") == 0.3
@@ -0,0 +1,97 @@
+import glob
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+import serve
+from serve import RequestCounter
+
+SERVE = os.path.abspath(serve.__file__)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def app(environ, start_response):
+    if environ["PATH_INFO"] == "/fail":
+        raise ValueError("request failed")
+    start_response("200 OK", [])
+    return [b"ok"]
+
+
+def test_request_counter_calls_on_limit_once():
+    calls = []
+    counted = RequestCounter(app, 3, lambda: calls.append(counted.count))
+    for path in ("/", "/fail", "/", "/", "/"):
+        try:
+            counted({"PATH_INFO": path}, lambda *_: None)
+        except ValueError:
+            pass
+    # Failed requests count too
+    assert calls == [3]
+    assert counted.count == 5
+
+
+def test_shared_state_dir():
+    directory = serve.shared_state_dir()
+    try:
+        assert os.path.isdir(directory)
+        assert os.path.basename(directory).startswith("cmnd-serve-")
+    finally:
+        os.rmdir(directory)
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.status, json.loads(response.read())
+
+
+def responding(url):
+    try:
+        return get(url)[0] == 200
+    except OSError:
+        return False
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="serve.py forks its workers")
+def test_workers_are_replaced_and_stop_on_sigterm():
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/cmnd-tools"
+    env = {**os.environ, "HOST": "127.0.0.1", "PORT": str(port), "WORKERS": "2", "MAX_REQUESTS": "3", "GRACEFUL_TIMEOUT": "5"}
+    for name in serve.SHARED_DIRS:
+        env.pop(name, None)
+    state_dirs = set(glob.glob("/dev/shm/cmnd-serve-*"))
+    master = subprocess.Popen(
+        [sys.executable, SERVE], cwd=os.path.dirname(SERVE), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        wait_for(lambda: responding(url), timeout=60)
+        manifests = [get(url) for _ in range(12)]
+        assert all(status == 200 for status, _ in manifests)
+        assert all(manifest == manifests[0][1] for _, manifest in manifests)
+        master.send_signal(signal.SIGTERM)
+        output, _ = master.communicate(timeout=30)
+    finally:
+        if master.poll() is None:
+            master.kill()
+            master.wait()
+    assert master.returncode == 0, output
+    assert "starting a replacement" in output
+    assert set(glob.glob("/dev/shm/cmnd-serve-*")) <= state_dirs
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import main_async
+from modules.streaming import StreamingResult, stream_mode
+from tests.inventory import make_projects_data
+
+
+def items(count, fail_at=None):
+    for number in range(count):
+        if number == fail_at:
+            raise ValueError("upstream went away")
+        yield {"id": number}
+
+
+def ndjson_lines(text):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_chunked_json_is_the_materialized_result():
+    chunks = list(StreamingResult("items", items(3), lambda: {"next_cursor": "abc"}).iter_json())
+    assert len(chunks) > 3
+    assert json.loads("".join(chunks)) == StreamingResult("items", items(3), lambda: {"next_cursor": "abc"}).materialize()
+    assert json.loads("".join(StreamingResult("items", items(0)).iter_json())) == {"items": []}
+
+
+def test_ndjson_is_one_line_per_item_then_the_trailer():
+    lines = ndjson_lines("".join(StreamingResult("items", items(3), lambda: {"next_cursor": "abc"}).iter_ndjson()))
+    assert lines == [{"id": 0}, {"id": 1}, {"id": 2}, {"next_cursor": "abc"}]
+    assert ndjson_lines("".join(StreamingResult("items", items(2), lambda: {}).iter_ndjson())) == [{"id": 0}, {"id": 1}]
+
+
+def test_error_after_the_response_started_ends_the_document():
+    document = json.loads("".join(StreamingResult("items", items(5, fail_at=2)).iter_json()))
+    assert document == {"items": [{"id": 0}, {"id": 1}], "error": "upstream went away"}
+    lines = ndjson_lines("".join(StreamingResult("items", items(5, fail_at=2)).iter_ndjson()))
+    assert lines == [{"id": 0}, {"id": 1}, {"error": "upstream went away"}]
+
+
+@pytest.mark.parametrize("data, accept, mode", [
+    ({}, None, None),
+    ({"stream": False}, None, None),
+    ({"stream": True}, None, "json"),
+    ({"stream": "json"}, None, "json"),
+    ({"stream": "ndjson"}, None, "ndjson"),
+    ({}, "application/x-ndjson", "ndjson"),
+    ({"stream": True}, "application/json, application/x-ndjson", "ndjson"),
+])
+def test_stream_mode(data, accept, mode):
+    assert stream_mode(data, accept) == mode
+
+
+def flask_post(body):
+    response = main.app.test_client().post("/run-cmnd-tool", json=body)
+    return response.status_code, response.mimetype, response.get_data(as_text=True)
+
+
+def fastapi_post(body):
+    response = TestClient(main_async.app).post("/run-cmnd-tool", json=body)
+    return response.status_code, response.headers["content-type"].split(";")[0], response.text
+
+
+@pytest.mark.parametrize("post", [flask_post, fastapi_post])
+def test_streamed_tool_response_matches_the_plain_one(post):
+    props = {"projects_data": make_projects_data(60, seed=11), "budget_max": 10**7, "sort_by": "price", "limit": 25}
+    body = {"toolName": "property_details_and_insights_module", "props": props}
+    status, _, text = post(body)
+    expected = json.loads(text)
+    assert status == 200
+    assert len(expected["property_details"]) == 25 and expected["next_cursor"]
+
+    status, mimetype, text = post({**body, "stream": True})
+    assert (status, mimetype) == (200, "application/json")
+    assert json.loads(text) == expected
+
+    status, mimetype, text = post({**body, "stream": "ndjson"})
+    assert (status, mimetype) == (200, "application/x-ndjson")
+    assert ndjson_lines(text) == expected["property_details"] + [{"next_cursor": expected["next_cursor"]}]
+
+
+@pytest.mark.parametrize("post", [flask_post, fastapi_post])
+def test_stream_failing_midway_ends_with_an_error_line(post, register_tool):
+    register_tool("failing_stream", lambda: {}, streamCmd=lambda: StreamingResult("items", items(5, fail_at=3)))
+    status, _, text = post({"toolName": "failing_stream", "props": {}, "stream": "ndjson"})
+    assert status == 200
+    assert ndjson_lines(text) == [{"id": 0}, {"id": 1}, {"id": 2}, {"error": "upstream went away"}]
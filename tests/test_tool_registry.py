@@ -0,0 +1,142 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import main_async
+from tool_registry import ToolRegistry, split_import_path
+from tools import registry
+
+SRC = os.path.dirname(os.path.abspath(main.__file__))
+
+
+def tool(name, **fields):
+    return {
+        "name": name,
+        "description": f"Tool {name}",
+        "parameters": {"type": "object", "properties": {}},
+        "runCmd": lambda: name,
+        "functionType": "backend",
+        "rerun": True,
+        "rerunWithDifferentParameters": True,
+        **fields,
+    }
+
+
+def flask_get(path, headers=None):
+    response = main.app.test_client().get(path, headers=headers)
+    return response.status_code, response.headers, response.data
+
+
+def fastapi_get(path, headers=None):
+    response = TestClient(main_async.app).get(path, headers=headers)
+    return response.status_code, response.headers, response.content
+
+
+@pytest.mark.parametrize("get", [flask_get, fastapi_get])
+def test_manifest_is_served_with_an_etag(get, register_tool):
+    status, headers, body = get("/cmnd-tools")
+    etag = headers["ETag"]
+    assert status == 200
+    assert json.loads(body) == {"tools": registry.manifest()}
+
+    status, headers, body = get("/cmnd-tools", headers={"If-None-Match": etag})
+    assert (status, body) == (304, b"")
+    assert headers["ETag"] == etag
+
+    # A change to the registered tools changes the manifest and its ETag
+    register_tool("manifest_test_tool", lambda: None)
+    status, headers, body = get("/cmnd-tools", headers={"If-None-Match": etag})
+    assert status == 200
+    assert headers["ETag"] != etag
+    assert "manifest_test_tool" in [entry["name"] for entry in json.loads(body)["tools"]]
+
+
+def test_if_none_match_lists_and_weak_tags():
+    tools = ToolRegistry()
+    tools.register(tool("a"))
+    _, etag = tools.manifest_json()
+    assert tools.not_modified(f'"other", W/"{etag}"')
+    assert tools.not_modified("*")
+    assert not tools.not_modified('"other"')
+    assert not tools.not_modified(None)
+
+
+def test_duplicate_tool_is_rejected():
+    tools = ToolRegistry()
+    tools.register(tool("a"))
+    with pytest.raises(ValueError, match="already registered"):
+        tools.register(tool("a"))
+
+
+@pytest.mark.parametrize("fields, message", [
+    ({"runCmd": "no_function"}, "module:function"),
+    ({"runCmd": 3}, "callable"),
+    ({"weight": 0}, "positive integer"),
+    ({"parameters": "schema"}, "JSON schema"),
+])
+def test_invalid_tool_is_rejected(fields, message):
+    with pytest.raises(ValueError, match=message):
+        ToolRegistry().register(tool("a", **fields))
+
+
+def test_missing_fields_are_named():
+    definition = tool("a")
+    del definition["rerun"]
+    with pytest.raises(ValueError, match="missing rerun"):
+        ToolRegistry().register(definition)
+
+
+def test_enabled_and_disabled_tools():
+    tools = ToolRegistry(enabled="off_by_default", disabled="on_by_default, other")
+    for name, enabled in [("on", True), ("on_by_default", True), ("off", False), ("off_by_default", False)]:
+        tools.register(tool(name, enabled=enabled))
+    assert sorted(entry["name"] for entry in tools.manifest()) == ["off_by_default", "on"]
+    assert tools.get("on")["runCmd"]() == "on"
+    assert tools.get("off") is None
+
+
+def test_servers_start_without_importing_tool_modules():
+    code = (
+        "import json, sys, main, main_async, tools; "
+        "print(json.dumps([module for module in sys.modules if module.startswith('modules.')]))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True).stdout
+    imported = set(json.loads(output.strip().splitlines()[-1]))
+    tool_modules = {split_import_path(tool[field])[0] for tool in registry for field in ("runCmd", "streamCmd") if isinstance(tool.get(field), str)}
+    assert tool_modules
+    assert not tool_modules & imported
+
+
+def test_run_cmd_is_imported_on_first_load(tmp_path, monkeypatch):
+    (tmp_path / "lazy_tool_module.py").write_text("def run():\n    return 'ran'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    tools = ToolRegistry()
+    definition = tools.register(tool("lazy", runCmd="lazy_tool_module:run"))
+    try:
+        assert "lazy_tool_module" not in sys.modules
+        run = tools.load(definition)
+        assert run() == "ran"
+        assert tools.load(definition) is run
+        assert ("lazy", "runCmd") in tools.load_seconds
+    finally:
+        sys.modules.pop("lazy_tool_module", None)
+
+
+def test_missing_module_fails_on_load_not_registration():
+    tools = ToolRegistry()
+    definition = tools.register(tool("missing", runCmd="no_such_tool_module:run"))
+    with pytest.raises(ModuleNotFoundError):
+        tools.load(definition)
+
+
+def test_import_report_measures_cold_imports():
+    tools = ToolRegistry()
+    tools.register(tool("colors", runCmd="colorsys:rgb_to_hsv"))
+    [(name, module_name, seconds)] = tools.import_report()
+    assert (name, module_name) == ("colors", "colorsys")
+    assert 0 < seconds < 10